@@ -120,3 +120,178 @@ STATIC_URL = 'static/'
 
 MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "/media/"
+
+
+# IP Transcoder
+# ------------------------------------------------------------------
+
+# Runtime state shared between the enforcer and the admin (metrics, traces).
+TRANSCODER_STATE_DIR = BASE_DIR / "run"
+
+# Enforcer tick profiling: dump phase histograms to TRANSCODER_STATE_DIR after
+# every tick, and keep stack samples of ticks slower than this (0 disables).
+TRANSCODER_ENFORCER_METRICS = True
+TRANSCODER_SLOW_TICK_SECONDS = 2.0
+
+# Per-job CPU/memory/I/O accounting from /proc (Linux): sampling interval,
+# rolling window for averages/peaks, and down-sampled history kept in the DB.
+TRANSCODER_PROC_SAMPLE_INTERVAL = 5.0
+TRANSCODER_PROC_WINDOW_SECONDS = 300
+TRANSCODER_PROC_HISTORY_BUCKET_SECONDS = 300
+TRANSCODER_PROC_HISTORY_DAYS = 30
+
+# ffmpeg stderr: "capture" into per-job ring buffers (last N lines, shown in
+# the admin) and per-channel rotating, gzip-compressed log files; "inherit"
+# lets jobs write to the enforcer's console. Lines beyond RATE/s (bursts of
+# BURST) are dropped from the files and counted.
+TRANSCODER_JOB_STDERR = "capture"
+TRANSCODER_JOB_LOG_DIR = BASE_DIR / "logs" / "jobs"
+TRANSCODER_JOB_LOG_LINES = 200
+TRANSCODER_JOB_LOG_SNAPSHOT_LINES = 20
+TRANSCODER_JOB_LOG_MAX_BYTES = 10 * 1024 * 1024
+TRANSCODER_JOB_LOG_BACKUPS = 5
+TRANSCODER_JOB_LOG_RATE = 20
+TRANSCODER_JOB_LOG_BURST = 200
+
+# Live status dashboard: how often the shared snapshot cache looks for a new
+# enforcer snapshot (and how often SSE clients / pollers get updates).
+TRANSCODER_STATUS_REFRESH_SECONDS = 1.0
+
+# Enforcer control socket (transcoder_ctl); None = TRANSCODER_STATE_DIR/enforcer.sock.
+# Jobs stopped through it get SIGTERM and are killed after the grace period.
+TRANSCODER_CONTROL_SOCKET = None
+TRANSCODER_STOP_GRACE_SECONDS = 10
+
+# NICs the enforcer may place multicast inputs and multicast UDP outputs on,
+# e.g. {"eth1": {"capacity_mbps": 1000}, "eth2": {"capacity_mbps": 10000}}.
+TRANSCODER_NICS = {}
+
+# If True (or with `transcoder_enforcer --nic-placement`), channels without an
+# explicit multicast_interface are spread across TRANSCODER_NICS by bitrate.
+TRANSCODER_NIC_PLACEMENT = False
+
+# Bitrate assumed for a channel until a measurement is available (kbit/s).
+TRANSCODER_DEFAULT_CHANNEL_KBPS = 8000
+
+# Capacity planner (transcoder_plan, admin planner page): host CPU budget in
+# percent of one core (None = 100 x CPU count), optional job limit, and the
+# CPU a job is assumed to need by video mode until the channel has measured
+# history (ChannelResourceSample).
+TRANSCODER_CPU_CAPACITY_PERCENT = None
+TRANSCODER_MAX_JOBS = None
+TRANSCODER_PLANNER_JOB_CPU_PERCENT = {"copy": 10, "transcode": 150}
+TRANSCODER_PLANNER_HORIZON_DAYS = 7
+
+# Job start-up: threads preparing commands, and concurrent Popen calls.
+TRANSCODER_START_WORKERS = 16
+TRANSCODER_SPAWN_CONCURRENCY = 8
+
+# Optional deterministic start jitter per purpose (max seconds), e.g.
+# {"record": 2.0} spreads recordings opening at the same boundary over 2 s.
+TRANSCODER_START_JITTER = {}
+
+# Upper bound for Channel/Schedule pre-roll; also how far ahead the enforcer
+# looks for one-off schedules that are about to open.
+TRANSCODER_MAX_PREROLL_SECONDS = 300
+
+# Aligned recordings: how many seconds after a grid point ffmpeg may open the
+# next segment (it waits for a keyframe). Lookups probe this many names.
+TRANSCODER_ALIGNED_CUT_TOLERANCE_SECONDS = 10
+
+# Segment-close watcher (transcoder_segment_watcher): dotted paths of callables
+# receiving batches of SegmentClosed events.
+TRANSCODER_SEGMENT_CONSUMERS = []
+TRANSCODER_SEGMENT_BATCH_SIZE = 100
+TRANSCODER_SEGMENT_BATCH_LATENCY = 1.0  # seconds
+TRANSCODER_SEGMENT_QUEUE_SIZE = 10000
+# Polling fallback: scan interval, and how long an unchanged file must sit
+# before it counts as closed.
+TRANSCODER_SEGMENT_POLL_INTERVAL = 5.0
+TRANSCODER_SEGMENT_STABLE_SECONDS = 30.0
+
+# Clip export (transcoder_clips, ClipExport admin): output folder, concurrent
+# ffmpeg processes per worker, and how many days before a clip's start a
+# non-aligned recording job may have started (its folder is named after that day).
+TRANSCODER_CLIP_DIR = MEDIA_ROOT / "clips"
+TRANSCODER_CLIP_WORKERS = 2
+TRANSCODER_CLIP_LOOKBACK_DAYS = 1
+
+# Archive transcoding (transcoder_archive, ArchiveProfile admin): concurrent
+# encodes, the nice level they run at (plus SCHED_IDLE where available), how
+# often a failing segment is tried, and how often `run` rescans the recording
+# folders for segments the watcher did not report. Add
+# "transcoder.archive.archive_consumer" to TRANSCODER_SEGMENT_CONSUMERS to queue
+# segments as they close.
+TRANSCODER_ARCHIVE_WORKERS = 1
+TRANSCODER_ARCHIVE_NICE = 19
+TRANSCODER_ARCHIVE_MAX_ATTEMPTS = 3
+TRANSCODER_ARCHIVE_SCAN_INTERVAL = 3600  # seconds
+
+# Continuity map (transcoder_continuity, "transcoder.continuity.continuity_consumer"
+# in TRANSCODER_SEGMENT_CONSUMERS): segments less than this many seconds apart
+# count as continuous. Time-shift playback with gap_mode "slate" loops
+# TRANSCODER_SLATE_FILE (an MPEG-TS file) through a hole (black with silence
+# if unset).
+TRANSCODER_COVERAGE_GAP_SECONDS = 2.0
+TRANSCODER_SLATE_FILE = None
+
+# Time-shift playout (transcoder_playout, one process per channel for all its
+# delays): size of the read window the delays share. Delays closer together
+# than the window holds (about 50s at 10 Mbit/s for 64 MB) read each chunk
+# from disk once; raise it to cover the spread between delays if RAM allows.
+TRANSCODER_PLAYOUT_WINDOW_MB = 64
+
+# Output watchdog (enforcer --stall-seconds): a job whose output has not
+# advanced for this many seconds is restarted even though its process is
+# alive. HLS jobs are judged by their playlist, recordings by the growth of
+# the current segment, other outputs by -progress out_time (which needs
+# TRANSCODER_JOB_STDERR = "capture"). Must exceed the HLS segment length and
+# the input's worst start-up time; 0 disables.
+TRANSCODER_STALL_SECONDS = 30
+
+# CPU transcodes (video_mode transcode on libx264/libx265): the host's cores
+# are split between the transcodes running at once (at most MAX_THREADS
+# each), and each job gets the slowest preset whose throughput, measured by
+# transcoder_calibrate, covers its output pixels at SOURCE_FPS with HEADROOM
+# to spare (DEFAULT_PRESET until the host is calibrated). A job whose
+# out_time advances slower than MIN_SPEED x real time over SPEED_WINDOW
+# seconds is restarted one preset faster (0 disables the fallback).
+TRANSCODER_CPU_SOURCE_FPS = 25
+TRANSCODER_CPU_HEADROOM = 1.3
+TRANSCODER_CPU_DEFAULT_PRESET = "veryfast"
+TRANSCODER_CPU_MAX_THREADS = 16
+TRANSCODER_CPU_MIN_SPEED = 0.98
+TRANSCODER_CPU_SPEED_WINDOW = 60  # seconds
+
+# Staged recording (Channel.recording_staged): segments are written under
+# this fast local directory (tmpfs or SSD, mirroring the final folders) and
+# transcoder_mover moves each closed segment to its final folder: CHUNK_MB
+# sequential copies, fsynced FSYNC_BATCH files at a time, throttled to
+# BANDWIDTH_MB per second (0 = unthrottled) so the array keeps serving reads.
+# Size the staging area for the mover's interval plus a stalled array.
+TRANSCODER_RECORDING_STAGING_DIR = None
+TRANSCODER_MOVER_CHUNK_MB = 8
+TRANSCODER_MOVER_FSYNC_BATCH = 8
+TRANSCODER_MOVER_BANDWIDTH_MB = 0
+TRANSCODER_MOVER_INTERVAL = 10.0  # seconds between staging scans
+
+# Previews on the admin overview (transcoder_previews, one per host): every
+# PASS_SECONDS a pass grabs the LIVE_PER_PASS stalest thumbnails of live
+# channels (none refreshed more often than LIVE_INTERVAL) and builds sprite
+# sheets (a tile every SPRITE_INTERVAL seconds) for the SPRITES_PER_PASS newest
+# segments of the last SPRITE_LOOKBACK_HOURS that lack one. ffmpeg decodes
+# keyframes only, WORKERS at a time, at nice NICE (plus SCHED_IDLE), each
+# killed after TIMEOUT seconds, so the cost per pass is fixed however many
+# channels there are. Images are cached in DIR, least recently viewed
+# evicted beyond CACHE_MB.
+TRANSCODER_PREVIEW_DIR = MEDIA_ROOT / "previews"
+TRANSCODER_PREVIEW_WORKERS = 2
+TRANSCODER_PREVIEW_NICE = 19
+TRANSCODER_PREVIEW_TIMEOUT = 15  # seconds
+TRANSCODER_PREVIEW_PASS_SECONDS = 30
+TRANSCODER_PREVIEW_LIVE_PER_PASS = 8
+TRANSCODER_PREVIEW_LIVE_INTERVAL = 60  # seconds
+TRANSCODER_PREVIEW_SPRITES_PER_PASS = 4
+TRANSCODER_PREVIEW_SPRITE_INTERVAL = 10  # seconds
+TRANSCODER_PREVIEW_SPRITE_LOOKBACK_HOURS = 24
+TRANSCODER_PREVIEW_CACHE_MB = 256
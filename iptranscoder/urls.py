@@ -16,9 +16,25 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from transcoder.admin_views import transcoder_overview
+from transcoder.admin_views import (
+    bulk_import,
+    capacity_planner,
+    enforcer_metrics,
+    live_status,
+    live_status_json,
+    live_status_stream,
+    preview_image,
+    transcoder_overview,
+)
 
 urlpatterns = [
     path("admin/transcoder/overview/", transcoder_overview, name="transcoder_overview"),
+    path("admin/transcoder/metrics/", enforcer_metrics, name="transcoder_enforcer_metrics"),
+    path("admin/transcoder/status/", live_status, name="transcoder_live_status"),
+    path("admin/transcoder/status/changes/", live_status_json, name="transcoder_live_status_json"),
+    path("admin/transcoder/status/stream/", live_status_stream, name="transcoder_live_status_stream"),
+    path("admin/transcoder/import/", bulk_import, name="transcoder_bulk_import"),
+    path("admin/transcoder/planner/", capacity_planner, name="transcoder_capacity_planner"),
+    path("admin/transcoder/previews/<path:name>", preview_image, name="transcoder_preview_image"),
     path('admin/', admin.site.urls),
 ]
@@ -1,5 +1,61 @@
-from django.contrib import admin
-from .models import Channel, Schedule, RecurringSchedule, TimeShiftProfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .bulk_io import export_csv, export_json
+from .models import (
+    ArchiveJob,
+    ArchiveProfile,
+    ArchiveStatus,
+    Channel,
+    ClipExport,
+    ClipStatus,
+    CoverageInterval,
+    RecordingSegment,
+    Schedule,
+    RecurringSchedule,
+    TimeShiftProfile,
+)
+from .planner import plan_capacity, schedule_warnings
+
+
+def _download(text: str, filename: str, content_type: str) -> HttpResponse:
+    response = HttpResponse(text, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@admin.action(description="Export selected (with schedules and profiles) as JSON")
+def export_channels_json(modeladmin, request, queryset):
+    return _download(export_json(queryset), "transcoder_channels.json", "application/json")
+
+
+def _warn_capacity(request, obj, key, start=None, days=None) -> None:
+    """
+    After saving an enabled schedule, simulate its horizon and warn about
+    overloads and duplicate jobs it takes part in.
+    """
+    if not obj.enabled:
+        return
+    plan = plan_capacity(start, days)
+    for message in schedule_warnings(plan, key):
+        messages.warning(request, f"{obj.name}: {message}")
+
+
+def _csv_export_action(kind: str):
+    @admin.action(description="Export selected as CSV")
+    def export_selected_csv(modeladmin, request, queryset):
+        return _download(export_csv(kind, queryset), f"transcoder_{kind}.csv", "text/csv")
+    return export_selected_csv
+
+
+class TimeShiftProfileInline(admin.TabularInline):
+    model = TimeShiftProfile
+    fields = ("enabled", "delay_minutes", "output_udp_url", "gap_mode")
+    extra = 0
 
 
 @admin.register(Channel)
@@ -25,6 +81,8 @@ class ChannelAdmin(admin.ModelAdmin):
     )
     search_fields = ("name", "input_url", "output_target")
     readonly_fields = ("created_at", "updated_at")
+    actions = [export_channels_json, _csv_export_action("channels")]
+    inlines = [TimeShiftProfileInline]
 
     fieldsets = (
         ("General", {
@@ -41,6 +99,7 @@ class ChannelAdmin(admin.ModelAdmin):
             "fields": (
                 "output_type",
                 "output_target",
+                "udp_muxrate",
             ),
         }),
         ("Recording", {
@@ -48,8 +107,15 @@ class ChannelAdmin(admin.ModelAdmin):
                 "record_enabled",
                 "recording_path_template",
                 "recording_segment_minutes",
+                "recording_segment_seconds",
+                "recording_aligned",
+                "recording_staged",
+                "recording_format",
             ),
         }),
+        ("Scheduling", {
+            "fields": ("preroll_seconds",),
+        }),
         ("Processing", {
             "fields": (
                 "video_mode",
@@ -84,13 +150,22 @@ class ScheduleAdmin(admin.ModelAdmin):
     search_fields = ("name",)
     autocomplete_fields = ("channel",)
     readonly_fields = ("created_at", "updated_at")
+    actions = [_csv_export_action("schedules")]
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        now = timezone.now()
+        start = max(now, obj.start_at - timedelta(seconds=settings.TRANSCODER_MAX_PREROLL_SECONDS))
+        if obj.end_at > start:
+            days = min((obj.end_at - start).total_seconds() / 86400, 31)
+            _warn_capacity(request, obj, ("oneoff", obj.pk), start, days)
 
     fieldsets = (
         ("General", {
             "fields": ("name", "channel", "purpose", "enabled"),
         }),
         ("Timing", {
-            "fields": ("start_at", "end_at"),
+            "fields": ("start_at", "end_at", "preroll_seconds"),
         }),
         ("Timestamps", {
             "fields": ("created_at", "updated_at"),
@@ -128,6 +203,11 @@ class RecurringScheduleAdmin(admin.ModelAdmin):
     search_fields = ("name",)
     autocomplete_fields = ("channel",)
     readonly_fields = ("created_at", "updated_at")
+    actions = [_csv_export_action("recurring_schedules")]
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        _warn_capacity(request, obj, ("recurring", obj.pk))
 
     fieldsets = (
         (None, {
@@ -146,7 +226,7 @@ class RecurringScheduleAdmin(admin.ModelAdmin):
             "description": "Select which days this schedule is active (Sat → Fri).",
         }),
         ("Time window", {
-            "fields": ("start_time", "end_time", "date_from", "date_to"),
+            "fields": ("start_time", "end_time", "date_from", "date_to", "preroll_seconds"),
         }),
         ("Timestamps", {
             "fields": ("created_at", "updated_at"),
@@ -161,20 +241,185 @@ class TimeShiftProfileAdmin(admin.ModelAdmin):
         "enabled",
         "delay_minutes",
         "output_udp_url",
+        "gap_mode",
         "created_at",
     )
-    list_filter = ("enabled",)
+    list_filter = ("enabled", "gap_mode")
     autocomplete_fields = ("channel",)
     readonly_fields = ("created_at", "updated_at")
+    actions = [_csv_export_action("timeshift_profiles")]
 
     fieldsets = (
         (None, {
             "fields": ("channel", "enabled"),
         }),
         ("Delay settings", {
-            "fields": ("delay_minutes", "output_udp_url"),
+            "fields": ("delay_minutes", "output_udp_url", "gap_mode"),
         }),
         ("Timestamps", {
             "fields": ("created_at", "updated_at"),
         }),
     )
+
+
+@admin.action(description="Queue selected clips again")
+def requeue_clips(modeladmin, request, queryset):
+    count = queryset.exclude(status=ClipStatus.QUEUED).update(
+        status=ClipStatus.QUEUED, error="", started_at=None, finished_at=None
+    )
+    messages.info(request, f"{count} clip(s) queued; `transcoder_clips run` processes them.")
+
+
+@admin.register(ClipExport)
+class ClipExportAdmin(admin.ModelAdmin):
+    list_display = (
+        "channel",
+        "start_at",
+        "end_at",
+        "precise",
+        "output_format",
+        "status",
+        "size_bytes",
+        "created_at",
+    )
+    list_filter = ("status", "precise", "channel")
+    autocomplete_fields = ("channel",)
+    readonly_fields = (
+        "status",
+        "output_path",
+        "size_bytes",
+        "segments",
+        "error",
+        "created_at",
+        "started_at",
+        "finished_at",
+    )
+    actions = [requeue_clips]
+
+    fieldsets = (
+        (None, {
+            "fields": ("channel", ("start_at", "end_at"), "precise", "output_format"),
+        }),
+        ("Result", {
+            "fields": ("status", "output_path", "size_bytes", "segments", "error"),
+        }),
+        ("Timestamps", {
+            "fields": ("created_at", "started_at", "finished_at"),
+        }),
+    )
+
+
+@admin.register(ArchiveProfile)
+class ArchiveProfileAdmin(admin.ModelAdmin):
+    list_display = (
+        "channel",
+        "enabled",
+        "after_days",
+        "video_codec",
+        "video_bitrate",
+        "max_height",
+        "audio_bitrate",
+    )
+    list_filter = ("enabled", "video_codec")
+    autocomplete_fields = ("channel",)
+
+    fieldsets = (
+        (None, {
+            "fields": ("channel", "enabled", "after_days"),
+        }),
+        ("Encoding", {
+            "fields": (
+                ("video_codec", "preset"),
+                ("video_bitrate", "crf"),
+                "max_height",
+                "audio_bitrate",
+            ),
+            "description": "Segments are re-encoded by `transcoder_archive run` at idle priority.",
+        }),
+    )
+
+
+@admin.action(description="Queue selected again (due now)")
+def requeue_archive_jobs(modeladmin, request, queryset):
+    count = queryset.exclude(status__in=[ArchiveStatus.DONE, ArchiveStatus.RUNNING]).update(
+        status=ArchiveStatus.QUEUED, error="", attempts=0, due_at=timezone.now(),
+        started_at=None, finished_at=None,
+    )
+    messages.info(request, f"{count} segment(s) queued; archived and running ones are left alone.")
+
+
+@admin.register(ArchiveJob)
+class ArchiveJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "path",
+        "channel",
+        "status",
+        "due_at",
+        "attempts",
+        "original_bytes",
+        "archived_bytes",
+        "finished_at",
+    )
+    list_filter = ("status", "channel")
+    search_fields = ("path",)
+    date_hierarchy = "due_at"
+    readonly_fields = (
+        "channel",
+        "path",
+        "status",
+        "attempts",
+        "original_bytes",
+        "archived_bytes",
+        "encode_seconds",
+        "error",
+        "created_at",
+        "started_at",
+        "finished_at",
+    )
+    actions = [requeue_archive_jobs]
+
+    fieldsets = (
+        (None, {
+            "fields": ("channel", "path", "due_at"),
+        }),
+        ("Result", {
+            "fields": ("status", "attempts", ("original_bytes", "archived_bytes"), "encode_seconds", "error"),
+        }),
+        ("Timestamps", {
+            "fields": ("created_at", "started_at", "finished_at"),
+        }),
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(CoverageInterval)
+class CoverageIntervalAdmin(admin.ModelAdmin):
+    """
+    Read-only: the map is maintained by the segment watcher and
+    `transcoder_continuity scan|rebuild`.
+    """
+    list_display = ("channel", "start_at", "end_at", "segments", "cc_errors", "pcr_discontinuities")
+    list_filter = ("channel",)
+    date_hierarchy = "start_at"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RecordingSegment)
+class RecordingSegmentAdmin(admin.ModelAdmin):
+    list_display = ("path", "channel", "start_at", "end_at", "size_bytes", "cc_errors", "pcr_discontinuities")
+    list_filter = ("channel",)
+    search_fields = ("path",)
+    date_hierarchy = "start_at"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
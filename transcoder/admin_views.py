@@ -1,8 +1,23 @@
 # transcoder/admin_views.py
+import asyncio
+import json
+import time
+
+from django.conf import settings
 from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_http_methods
 
+from .bulk_io import KINDS, BulkImportError, apply_import, parse_csv, parse_json, plan_import
 from .models import Channel, RecurringSchedule, TimeShiftProfile, JobPurpose
+from .job_logs import read_job_logs
+from .live_status import broker
+from .planner import plan_capacity
+from .previews import channel_previews, mark_used, preview_root
+from .procstats import channel_cost_profile, read_procstats
+from .profiling import read_metrics, to_prometheus
 
 
 @staff_member_required
@@ -11,10 +26,10 @@ def transcoder_overview(request):
     High-level overview of channels, timeshift profiles, and schedules.
     Visible only to staff via /admin/transcoder/overview/.
     """
-    # Channels with their 1:1 TimeShiftProfile
+    # Channels with their TimeShiftProfiles (one per delay)
     channels = (
         Channel.objects.all()
-        .select_related("timeshift_profile")
+        .prefetch_related("timeshift_profiles")
         .order_by("id")
     )
 
@@ -45,9 +60,208 @@ def transcoder_overview(request):
 
         schedules_by_channel[rs.channel_id][bucket].append(rs)
 
+    metrics = read_metrics()
+    enforcer_phases = []
+    if metrics:
+        for name, hist in metrics["histograms"].items():
+            if name == "tick" or name.startswith("phase."):
+                enforcer_phases.append({"name": name.replace("phase.", "", 1), **hist})
+
+    # Host cost per channel: live view from the enforcer, 24h from history.
+    procstats = read_procstats() or {"channels": {}}
+    history = channel_cost_profile(days=1)
+    resources_by_channel = {
+        ch.id: {"now": procstats["channels"].get(ch.id), "day": history.get(ch.id)}
+        for ch in channels
+    }
+
     context = {
         "title": "IP Transcoder Overview",
         "channels": channels,
         "schedules_by_channel": schedules_by_channel,
+        "enforcer_metrics": metrics,
+        "enforcer_phases": enforcer_phases,
+        "resources_by_channel": resources_by_channel,
+        "job_logs_by_channel": read_job_logs(),
+        "previews_by_channel": channel_previews(channels),
     }
     return render(request, "admin/transcoder/overview.html", context)
+
+
+@staff_member_required
+def preview_image(request, name):
+    """
+    A thumbnail or sprite from the preview cache (transcoder_previews);
+    serving it keeps it in the cache.
+    """
+    root = preview_root().resolve()
+    path = (root / name).resolve()
+    if root not in path.parents or path.suffix != ".jpg" or not path.is_file():
+        raise Http404("No such preview")
+    mark_used(path)
+    response = FileResponse(open(path, "rb"), content_type="image/jpeg")
+    response["Cache-Control"] = "private, max-age=30"
+    return response
+
+
+@staff_member_required
+def enforcer_metrics(request):
+    """
+    Tick/phase timing histograms and counters dumped by the running enforcer.
+    JSON by default, Prometheus text format with ?format=prometheus.
+    """
+    metrics = read_metrics()
+    if metrics is None:
+        return JsonResponse({"error": "no metrics yet (is the enforcer running?)"}, status=404)
+    if request.GET.get("format") == "prometheus":
+        return HttpResponse(to_prometheus(metrics), content_type="text/plain; version=0.0.4")
+    return JsonResponse(metrics)
+
+
+@staff_member_required
+def live_status(request):
+    """
+    Running jobs as reported by the enforcer, updated in place over SSE
+    (or by polling live_status_json when served through WSGI).
+    """
+    return render(request, "admin/transcoder/live_status.html", {
+        "title": "Live job status",
+        "stream": isinstance(request, ASGIRequest),
+    })
+
+
+def _since(request) -> int:
+    try:
+        return int(request.headers.get("Last-Event-ID") or request.GET.get("since") or 0)
+    except ValueError:
+        return 0
+
+
+@staff_member_required
+def live_status_json(request):
+    """
+    Changes since ?since=<version>: {version, full, jobs, removed}.
+    """
+    broker.refresh()
+    return JsonResponse(broker.since(_since(request)))
+
+
+@staff_member_required
+async def live_status_stream(request):
+    """
+    Server-sent events: one "status" event per snapshot version, carrying
+    only the jobs that changed. Needs an ASGI server; under WSGI the stream
+    would tie up a worker forever, so the page polls instead.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "streaming needs ASGI; poll live_status_json"}, status=501)
+
+    interval = settings.TRANSCODER_STATUS_REFRESH_SECONDS
+    version = _since(request)
+
+    async def events():
+        nonlocal version
+        last_sent = time.monotonic()
+        yield f"retry: {int(interval * 2000)}\n\n"
+        while True:
+            current = await asyncio.to_thread(broker.refresh)
+            if current != version:
+                payload = broker.since(version)
+                version = payload["version"]
+                last_sent = time.monotonic()
+                yield f"id: {version}\nevent: status\ndata: {json.dumps(payload)}\n\n"
+            elif time.monotonic() - last_sent > 15:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+            await asyncio.sleep(interval)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: don't buffer the stream
+    return response
+
+
+@staff_member_required
+@require_http_methods(["GET", "POST"])
+def bulk_import(request):
+    """
+    Upload a JSON export or a CSV of one kind; the first submit is a dry run
+    showing the diff, "Apply" writes it in one transaction.
+    """
+    context = {"title": "Import schedules", "kinds": list(KINDS), "errors": [], "plan": None}
+    if request.method == "POST":
+        upload = request.FILES.get("file")
+        text = upload.read().decode("utf-8-sig") if upload else request.POST.get("payload", "")
+        filename = upload.name if upload else request.POST.get("filename", "")
+        fmt = "csv" if filename.endswith(".csv") else "json"
+        kind = request.POST.get("kind") or ""
+        allow_overlaps = bool(request.POST.get("allow_overlaps"))
+        context.update(payload=text, filename=filename, kind=kind, allow_overlaps=allow_overlaps)
+        try:
+            data = parse_json(text) if fmt == "json" else parse_csv(text, kind)
+            plan = plan_import(data, allow_overlaps=allow_overlaps)
+        except ValueError as exc:
+            context["errors"] = [f"Cannot parse {filename or 'upload'}: {exc}"]
+        except BulkImportError as exc:
+            context["errors"] = exc.errors
+        else:
+            context.update(
+                plan=plan,
+                summary=plan.summary(),
+                changes=plan.changes[:500],
+                more=max(0, len(plan.changes) - 500),
+            )
+            if request.POST.get("apply"):
+                context["applied"] = apply_import(plan)
+    return render(request, "admin/transcoder/bulk_import.html", context)
+
+
+@staff_member_required
+def capacity_planner(request):
+    """
+    Fast-forward simulation of the schedules over ?days= (default one week):
+    hourly peaks, periods over capacity and duplicate jobs.
+    """
+    try:
+        days = min(max(float(request.GET.get("days") or settings.TRANSCODER_PLANNER_HORIZON_DAYS), 1 / 24), 31)
+    except ValueError:
+        days = settings.TRANSCODER_PLANNER_HORIZON_DAYS
+    prefix = request.GET.get("channel_prefix", "")
+    started = time.perf_counter()
+    plan = plan_capacity(days=days, channel_prefix=prefix)
+    elapsed = time.perf_counter() - started
+
+    series = list(plan.series())
+    peaks = plan.peaks()
+    rows = []
+    for row in plan.hourly():
+        rows.append({
+            "start": row["start"],
+            "cells": [
+                {"value": row[name], "over": bool(plan.capacity.get(name)) and row[name] > plan.capacity[name]}
+                for name in series
+            ],
+        })
+    return render(request, "admin/transcoder/capacity_planner.html", {
+        "title": "Capacity planner",
+        "plan": plan,
+        "days": days,
+        "channel_prefix": prefix,
+        "elapsed": elapsed,
+        "series": [
+            {"name": name, "capacity": plan.capacity.get(name), "peak": peaks[name][0],
+             "peak_at": plan.at(peaks[name][1])}
+            for name in series
+        ],
+        "rows": rows,
+        "overloads": [
+            {"o": o, "start": plan.at(o.start), "end": plan.at(o.end)} for o in plan.overloads[:200]
+        ],
+        "duplicates": [
+            {"a": a, "b": b, "start": plan.at(max(a.start, b.start))} for a, b in plan.duplicates[:200]
+        ],
+        "shared_inputs": sorted(
+            ((url, e) for url, e in plan.inputs.items() if e["peak_readers"] > 1),
+            key=lambda item: -item[1]["peak_readers"],
+        )[:50],
+    })
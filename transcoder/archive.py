@@ -0,0 +1,353 @@
+# transcoder/archive.py
+"""
+Archive transcoding: recording segments older than a channel's
+ArchiveProfile.after_days are re-encoded to a smaller profile in place.
+
+The queue is the ArchiveJob table. Jobs come from the segment watcher
+(`archive_consumer` in TRANSCODER_SEGMENT_CONSUMERS) and from periodic scans
+of the recording folders, so segments recorded while nothing was watching
+are picked up too. Workers run ffmpeg at idle priority and swap the result
+in with a rename onto the same file name: playback and clip lookups go by
+name and keep working, and readers that already have the old file open keep
+reading it until they close it.
+"""
+import logging
+import os
+import subprocess
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .clips import parse_segment_name
+from .models import ArchiveJob, ArchiveProfile, ArchiveStatus, Channel
+from .mp4 import MOVFLAGS, Mp4Error, Mp4File
+from .mpegts import TsError, TsFile
+from .segment_watcher import SegmentClosed, recording_root
+from .work_queue import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = timedelta(minutes=10)  # doubled after each failed attempt
+DURATION_TOLERANCE = 1.0  # seconds the archived copy may differ from the original
+
+
+class ArchiveError(Exception):
+    pass
+
+
+# ------------------------
+# Enqueueing
+# ------------------------
+
+def _enabled_profiles(channel_ids: Optional[Iterable[int]] = None) -> Dict[int, ArchiveProfile]:
+    qs = ArchiveProfile.objects.filter(enabled=True).select_related("channel")
+    if channel_ids is not None:
+        qs = qs.filter(channel_id__in=set(channel_ids))
+    return {profile.channel_id: profile for profile in qs}
+
+
+def _enqueue(jobs: List[ArchiveJob]) -> int:
+    """
+    Insert jobs, ignoring segments that are already queued (or archived).
+    Returns how many rows were offered.
+    """
+    ArchiveJob.objects.bulk_create(jobs, batch_size=1000, ignore_conflicts=True)
+    return len(jobs)
+
+
+def archive_consumer(events: List[SegmentClosed]) -> None:
+    """
+    Segment watcher consumer: queue each closed segment of a channel with an
+    enabled ArchiveProfile, due `after_days` after it was closed. Duplicate
+    events (a renamed-in archived file shows up as a new segment) are ignored.
+    """
+    profiles = _enabled_profiles(event.channel_id for event in events)
+    jobs = []
+    for event in events:
+        profile = profiles.get(event.channel_id)
+        if profile is None or event.path.suffix not in (".ts", ".mp4"):
+            continue
+        closed = datetime.fromtimestamp(event.closed_at, tz=dt_timezone.utc)
+        jobs.append(ArchiveJob(
+            channel_id=event.channel_id,
+            path=str(event.path),
+            due_at=closed + timedelta(days=profile.after_days),
+        ))
+    if jobs:
+        _enqueue(jobs)
+
+
+def enqueue_existing(channels: Optional[Iterable[Channel]] = None) -> int:
+    """
+    Walk the recording folders of channels with an enabled ArchiveProfile
+    and queue every closed segment (unchanged for
+    TRANSCODER_SEGMENT_STABLE_SECONDS), due `after_days` after its mtime.
+    Returns the number of segments seen.
+    """
+    profiles = _enabled_profiles(None if channels is None else (c.pk for c in channels))
+    stable_before = time.time() - settings.TRANSCODER_SEGMENT_STABLE_SECONDS
+    seen = 0
+    for profile in profiles.values():
+        chan = profile.channel
+        jobs = []
+        for folder, _, files in os.walk(recording_root(chan)):
+            for name in files:
+                if parse_segment_name(chan, name) is None:
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    continue
+                if mtime > stable_before:
+                    continue  # still being written
+                jobs.append(ArchiveJob(
+                    channel=chan,
+                    path=path,
+                    due_at=datetime.fromtimestamp(mtime, tz=dt_timezone.utc) + timedelta(days=profile.after_days),
+                ))
+        seen += _enqueue(jobs)
+    return seen
+
+
+# ------------------------
+# Queue
+# ------------------------
+
+def claim_next() -> Optional[ArchiveJob]:
+    """
+    Take the queued job that has been due the longest, marking it running.
+    The conditional UPDATE lets exactly one worker win each job.
+    """
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            job = (
+                ArchiveJob.objects.filter(status=ArchiveStatus.QUEUED, due_at__lte=now)
+                .select_related("channel__archive_profile")
+                .order_by("due_at", "pk")
+                .first()
+            )
+            if job is None:
+                return None
+            claimed = ArchiveJob.objects.filter(pk=job.pk, status=ArchiveStatus.QUEUED).update(
+                status=ArchiveStatus.RUNNING, started_at=now, attempts=job.attempts + 1
+            )
+        if claimed:
+            job.status, job.started_at, job.attempts = ArchiveStatus.RUNNING, now, job.attempts + 1
+            return job
+
+
+def requeue_stale() -> int:
+    """
+    Put jobs left running by a worker that died back in the queue. Call at
+    start-up, before any worker of this queue is running.
+    """
+    return ArchiveJob.objects.filter(status=ArchiveStatus.RUNNING).update(
+        status=ArchiveStatus.QUEUED, started_at=None
+    )
+
+
+# ------------------------
+# Re-encoding
+# ------------------------
+
+def build_archive_cmd(profile: ArchiveProfile, source: Path, output: Path) -> List[str]:
+    codec = profile.video_codec or "h264"
+    args = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-nostdin",
+        "-i", str(source),
+        "-map", "0:v?", "-map", "0:a?",
+        # Same timestamps as the original, so concatenated/cut segments line up,
+        # and a keyframe every 2s so clips can still be cut without decoding.
+        "-copyts", "-muxdelay", "0",
+        "-c:v", {"h264": "libx264", "hevc": "libx265"}.get(codec, codec),
+        "-preset", profile.preset,
+        "-force_key_frames", "expr:gte(t,n_forced*2)",
+    ]
+    if profile.video_bitrate:
+        args += ["-b:v", profile.video_bitrate]
+    else:
+        args += ["-crf", str(profile.crf)]
+    if profile.max_height:
+        args += ["-vf", f"scale=-2:'min({profile.max_height},ih)'"]
+    args += ["-c:a", "aac", "-b:a", profile.audio_bitrate]
+    # Same container as the original: the segment keeps its name.
+    if source.suffix == ".mp4":
+        args += ["-f", "mp4", "-movflags", MOVFLAGS, str(output)]
+    else:
+        args += ["-f", "mpegts", str(output)]
+    return args
+
+
+def _lower_priority() -> None:
+    """
+    preexec_fn for archive encodes: nice, and the idle scheduling class
+    where available, so recording and playback jobs always come first.
+    """
+    try:
+        os.nice(settings.TRANSCODER_ARCHIVE_NICE)
+        if hasattr(os, "SCHED_IDLE"):
+            os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+    except OSError:
+        pass
+
+
+def _duration(path: Path, suffix: str) -> float:
+    """
+    Duration of a segment, or of its archived copy (.part name): `suffix`
+    is the container's, ".ts" or ".mp4".
+    """
+    try:
+        if suffix == ".mp4":
+            with Mp4File(path) as mp4:
+                return mp4.duration()
+        with TsFile(path) as ts:
+            return ts.duration()
+    except (OSError, TsError, Mp4Error) as exc:
+        raise ArchiveError(f"Cannot read {path}: {exc}") from exc
+
+
+def _finish(job: ArchiveJob, status: str, error: str = "") -> ArchiveJob:
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=[
+        "status", "error", "due_at", "original_bytes", "archived_bytes", "encode_seconds", "finished_at",
+    ])
+    return job
+
+
+def archive_segment(job: ArchiveJob) -> ArchiveJob:
+    """
+    Re-encode one segment next to the original, check the result and rename
+    it over the original. Failed attempts are retried with a growing delay
+    up to TRANSCODER_ARCHIVE_MAX_ATTEMPTS; a result that is not smaller is
+    thrown away and the job marked skipped.
+    """
+    profile = getattr(job.channel, "archive_profile", None)
+    if profile is None or not profile.enabled:
+        return _finish(job, ArchiveStatus.SKIPPED, "archiving is disabled for this channel")
+
+    source = Path(job.path)
+    tmp = source.with_name(f".{source.name}.part")
+    try:
+        st = source.stat()
+    except FileNotFoundError:
+        return _finish(job, ArchiveStatus.SKIPPED, "segment no longer exists")
+    except OSError as exc:
+        return _retry_or_fail(job, f"Cannot stat {source}: {exc}")
+    job.original_bytes = st.st_size
+
+    try:
+        original_duration = _duration(source, source.suffix)
+        started = time.monotonic()
+        proc = subprocess.run(
+            build_archive_cmd(profile, source, tmp),
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            preexec_fn=_lower_priority,
+        )
+        job.encode_seconds = time.monotonic() - started
+        if proc.returncode != 0:
+            stderr = proc.stderr.strip().splitlines()
+            raise ArchiveError(f"ffmpeg exited with {proc.returncode}: {stderr[-1] if stderr else ''}")
+        archived_duration = _duration(tmp, source.suffix)
+        if abs(archived_duration - original_duration) > DURATION_TOLERANCE:
+            raise ArchiveError(
+                f"archived copy lasts {archived_duration:.1f}s, the original {original_duration:.1f}s"
+            )
+
+        size = tmp.stat().st_size
+        if size >= st.st_size:
+            tmp.unlink()
+            job.archived_bytes = st.st_size
+            return _finish(job, ArchiveStatus.SKIPPED, f"re-encoded size {size} is not smaller")
+
+        # Keep the original's mode and times: retention and the segment
+        # watcher go by mtime, and nothing should see the segment as new.
+        os.chmod(tmp, st.st_mode & 0o7777)
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        if source.stat().st_ino != st.st_ino:
+            raise ArchiveError("segment was replaced while it was being archived")
+        os.replace(tmp, source)
+        job.archived_bytes = size
+    except (ArchiveError, OSError) as exc:
+        tmp.unlink(missing_ok=True)
+        return _retry_or_fail(job, str(exc))
+    return _finish(job, ArchiveStatus.DONE)
+
+
+def _retry_or_fail(job: ArchiveJob, error: str) -> ArchiveJob:
+    if job.attempts < settings.TRANSCODER_ARCHIVE_MAX_ATTEMPTS:
+        job.due_at = timezone.now() + RETRY_DELAY * 2 ** (job.attempts - 1)
+        return _finish(job, ArchiveStatus.QUEUED, error)
+    return _finish(job, ArchiveStatus.FAILED, error)
+
+
+def _archive_crashed(job: ArchiveJob) -> None:
+    ArchiveJob.objects.filter(pk=job.pk).update(
+        status=ArchiveStatus.FAILED, error="internal error, see worker log", finished_at=timezone.now()
+    )
+
+
+def _process_archive(job: ArchiveJob) -> bool:
+    archive_segment(job)
+    if job.status in (ArchiveStatus.QUEUED, ArchiveStatus.FAILED):
+        logger.warning("Archiving %s failed (attempt %s): %s", job.path, job.attempts, job.error)
+    return job.status in (ArchiveStatus.DONE, ArchiveStatus.SKIPPED)
+
+
+def archive_worker_pool(workers: Optional[int] = None) -> WorkerPool:
+    """
+    Pool re-encoding due segments, at most `workers` ffmpeg processes at once.
+    """
+    return WorkerPool(
+        claim_next,
+        _process_archive,
+        workers or settings.TRANSCODER_ARCHIVE_WORKERS,
+        name="archive",
+        on_crash=_archive_crashed,
+    )
+
+
+# ------------------------
+# Reporting
+# ------------------------
+
+def archive_stats(since: Optional[datetime] = None) -> dict:
+    """
+    Queue depth per status, storage saved and encode throughput, over all
+    finished jobs or those finished after `since`.
+    """
+    counts = dict(ArchiveJob.objects.values_list("status").annotate(n=Count("pk")).order_by())
+    finished = ArchiveJob.objects.filter(status=ArchiveStatus.DONE)
+    if since is not None:
+        finished = finished.filter(finished_at__gte=since)
+    totals = finished.aggregate(
+        segments=Count("pk"),
+        original=Sum("original_bytes"),
+        archived=Sum("archived_bytes"),
+        seconds=Sum("encode_seconds"),
+    )
+    original = totals["original"] or 0
+    archived = totals["archived"] or 0
+    seconds = totals["seconds"] or 0.0
+    return {
+        "counts": {status: counts.get(status, 0) for status in ArchiveStatus.values},
+        "due": ArchiveJob.objects.filter(status=ArchiveStatus.QUEUED, due_at__lte=timezone.now()).count(),
+        "segments": totals["segments"],
+        "original_bytes": original,
+        "archived_bytes": archived,
+        "saved_bytes": original - archived,
+        "ratio": archived / original if original else None,
+        "encode_seconds": seconds,
+        "mb_per_second": original / seconds / 1e6 if seconds else None,
+    }
@@ -0,0 +1,484 @@
+# transcoder/bulk_io.py
+import csv
+import datetime
+import heapq
+import io
+import json
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Channel, RecurringSchedule, Schedule, TimeShiftProfile
+
+# Exported/imported fields per kind. Rows reference channels by name and
+# are matched against existing objects by natural key (see _natural_key):
+#   channels: name, timeshift_profiles: (channel, delay_minutes),
+#   schedules and recurring_schedules: (channel, name).
+KINDS = {
+    "channels": (Channel, [
+        "name", "enabled", "input_type", "input_url", "multicast_interface",
+        "output_type", "output_target", "udp_muxrate", "record_enabled", "recording_path_template",
+        "recording_segment_minutes", "recording_segment_seconds", "recording_aligned",
+        "recording_staged", "recording_format", "preroll_seconds", "video_mode", "audio_mode", "video_codec",
+        "audio_codec", "hardware_preference", "target_width", "target_height", "video_bitrate",
+    ]),
+    "timeshift_profiles": (TimeShiftProfile, [
+        "channel", "enabled", "delay_minutes", "output_udp_url", "gap_mode",
+    ]),
+    "schedules": (Schedule, [
+        "channel", "name", "purpose", "enabled", "start_at", "end_at", "preroll_seconds",
+    ]),
+    "recurring_schedules": (RecurringSchedule, [
+        "channel", "name", "purpose", "enabled",
+        "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+        "start_time", "end_time", "date_from", "date_to", "preroll_seconds",
+    ]),
+}
+# Import order: schedules and profiles need their channels first.
+KIND_ORDER = ["channels", "timeshift_profiles", "schedules", "recurring_schedules"]
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+WEEK_MINUTES = 7 * 24 * 60
+BATCH_SIZE = 1000
+
+
+class BulkImportError(Exception):
+    """
+    Raised with the full list of row errors; nothing has been written.
+    """
+
+    def __init__(self, errors: List[str]):
+        super().__init__(f"{len(errors)} error(s)")
+        self.errors = errors
+
+
+# ------------------------
+# Export
+# ------------------------
+
+def _export_value(value):
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).isoformat() if timezone.is_aware(value) else value.isoformat()
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def export_rows(kind: str, queryset=None) -> List[dict]:
+    model, fields = KINDS[kind]
+    qs = queryset if queryset is not None else model.objects.all()
+    if "channel" in fields:
+        qs = qs.select_related("channel")
+    rows = []
+    for obj in qs.order_by("pk"):
+        row = {}
+        for name in fields:
+            row[name] = obj.channel.name if name == "channel" else _export_value(getattr(obj, name))
+        rows.append(row)
+    return rows
+
+
+def export_json(channels=None) -> str:
+    """
+    Channels (all, or the given queryset) with their profiles and schedules.
+    """
+    channels = channels if channels is not None else Channel.objects.all()
+    data = {
+        "channels": export_rows("channels", channels),
+        "timeshift_profiles": export_rows(
+            "timeshift_profiles", TimeShiftProfile.objects.filter(channel__in=channels)
+        ),
+        "schedules": export_rows("schedules", Schedule.objects.filter(channel__in=channels)),
+        "recurring_schedules": export_rows(
+            "recurring_schedules", RecurringSchedule.objects.filter(channel__in=channels)
+        ),
+    }
+    return json.dumps(data, indent=2)
+
+
+def export_csv(kind: str, queryset=None) -> str:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=KINDS[kind][1])
+    writer.writeheader()
+    for row in export_rows(kind, queryset):
+        writer.writerow({k: "" if v is None else v for k, v in row.items()})
+    return out.getvalue()
+
+
+# ------------------------
+# Parsing
+# ------------------------
+
+def parse_json(text: str) -> Dict[str, List[dict]]:
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise BulkImportError(["JSON import must be an object keyed by kind."])
+    unknown = set(data) - set(KINDS)
+    if unknown:
+        raise BulkImportError([f"Unknown kind(s): {', '.join(sorted(unknown))}"])
+    return {kind: list(data.get(kind) or []) for kind in KINDS}
+
+
+def parse_csv(text: str, kind: str) -> Dict[str, List[dict]]:
+    if kind not in KINDS:
+        raise BulkImportError([f"Unknown kind {kind!r}; expected one of {', '.join(KINDS)}."])
+    reader = csv.DictReader(io.StringIO(text))
+    unknown = set(reader.fieldnames or []) - set(KINDS[kind][1])
+    if unknown:
+        raise BulkImportError([f"Unknown column(s) for {kind}: {', '.join(sorted(unknown))}"])
+    data = {k: [] for k in KINDS}
+    data[kind] = list(reader)
+    return data
+
+
+# ------------------------
+# Import planning
+# ------------------------
+
+@dataclass
+class Change:
+    kind: str
+    key: tuple
+    action: str  # "create" | "update"
+    changes: Dict[str, Tuple[object, object]] = field(default_factory=dict)
+
+    def describe(self) -> str:
+        label = "/".join(str(k) for k in self.key)
+        if self.action == "create":
+            return f"+ {self.kind} {label}"
+        diff = ", ".join(f"{name}: {old!r} -> {new!r}" for name, (old, new) in self.changes.items())
+        return f"~ {self.kind} {label}: {diff}"
+
+
+@dataclass
+class ImportPlan:
+    changes: List[Change] = field(default_factory=list)
+    unchanged: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    warnings: List[str] = field(default_factory=list)
+    # kind -> objects to insert / (objects, fields) to update
+    _create: Dict[str, list] = field(default_factory=lambda: defaultdict(list))
+    _update: Dict[str, list] = field(default_factory=lambda: defaultdict(list))
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        out = {kind: {"create": 0, "update": 0, "unchanged": self.unchanged[kind]} for kind in KIND_ORDER}
+        for change in self.changes:
+            out[change.kind][change.action] += 1
+        return out
+
+
+def _natural_key(kind: str, values: dict, repeated_names=()) -> tuple:
+    """
+    One-off schedules are matched by (channel, name) so that an edited
+    start time updates the row; names that repeat within a channel (in the
+    database or in the file) also need start_at to tell the rows apart.
+    """
+    if kind == "channels":
+        return (values["name"],)
+    if kind == "timeshift_profiles":
+        return (values["channel"], values.get("delay_minutes"))
+    if kind == "schedules" and (values["channel"], values["name"]) in repeated_names:
+        return (values["channel"], values["name"], values.get("start_at"))
+    return (values["channel"], values["name"])
+
+
+def _repeated(pairs: Iterable[tuple]) -> set:
+    seen, repeated = set(), set()
+    for pair in pairs:
+        (repeated if pair in seen else seen).add(pair)
+    return repeated
+
+
+def _clean_row(kind: str, raw: dict, lineno: int, errors: List[str]) -> Optional[dict]:
+    """
+    Convert and validate one row with the model fields' own clean().
+    Missing columns keep the current value, or the field default for new
+    objects.
+    """
+    model, fields = KINDS[kind]
+    values = {}
+    ok = True
+    for name in fields:
+        if name not in raw:
+            continue
+        value = raw[name]
+        if name == "channel":
+            if not value:
+                errors.append(f"{kind} row {lineno}: channel is required")
+                ok = False
+            values[name] = value
+            continue
+        model_field = model._meta.get_field(name)
+        if value == "" and model_field.null:
+            value = None  # empty CSV cell
+        try:
+            value = model_field.clean(value, None)
+        except ValidationError as exc:
+            errors.append(f"{kind} row {lineno}: {name}: {'; '.join(exc.messages)}")
+            ok = False
+            continue
+        if isinstance(value, datetime.datetime) and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        values[name] = value
+
+    for required in ("delay_minutes",) if kind == "timeshift_profiles" else ("name",):
+        if values.get(required) in (None, ""):
+            errors.append(f"{kind} row {lineno}: {required} is required")
+            ok = False
+    if kind == "schedules" and ok and values.get("start_at") and values.get("end_at"):
+        if values["end_at"] <= values["start_at"]:
+            errors.append(f"{kind} row {lineno}: end_at must be after start_at")
+            ok = False
+    if kind == "recurring_schedules" and ok and values.get("date_from") and values.get("date_to"):
+        if values["date_to"] < values["date_from"]:
+            errors.append(f"{kind} row {lineno}: date_to is before date_from")
+            ok = False
+    return values if ok else None
+
+
+def _optional(model_field) -> bool:
+    return model_field.has_default() or model_field.null or model_field.blank
+
+
+def plan_import(data: Dict[str, List[dict]], allow_overlaps: bool = False) -> ImportPlan:
+    """
+    Validate everything and work out what to create and update, without
+    writing. Raises BulkImportError listing every problem found.
+    """
+    errors: List[str] = []
+    plan = ImportPlan()
+
+    channels = {c.name: c for c in Channel.objects.all()}
+    names_by_id = {c.id: name for name, c in channels.items()}
+    # Only channels the import mentions matter for matching and overlaps.
+    referenced = [
+        channels[name]
+        for name in {row.get("channel") for kind in KIND_ORDER[1:] for row in data.get(kind, [])}
+        if name in channels
+    ]
+
+    loaded = {"channels": list(channels.values())}
+    for model, kind in (
+        (TimeShiftProfile, "timeshift_profiles"),
+        (Schedule, "schedules"),
+        (RecurringSchedule, "recurring_schedules"),
+    ):
+        loaded[kind] = list(model.objects.filter(channel__in=referenced).order_by("pk"))
+        for obj in loaded[kind]:
+            obj._channel_name = names_by_id[obj.channel_id]
+
+    repeated_names = _repeated((s._channel_name, s.name) for s in loaded["schedules"])
+    repeated_names |= _repeated((row.get("channel"), row.get("name")) for row in data.get("schedules", []))
+
+    existing = {}
+    for kind, objs in loaded.items():
+        existing[kind] = {}
+        for obj in objs:
+            values = {"channel": getattr(obj, "_channel_name", None), "name": getattr(obj, "name", None)}
+            if kind == "schedules":
+                values["start_at"] = obj.start_at
+            if kind == "timeshift_profiles":
+                values["delay_minutes"] = obj.delay_minutes
+            existing[kind].setdefault(_natural_key(kind, values, repeated_names), obj)
+
+    new_channel_names = set()
+    for kind in KIND_ORDER:
+        model, fields = KINDS[kind]
+        seen = set()
+        for lineno, raw in enumerate(data.get(kind, []), start=1):
+            values = _clean_row(kind, raw, lineno, errors)
+            if values is None:
+                continue
+            channel_name = values.get("channel")
+            if channel_name is not None and channel_name not in channels and channel_name not in new_channel_names:
+                errors.append(f"{kind} row {lineno}: unknown channel {channel_name!r}")
+                continue
+            if kind == "schedules" and (channel_name, values.get("name")) in repeated_names \
+                    and "start_at" not in values:
+                errors.append(f"{kind} row {lineno}: start_at is needed, the name repeats on this channel")
+                continue
+            key = _natural_key(kind, values, repeated_names)
+            if key in seen:
+                errors.append(f"{kind} row {lineno}: duplicate of an earlier row ({'/'.join(map(str, key))})")
+                continue
+            seen.add(key)
+
+            obj = existing[kind].get(key)
+            if obj is None:
+                missing = [
+                    name for name in fields
+                    if name not in values and not _optional(model._meta.get_field(name))
+                ]
+                if missing:
+                    errors.append(f"{kind} row {lineno}: new row needs {', '.join(missing)}")
+                    continue
+                obj = model(**{k: v for k, v in values.items() if k != "channel"})
+                if channel_name is not None:
+                    obj._channel_name = channel_name  # resolved to an id after channels are written
+                if kind == "channels":
+                    new_channel_names.add(values["name"])
+                plan._create[kind].append(obj)
+                plan.changes.append(Change(kind, key, "create"))
+                existing[kind][key] = obj
+                loaded[kind].append(obj)
+                continue
+
+            changed = {}
+            for name, value in values.items():
+                if name == "channel":
+                    continue
+                old = getattr(obj, name)
+                if old != value:
+                    changed[name] = (_export_value(old), _export_value(value))
+                    setattr(obj, name, value)
+            if kind == "schedules" and obj.end_at <= obj.start_at:
+                errors.append(f"{kind} row {lineno}: end_at must be after start_at")
+                continue
+            if changed:
+                plan._update[kind].append((obj, list(changed)))
+                plan.changes.append(Change(kind, key, "update", changed))
+            else:
+                plan.unchanged[kind] += 1
+
+    touched = {id(obj) for objs in plan._create.values() for obj in objs}
+    touched |= {id(obj) for updates in plan._update.values() for obj, _ in updates}
+    overlap_messages = find_overlaps(loaded["schedules"], loaded["recurring_schedules"], touched)
+    if allow_overlaps:
+        plan.warnings += overlap_messages
+    else:
+        errors += overlap_messages
+
+    if errors:
+        raise BulkImportError(errors)
+    return plan
+
+
+def apply_import(plan: ImportPlan) -> Dict[str, Dict[str, int]]:
+    """
+    Write a plan with bulk_create/bulk_update in a single transaction.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        for kind in KIND_ORDER:
+            model, fields = KINDS[kind]
+            to_create = plan._create.get(kind, [])
+            if to_create and "channel" in fields:
+                names = {obj._channel_name for obj in to_create}
+                ids = dict(Channel.objects.filter(name__in=names).values_list("name", "id"))
+                for obj in to_create:
+                    obj.channel_id = ids[obj._channel_name]
+            model.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+
+            updates = plan._update.get(kind, [])
+            by_fields = defaultdict(list)
+            for obj, changed in updates:
+                obj.updated_at = now  # bulk_update skips auto_now
+                by_fields[tuple(sorted(changed))].append(obj)
+            for changed, objs in by_fields.items():
+                model.objects.bulk_update(objs, list(changed) + ["updated_at"], batch_size=BATCH_SIZE)
+    return plan.summary()
+
+
+# ------------------------
+# Overlap checks
+# ------------------------
+
+def _channel_key(obj) -> str:
+    return getattr(obj, "_channel_name", None) or obj.channel.name
+
+
+def _label(obj) -> str:
+    return f"{_channel_key(obj)}/{obj.name}"
+
+
+def overlapping_pairs(intervals: Iterable[Tuple[object, object, object]], compatible=None) -> List[Tuple[object, object]]:
+    """
+    One pass over (start, end, owner) intervals sorted by start; returns
+    owner pairs whose intervals intersect. Ended intervals leave the active
+    heap as the sweep moves on, so the cost is O(n log n + overlaps).
+    """
+    pairs = []
+    active: List[Tuple[object, int, object]] = []  # (end, seq, owner)
+    for seq, (start, end, owner) in enumerate(sorted(intervals, key=lambda i: i[0])):
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for _, _, other in active:
+            if other is not owner and (compatible is None or compatible(owner, other)):
+                pairs.append((other, owner))
+        heapq.heappush(active, (end, seq, owner))
+    return pairs
+
+
+def _weekly_intervals(rs) -> List[Tuple[int, int]]:
+    """
+    Minutes-of-week intervals of a recurring schedule (Monday 00:00 = 0);
+    windows that wrap past Sunday midnight are split.
+    """
+    start = rs.start_time.hour * 60 + rs.start_time.minute
+    end = rs.end_time.hour * 60 + rs.end_time.minute
+    length = 24 * 60 if start == end else (end - start) % (24 * 60)
+    out = []
+    for day, name in enumerate(WEEKDAYS):
+        if not getattr(rs, name):
+            continue
+        begin = day * 24 * 60 + start
+        finish = begin + length
+        if finish <= WEEK_MINUTES:
+            out.append((begin, finish))
+        else:
+            out += [(begin, WEEK_MINUTES), (0, finish - WEEK_MINUTES)]
+    return out
+
+
+def _date_ranges_meet(a, b) -> bool:
+    lo = max(a.date_from or datetime.date.min, b.date_from or datetime.date.min)
+    hi = min(a.date_to or datetime.date.max, b.date_to or datetime.date.max)
+    return lo <= hi
+
+
+def find_overlaps(schedules, recurring, touched: Optional[set] = None) -> List[str]:
+    """
+    Enabled schedules of the same channel and purpose whose windows
+    intersect would run the same job twice. One sweep per (channel, purpose).
+    With `touched` (a set of id(obj)), only pairs involving one of those
+    objects are reported, so conflicts already in the database do not block
+    an unrelated import.
+    """
+    messages = []
+
+    def relevant(a, b):
+        return touched is None or id(a) in touched or id(b) in touched
+
+    groups = defaultdict(list)
+    for s in schedules:
+        if s.enabled:
+            groups[(_channel_key(s), s.purpose)].append((s.start_at, s.end_at, s))
+    for (channel, purpose), intervals in sorted(groups.items()):
+        for a, b in overlapping_pairs(intervals):
+            if not relevant(a, b):
+                continue
+            messages.append(
+                f"overlap: schedules {_label(a)} ({a.start_at:%Y-%m-%d %H:%M}-{a.end_at:%H:%M}) and "
+                f"{_label(b)} ({b.start_at:%Y-%m-%d %H:%M}-{b.end_at:%H:%M}), {purpose}"
+            )
+
+    groups = defaultdict(list)
+    for rs in recurring:
+        if rs.enabled:
+            for begin, finish in _weekly_intervals(rs):
+                groups[(_channel_key(rs), rs.purpose)].append((begin, finish, rs))
+    for (channel, purpose), intervals in sorted(groups.items()):
+        reported = set()
+        for a, b in overlapping_pairs(intervals, compatible=_date_ranges_meet):
+            pair = (id(a), id(b)) if id(a) < id(b) else (id(b), id(a))
+            if pair in reported or not relevant(a, b):
+                continue
+            reported.add(pair)
+            messages.append(
+                f"overlap: recurring schedules {_label(a)} ({a.start_time:%H:%M}-{a.end_time:%H:%M}) and "
+                f"{_label(b)} ({b.start_time:%H:%M}-{b.end_time:%H:%M}), {purpose}"
+            )
+    return messages
@@ -0,0 +1,408 @@
+# transcoder/clips.py
+import logging
+import math
+import os
+import subprocess
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .ffmpeg_runner import FFmpegJobConfig
+from .models import Channel, ClipExport, ClipStatus, VideoMode
+from .mp4 import Mp4Error, Mp4File
+from .mpegts import TsError, TsFile
+from .segment_watcher import SEGMENT_SUFFIXES, recording_root
+from .staging import current_path, is_staged, staged_path, staging_root
+from .work_queue import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+class ClipError(Exception):
+    pass
+
+
+@dataclass
+class ClipSource:
+    """
+    Byte range [start, end) of one recording segment that goes into a clip.
+    Fragmented MP4 segments need their init section, so they are cut by
+    time instead (inpoint/outpoint, seconds into the segment).
+    """
+    path: Path
+    segment_start: datetime  # naive, local: from the file name
+    start: int
+    end: int
+    size: int
+    inpoint: Optional[float] = None
+    outpoint: Optional[float] = None
+
+    def url(self) -> str:
+        path = current_path(self.path)  # staged segments may have moved meanwhile
+        if self.start == 0 and self.end >= self.size:
+            return str(path)
+        # ffmpeg reads only this byte range of the file.
+        return f"subfile,,start,{self.start},end,{self.end},,:{path}"
+
+    def concat_lines(self) -> List[str]:
+        lines = [f"file {_ffconcat_quote(self.url())}"]
+        if self.inpoint is not None:
+            lines.append(f"inpoint {self.inpoint:.3f}")
+        if self.outpoint is not None:
+            lines.append(f"outpoint {self.outpoint:.3f}")
+        return lines
+
+
+# ------------------------
+# Segment lookup
+# ------------------------
+
+def parse_segment_name(chan: Channel, name: str) -> Optional[datetime]:
+    prefix = f"{chan.name}_"
+    stem, dot, suffix = name.rpartition(".")
+    if not name.startswith(prefix) or dot + suffix not in SEGMENT_SUFFIXES:
+        return None
+    try:
+        return datetime.strptime(stem[len(prefix):], "%Y%m%d-%H%M%S")
+    except ValueError:
+        return None
+
+
+def recording_segments(chan: Channel, start: datetime, end: datetime) -> List[Tuple[datetime, Path]]:
+    """
+    Segments (start time, path) of a channel overlapping [start, end), naive
+    local times. Only the folders the range can live in are listed: the days
+    it covers plus TRANSCODER_CLIP_LOOKBACK_DAYS before (non-aligned jobs keep
+    writing into the folder of the day they started). Templates using {time}
+    have per-job folders, so the channel's recording root is walked instead.
+    """
+    names = {
+        f"{chan.name}_{(start + timedelta(days=d)):%Y%m%d}-"
+        for d in range(-1, (end.date() - start.date()).days + 1)
+    }
+    found = {}
+
+    def collect(folder: Path) -> None:
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.name[:len(chan.name) + 10] in names:
+                seg_start = parse_segment_name(chan, entry.name)
+                if seg_start is not None:
+                    found[seg_start] = Path(entry.path)
+
+    if "{time}" in chan.recording_path_template:
+        roots = [recording_root(chan)]
+        if staging_root() is not None:
+            roots.insert(0, staged_path(roots[0]))
+        for root in roots:
+            for folder, _, _ in os.walk(root):
+                collect(Path(folder))
+    else:
+        job = FFmpegJobConfig(channel=chan, purpose="record")
+        first_day = start.date() - timedelta(days=settings.TRANSCODER_CLIP_LOOKBACK_DAYS)
+        folders = []
+        for d in range((end.date() - first_day).days + 1):
+            for folder in job._segment_dirs(datetime.combine(first_day + timedelta(days=d), datetime.min.time())):
+                if folder not in folders:
+                    folders.append(folder)
+        # Final folders last: a segment caught mid-move is found there.
+        for folder in sorted(folders, key=lambda f: not is_staged(f)):
+            collect(folder)
+
+    segments = sorted(found.items())
+    out = []
+    for i, (seg_start, path) in enumerate(segments):
+        if i + 1 < len(segments):
+            seg_end = min(segments[i + 1][0], seg_start + timedelta(seconds=chan.segment_seconds * 2))
+        else:
+            seg_end = seg_start + timedelta(seconds=chan.segment_seconds * 2)  # still growing?
+        if seg_start < end and seg_end > start:
+            out.append((seg_start, path))
+    return out
+
+
+def resolve_clip(chan: Channel, start: datetime, end: datetime) -> Tuple[List[ClipSource], float]:
+    """
+    Map [start, end) (naive, local) to byte ranges of recording segments.
+    The first range begins at the keyframe at or before `start`; the return
+    value's second item is how many seconds that keyframe lies before it.
+    """
+    segments = recording_segments(chan, start, end)
+    if not segments:
+        raise ClipError(f"No recordings of {chan.name!r} between {start} and {end}.")
+
+    sources = []
+    lead = 0.0
+    for i, (seg_start, path) in enumerate(segments):
+        first_segment, last_segment = i == 0, i == len(segments) - 1
+        try:
+            if path.suffix == ".mp4":
+                source, seg_lead = _mp4_source(path, seg_start, start, end, first_segment, last_segment)
+            else:
+                source, seg_lead = _ts_source(path, seg_start, start, end, first_segment, last_segment)
+        except (OSError, TsError, Mp4Error) as exc:
+            raise ClipError(f"Cannot read {path}: {exc}") from exc
+        if first_segment:
+            lead = seg_lead
+        if source is not None:
+            sources.append(source)
+    if not sources:
+        raise ClipError(f"No recorded data of {chan.name!r} between {start} and {end}.")
+    return sources, lead
+
+
+def _ts_source(path: Path, seg_start: datetime, start: datetime, end: datetime,
+               first_segment: bool, last_segment: bool) -> Tuple[Optional[ClipSource], float]:
+    lead = 0.0
+    with TsFile(path) as ts:
+        first = last = None
+        if first_segment and start > seg_start:
+            offset = (start - seg_start).total_seconds()
+            if offset >= ts.duration():
+                return None, 0.0
+            first = ts.keyframe_before(ts.offset_at(offset))
+            probe = ts.probe_forward(first)
+            if probe is not None:
+                lead = max(0.0, offset - ts.seconds(probe.pts))
+        if last_segment and end - seg_start < timedelta(seconds=ts.duration()):
+            last = ts.offset_at((end - seg_start).total_seconds())
+        source = ClipSource(
+            path=path,
+            segment_start=seg_start,
+            start=first if first is not None else 0,
+            end=last if last is not None else ts.size,
+            size=ts.size,
+        )
+    return (source if source.end > source.start else None), lead
+
+
+def _mp4_source(path: Path, seg_start: datetime, start: datetime, end: datetime,
+                first_segment: bool, last_segment: bool) -> Tuple[Optional[ClipSource], float]:
+    """
+    Fragments start on keyframes: begin at the one playing at `start`.
+    """
+    lead = 0.0
+    with Mp4File(path) as mp4:
+        source = ClipSource(path=path, segment_start=seg_start, start=0, end=mp4.size, size=mp4.size)
+        if first_segment and start > seg_start:
+            offset = (start - seg_start).total_seconds()
+            if offset >= mp4.duration():
+                return None, 0.0
+            fragment = mp4.fragment_at(offset)
+            source.inpoint = fragment.start
+            lead = max(0.0, offset - fragment.start)
+        if last_segment and end - seg_start < timedelta(seconds=mp4.duration()):
+            source.outpoint = (end - seg_start).total_seconds()
+    return source, lead
+
+
+# ------------------------
+# VOD playlists
+# ------------------------
+
+def vod_playlist(chan: Channel, start: datetime, end: datetime, uri_for: Callable[[Path], str]) -> str:
+    """
+    HLS playlist (version 7) of the fragmented MP4 recordings overlapping
+    [start, end), naive local times. Every fragment is one media segment
+    addressed by byte range inside the recording file, with the file's init
+    section as EXT-X-MAP, so any HTTP server with range requests serves it
+    as recorded. Files after the first are marked as discontinuities
+    (timestamps restart per file). `uri_for` maps a segment path to its URI.
+    """
+    segments = recording_segments(chan, start, end)
+    if not segments:
+        raise ClipError(f"No recordings of {chan.name!r} between {start} and {end}.")
+    ts_files = [path.name for _, path in segments if path.suffix != ".mp4"]
+    if ts_files:
+        raise ClipError(f"Not fragmented MP4 recordings: {', '.join(ts_files[:3])}")
+
+    body, longest = [], 0.0
+    for seg_start, path in segments:
+        try:
+            with Mp4File(path) as mp4:
+                wanted = [
+                    f for f in mp4.fragments
+                    if seg_start + timedelta(seconds=f.start + f.duration) > start
+                    and seg_start + timedelta(seconds=f.start) < end
+                ]
+                init_end = mp4.init_end
+        except (OSError, Mp4Error) as exc:
+            raise ClipError(f"Cannot read {path}: {exc}") from exc
+        if not wanted:
+            continue
+        uri = uri_for(path)
+        if body:
+            body.append("#EXT-X-DISCONTINUITY")
+        program_time = timezone.make_aware(seg_start + timedelta(seconds=wanted[0].start))
+        body += [
+            f"#EXT-X-PROGRAM-DATE-TIME:{program_time.isoformat(timespec='milliseconds')}",
+            f'#EXT-X-MAP:URI="{uri}",BYTERANGE="{init_end}@0"',
+        ]
+        for fragment in wanted:
+            longest = max(longest, fragment.duration)
+            body += [
+                f"#EXTINF:{fragment.duration:.3f},",
+                f"#EXT-X-BYTERANGE:{fragment.size}@{fragment.offset}",
+                uri,
+            ]
+    if not body:
+        raise ClipError(f"No recorded data of {chan.name!r} between {start} and {end}.")
+    header = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:7",
+        f"#EXT-X-TARGETDURATION:{max(1, math.ceil(longest))}",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+        "#EXT-X-INDEPENDENT-SEGMENTS",
+    ]
+    return "\n".join(header + body + ["#EXT-X-ENDLIST"]) + "\n"
+
+
+# ------------------------
+# Export
+# ------------------------
+
+def _ffconcat_quote(value: str) -> str:
+    return "'" + value.replace("'", "'\\''") + "'"
+
+
+def clip_output_path(clip: ClipExport) -> Path:
+    start = timezone.localtime(clip.start_at)
+    end = timezone.localtime(clip.end_at)
+    return Path(settings.TRANSCODER_CLIP_DIR) / (
+        f"{clip.channel.name}_{start:%Y%m%d-%H%M%S}_{end:%H%M%S}_{clip.pk}.{clip.output_format}"
+    )
+
+
+def build_clip_cmd(clip: ClipExport, concat_list: Path, output: Path, lead: float) -> List[str]:
+    chan = clip.channel
+    args = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-protocol_whitelist", "file,subfile",
+        "-i", str(concat_list),
+        "-map", "0:v?", "-map", "0:a?",
+    ]
+    if clip.precise:
+        # Decode from the keyframe, drop the frames before `start`, re-encode.
+        duration = (clip.end_at - clip.start_at).total_seconds()
+        codec = chan.video_codec if chan.video_mode == VideoMode.TRANSCODE else "h264"
+        args += [
+            "-ss", f"{lead:.3f}", "-t", f"{duration:.3f}",
+            "-c:v", {"h264": "libx264", "hevc": "libx265"}.get(codec, codec),
+            "-c:a", "aac",
+        ]
+        if chan.video_bitrate:
+            args += ["-b:v", chan.video_bitrate]
+    else:
+        args += ["-c", "copy"]
+    if clip.output_format == "mp4":
+        args += ["-movflags", "+faststart", "-f", "mp4"]
+    else:
+        args += ["-f", "mpegts"]
+    args.append(str(output))
+    return args
+
+
+def export_clip(clip: ClipExport) -> ClipExport:
+    """
+    Resolve, cut and write one clip; updates the row with the outcome.
+    The output appears atomically (written to a temp name, then renamed).
+    """
+    chan = clip.channel
+    start = timezone.localtime(clip.start_at).replace(tzinfo=None)
+    end = timezone.localtime(clip.end_at).replace(tzinfo=None)
+    output = clip_output_path(clip)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(f".{output.name}.part")
+    concat_list = output.with_name(f".{output.name}.ffconcat")
+
+    try:
+        sources, lead = resolve_clip(chan, start, end)
+        clip.segments = len(sources)
+        lines = ["ffconcat version 1.0"]
+        for source in sources:
+            lines += source.concat_lines()
+        concat_list.write_text("\n".join(lines) + "\n")
+
+        cmd = build_clip_cmd(clip, concat_list, tmp, lead)
+        proc = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+        if proc.returncode != 0:
+            stderr = proc.stderr.strip().splitlines()
+            raise ClipError(f"ffmpeg exited with {proc.returncode}: {stderr[-1] if stderr else ''}")
+        os.replace(tmp, output)
+    except (ClipError, OSError) as exc:
+        clip.status = ClipStatus.FAILED
+        clip.error = str(exc)
+        tmp.unlink(missing_ok=True)
+    else:
+        clip.status = ClipStatus.DONE
+        clip.error = ""
+        clip.output_path = str(output)
+        clip.size_bytes = output.stat().st_size
+    finally:
+        concat_list.unlink(missing_ok=True)
+
+    clip.finished_at = timezone.now()
+    clip.save(update_fields=["status", "error", "output_path", "size_bytes", "segments", "finished_at"])
+    return clip
+
+
+# ------------------------
+# Queue
+# ------------------------
+
+def claim_next() -> Optional[ClipExport]:
+    """
+    Take the oldest queued clip, marking it running. Safe with several
+    workers: the conditional UPDATE lets exactly one of them win.
+    """
+    while True:
+        with transaction.atomic():
+            clip = (
+                ClipExport.objects.filter(status=ClipStatus.QUEUED)
+                .select_related("channel")
+                .order_by("created_at", "pk")
+                .first()
+            )
+            if clip is None:
+                return None
+            now = timezone.now()
+            claimed = ClipExport.objects.filter(pk=clip.pk, status=ClipStatus.QUEUED).update(
+                status=ClipStatus.RUNNING, started_at=now
+            )
+        if claimed:
+            clip.status, clip.started_at = ClipStatus.RUNNING, now
+            return clip
+
+
+def _clip_crashed(clip: ClipExport) -> None:
+    ClipExport.objects.filter(pk=clip.pk).update(
+        status=ClipStatus.FAILED, error="internal error, see worker log", finished_at=timezone.now()
+    )
+
+
+def _process_clip(clip: ClipExport) -> bool:
+    export_clip(clip)
+    if clip.status != ClipStatus.DONE:
+        logger.warning("Clip %s failed: %s", clip.pk, clip.error)
+    return clip.status == ClipStatus.DONE
+
+
+def clip_worker_pool(workers: Optional[int] = None) -> WorkerPool:
+    """
+    Pool running queued clip exports, at most `workers` ffmpeg processes at once.
+    """
+    return WorkerPool(
+        claim_next,
+        _process_clip,
+        workers or settings.TRANSCODER_CLIP_WORKERS,
+        name="clip",
+        on_crash=_clip_crashed,
+    )
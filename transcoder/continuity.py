@@ -0,0 +1,230 @@
+# transcoder/continuity.py
+"""
+Recording continuity map. Each closed segment is scanned once (CC errors,
+PCR discontinuities, PCR-timed duration; timeline jumps between fragments
+of fragmented MP4 ones) into a RecordingSegment row and
+merged into the channel's CoverageIntervals: maximal gap-free stretches.
+A channel recorded around the clock with a few outages has a handful of
+intervals, so range queries touch a handful of rows whatever the period.
+
+Fed by `continuity_consumer` in TRANSCODER_SEGMENT_CONSUMERS, back-filled
+and repaired by `transcoder_continuity scan|rebuild`.
+"""
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .clips import parse_segment_name
+from .models import Channel, CoverageInterval, RecordingSegment
+from . import mp4
+from .mpegts import TsError, scan_continuity
+from .segment_watcher import SegmentClosed, recording_root
+
+logger = logging.getLogger(__name__)
+
+
+def _tolerance() -> timedelta:
+    return timedelta(seconds=settings.TRANSCODER_COVERAGE_GAP_SECONDS)
+
+
+# ------------------------
+# Building the map
+# ------------------------
+
+def _merge(segment: RecordingSegment) -> CoverageInterval:
+    """
+    Merge one new segment into the channel's intervals: every interval it
+    touches (within the gap tolerance) is folded into one row.
+    """
+    tolerance = _tolerance()
+    with transaction.atomic():
+        touching = list(
+            CoverageInterval.objects.select_for_update()
+            .filter(
+                channel_id=segment.channel_id,
+                start_at__lte=segment.end_at + tolerance,
+                end_at__gte=segment.start_at - tolerance,
+            )
+            .order_by("start_at")
+        )
+        if not touching:
+            return CoverageInterval.objects.create(
+                channel_id=segment.channel_id,
+                start_at=segment.start_at,
+                end_at=segment.end_at,
+                segments=1,
+                cc_errors=segment.cc_errors,
+                pcr_discontinuities=segment.pcr_discontinuities,
+            )
+        interval, rest = touching[0], touching[1:]
+        interval.start_at = min(interval.start_at, segment.start_at)
+        interval.end_at = max([segment.end_at] + [i.end_at for i in touching])
+        interval.segments += 1 + sum(i.segments for i in rest)
+        interval.cc_errors += segment.cc_errors + sum(i.cc_errors for i in rest)
+        interval.pcr_discontinuities += segment.pcr_discontinuities + sum(i.pcr_discontinuities for i in rest)
+        interval.save()
+        if rest:
+            CoverageInterval.objects.filter(pk__in=[i.pk for i in rest]).delete()
+        return interval
+
+
+def index_segment(chan: Channel, path: Path) -> Optional[RecordingSegment]:
+    """
+    Scan a closed segment and add it to the map. Returns None for files that
+    are not segments of `chan` and for segments already indexed (the watcher
+    may report a file twice, e.g. when the archiver renames over it).
+    """
+    seg_start = parse_segment_name(chan, path.name)
+    if seg_start is None or RecordingSegment.objects.filter(path=str(path)).exists():
+        return None
+    size = path.stat().st_size
+    scan = mp4.scan_continuity(path) if path.suffix == ".mp4" else scan_continuity(path)
+    start = timezone.make_aware(seg_start)
+    segment, created = RecordingSegment.objects.get_or_create(
+        path=str(path),
+        defaults=dict(
+            channel=chan,
+            start_at=start,
+            end_at=start + timedelta(seconds=scan.duration),
+            size_bytes=size,
+            cc_errors=scan.cc_errors,
+            pcr_discontinuities=scan.pcr_discontinuities,
+        ),
+    )
+    if not created:
+        return None
+    _merge(segment)
+    return segment
+
+
+def continuity_consumer(events: List[SegmentClosed]) -> None:
+    """
+    Segment watcher consumer: index every closed segment.
+    """
+    channels = Channel.objects.in_bulk({event.channel_id for event in events})
+    for event in events:
+        chan = channels.get(event.channel_id)
+        if chan is None:
+            continue
+        try:
+            index_segment(chan, event.path)
+        except (OSError, TsError, mp4.Mp4Error) as exc:
+            logger.warning("Continuity scan of %s failed: %s", event.path, exc)
+
+
+def scan_channel(chan: Channel) -> Tuple[int, int]:
+    """
+    Index every segment under the channel's recording root that is not in the
+    map yet. Returns (indexed, failed).
+    """
+    known = set(RecordingSegment.objects.filter(channel=chan).values_list("path", flat=True))
+    indexed = failed = 0
+    for folder, _, files in os.walk(recording_root(chan)):
+        for name in sorted(files):
+            path = os.path.join(folder, name)
+            if path in known:
+                continue
+            try:
+                if index_segment(chan, Path(path)) is not None:
+                    indexed += 1
+            except (OSError, TsError, mp4.Mp4Error) as exc:
+                logger.warning("Continuity scan of %s failed: %s", path, exc)
+                failed += 1
+    return indexed, failed
+
+
+def rebuild_channel(chan: Channel) -> int:
+    """
+    Forget segments whose files are gone (retention) and recompute the
+    channel's intervals from the remaining rows. Returns the interval count.
+    """
+    segments = list(RecordingSegment.objects.filter(channel=chan).order_by("start_at"))
+    gone = {s.pk for s in segments if not os.path.exists(s.path)}
+    tolerance = _tolerance()
+    intervals: List[CoverageInterval] = []
+    for s in segments:
+        if s.pk in gone:
+            continue
+        last = intervals[-1] if intervals else None
+        if last is not None and s.start_at <= last.end_at + tolerance:
+            last.end_at = max(last.end_at, s.end_at)
+            last.segments += 1
+            last.cc_errors += s.cc_errors
+            last.pcr_discontinuities += s.pcr_discontinuities
+        else:
+            intervals.append(CoverageInterval(
+                channel=chan,
+                start_at=s.start_at,
+                end_at=s.end_at,
+                segments=1,
+                cc_errors=s.cc_errors,
+                pcr_discontinuities=s.pcr_discontinuities,
+            ))
+    with transaction.atomic():
+        RecordingSegment.objects.filter(pk__in=gone).delete()
+        CoverageInterval.objects.filter(channel=chan).delete()
+        CoverageInterval.objects.bulk_create(intervals, batch_size=1000)
+    return len(intervals)
+
+
+# ------------------------
+# Range queries
+# ------------------------
+
+@dataclass
+class Span:
+    start: datetime
+    end: datetime
+    covered: bool
+    segments: int = 0
+    cc_errors: int = 0
+    pcr_discontinuities: int = 0
+
+    @property
+    def seconds(self) -> float:
+        return (self.end - self.start).total_seconds()
+
+
+def coverage(chan: Channel, start: datetime, end: datetime) -> List[CoverageInterval]:
+    """
+    Intervals of `chan` overlapping [start, end), in order (aware datetimes).
+    """
+    return list(
+        CoverageInterval.objects.filter(channel=chan, start_at__lt=end, end_at__gt=start)
+        .order_by("start_at")
+    )
+
+
+def timeline(chan: Channel, start: datetime, end: datetime) -> List[Span]:
+    """
+    [start, end) cut into covered and uncovered spans, clipped to the range.
+    Error counts are those of the whole interval a covered span belongs to.
+    """
+    spans = []
+    at = start
+    for interval in coverage(chan, start, end):
+        if interval.start_at > at:
+            spans.append(Span(at, interval.start_at, covered=False))
+        span_end = min(interval.end_at, end)
+        spans.append(Span(
+            max(interval.start_at, start), span_end, covered=True,
+            segments=interval.segments,
+            cc_errors=interval.cc_errors,
+            pcr_discontinuities=interval.pcr_discontinuities,
+        ))
+        at = span_end
+    if at < end:
+        spans.append(Span(at, end, covered=False))
+    return spans
+
+
+def gaps(chan: Channel, start: datetime, end: datetime) -> List[Span]:
+    return [span for span in timeline(chan, start, end) if not span.covered]
+
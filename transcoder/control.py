@@ -0,0 +1,164 @@
+# transcoder/control.py
+import json
+import os
+import queue
+import socket
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+
+from .profiling import state_dir
+
+MAX_REQUEST = 64 * 1024
+
+
+class ControlError(Exception):
+    pass
+
+
+def socket_path() -> Path:
+    return Path(settings.TRANSCODER_CONTROL_SOCKET or state_dir() / "enforcer.sock")
+
+
+def parse_job_key(text: str):
+    """
+    "oneoff:12" -> ("oneoff", 12)
+    """
+    kind, sep, ident = str(text).partition(":")
+    if not sep or kind not in ("oneoff", "recurring") or not ident.isdigit():
+        raise ControlError(f"Invalid job key {text!r} (expected oneoff:<id> or recurring:<id>).")
+    return kind, int(ident)
+
+
+@dataclass
+class ControlRequest:
+    command: str
+    args: Dict[str, Any]
+    done: threading.Event = field(default_factory=threading.Event)
+    reply: Optional[dict] = None
+
+    def answer(self, reply: dict) -> None:
+        self.reply = reply
+        self.done.set()
+
+
+class ControlServer:
+    """
+    Local control API for the enforcer over a Unix socket.
+
+    Clients send one JSON object per line ({"command": ..., ...}) and get one
+    JSON reply per line. Connections are served on background threads, but
+    commands are executed by the enforcer's main loop: each request is put
+    on `requests` and `wake` is set, so the loop stops sleeping and handles
+    it within milliseconds, without any locking around the enforcer state.
+    """
+
+    def __init__(self, path: Optional[Path] = None, reply_timeout: float = 300.0):
+        self.path = Path(path or socket_path())
+        self.reply_timeout = reply_timeout
+        self.requests: "queue.Queue[ControlRequest]" = queue.Queue()
+        self.wake = threading.Event()
+        self._sock: Optional[socket.socket] = None
+
+    def start(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(self.path))
+        except OSError:
+            self.path.unlink(missing_ok=True)  # stale socket of a dead enforcer
+        else:
+            raise ControlError(f"Another enforcer is listening on {self.path}.")
+        finally:
+            probe.close()
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o077)  # owner only: the socket can stop every job
+        try:
+            self._sock.bind(str(self.path))
+        finally:
+            os.umask(old_umask)
+        self._sock.listen(16)
+        threading.Thread(target=self._accept_loop, name="control-accept", daemon=True).start()
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            self.path.unlink(missing_ok=True)
+
+    def _accept_loop(self) -> None:
+        while self._sock is not None:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(
+                target=self._serve, args=(conn,), name="control-conn", daemon=True
+            ).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        with conn, conn.makefile("rwb") as stream:
+            for line in stream:
+                if len(line) > MAX_REQUEST:
+                    reply = {"ok": False, "error": "request too large"}
+                else:
+                    reply = self._dispatch(line)
+                stream.write(json.dumps(reply, default=str).encode() + b"\n")
+                stream.flush()
+
+    def _dispatch(self, line: bytes) -> dict:
+        try:
+            data = json.loads(line)
+            command = data.pop("command")
+        except (ValueError, KeyError, AttributeError):
+            return {"ok": False, "error": "expected a JSON object with a 'command'"}
+        request = ControlRequest(command=command, args=data)
+        self.requests.put(request)
+        self.wake.set()
+        if not request.done.wait(self.reply_timeout):
+            return {"ok": False, "error": "enforcer did not answer in time"}
+        return request.reply
+
+    def handle_pending(self, handler: Callable[[str, Dict[str, Any]], dict]) -> int:
+        """
+        Run queued requests through `handler` on the calling (main) thread.
+        """
+        handled = 0
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                return handled
+            try:
+                reply = handler(request.command, request.args)
+                reply.setdefault("ok", True)
+            except ControlError as exc:
+                reply = {"ok": False, "error": str(exc)}
+            except Exception as exc:  # a bad request must not kill the enforcer
+                reply = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+            request.answer(reply)
+            handled += 1
+
+
+def call(command: str, path: Optional[Path] = None, timeout: float = 330.0, **args) -> dict:
+    """
+    Send one command to a running enforcer and return its reply.
+    """
+    path = Path(path or socket_path())
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(path))
+        except OSError as exc:
+            raise ControlError(f"Cannot connect to the enforcer at {path}: {exc}") from exc
+        with sock.makefile("rwb") as stream:
+            stream.write(json.dumps(dict(args, command=command)).encode() + b"\n")
+            stream.flush()
+            line = stream.readline()
+    if not line:
+        raise ControlError("The enforcer closed the connection without answering.")
+    return json.loads(line)
@@ -0,0 +1,215 @@
+# transcoder/encoder_tuning.py
+"""
+CPU transcoding profiles. A channel that transcodes video on the CPU gets
+scaling and bitrate from its target_* / video_bitrate fields, and a preset
+and thread count chosen per job:
+
+- threads: the host's cores split between the CPU transcodes running at
+  the same time, so N libx264 processes don't each start a thread per core
+  and fight over them;
+- preset: the slowest (best quality per bit) preset whose calibrated
+  throughput on that many threads covers the job's pixel rate with some
+  headroom. `transcoder_calibrate` measures the presets on this host.
+
+The enforcer re-plans a job one preset faster when its measured speed stays
+below TRANSCODER_CPU_MIN_SPEED (see SpeedMonitor).
+"""
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional
+
+from django.conf import settings
+
+from .models import Channel, HardwarePreference, VideoMode
+from .nic_placement import bitrate_to_kbps
+from .profiling import state_dir
+
+# libx264 / libx265 presets, fastest first.
+PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"]
+CPU_ENCODERS = {"h264": "libx264", "libx264": "libx264", "hevc": "libx265", "h265": "libx265", "libx265": "libx265"}
+
+DEFAULT_WIDTH, DEFAULT_HEIGHT = 1920, 1080  # assumed source size when no target is set
+
+
+def calibration_path() -> Path:
+    return state_dir() / "encoder_calibration.json"
+
+
+def read_calibration() -> Optional[dict]:
+    try:
+        return json.loads(calibration_path().read_text())
+    except (OSError, ValueError):
+        return None
+
+
+_calibration_cache = {"mtime": None, "data": None}
+
+
+def _calibration() -> Optional[dict]:
+    """
+    read_calibration(), re-read only when the file changed.
+    """
+    try:
+        mtime = calibration_path().stat().st_mtime_ns
+    except OSError:
+        return None
+    if mtime != _calibration_cache["mtime"]:
+        _calibration_cache.update(mtime=mtime, data=read_calibration())
+    return _calibration_cache["data"]
+
+
+def cpu_count() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def cpu_encoder(chan: Channel) -> Optional[str]:
+    """
+    The software encoder a transcoding channel uses (libx264/libx265), or
+    None if it copies video, forces a GPU, or uses a codec we don't tune.
+    No GPU encoder is probed yet, so AUTO resolves to the CPU.
+    """
+    return cpu_encoder_for(chan.video_mode, chan.hardware_preference, chan.video_codec)
+
+
+def cpu_encoder_for(video_mode: str, hardware_preference: str, video_codec: str) -> Optional[str]:
+    """
+    cpu_encoder() from the channel's field values.
+    """
+    if video_mode != VideoMode.TRANSCODE:
+        return None
+    if hardware_preference not in (HardwarePreference.CPU, HardwarePreference.AUTO):
+        return None
+    return CPU_ENCODERS.get((video_codec or "h264").lower())
+
+
+def scale_args(chan: Channel) -> List[str]:
+    if not (chan.target_width or chan.target_height):
+        return []
+    # -2 keeps the aspect ratio with an even size for the missing side.
+    return ["-vf", f"scale={chan.target_width or -2}:{chan.target_height or -2}"]
+
+
+def bitrate_args(chan: Channel) -> List[str]:
+    kbps = bitrate_to_kbps(chan.video_bitrate)
+    if not kbps:
+        return []
+    # Capped VBR with a two-second buffer: steady enough for UDP and HLS.
+    return ["-b:v", chan.video_bitrate, "-maxrate", chan.video_bitrate, "-bufsize", f"{kbps * 2}k"]
+
+
+@dataclass
+class CpuEncodePlan:
+    encoder: str
+    preset: str
+    threads: int
+    reason: str  # how the preset was chosen, for logs and show_ffmpeg_cmd
+    fastest: bool = False  # nothing faster left to fall back to
+
+    def args(self, chan: Channel) -> List[str]:
+        """
+        Video arguments: scaling, encoder, preset, threads, bitrate.
+        """
+        return (
+            scale_args(chan)
+            + ["-c:v", self.encoder, "-preset", self.preset, "-threads", str(self.threads)]
+            + bitrate_args(chan)
+        )
+
+
+def pixel_rate(chan: Channel) -> float:
+    """
+    Output pixels per second the encoder has to sustain.
+    """
+    width, height = chan.target_width, chan.target_height
+    if width and not height:
+        height = round(width * DEFAULT_HEIGHT / DEFAULT_WIDTH)
+    elif height and not width:
+        width = round(height * DEFAULT_WIDTH / DEFAULT_HEIGHT)
+    return (width or DEFAULT_WIDTH) * (height or DEFAULT_HEIGHT) * settings.TRANSCODER_CPU_SOURCE_FPS
+
+
+def plan_cpu_encode(chan: Channel, concurrent: int = 1, faster_presets: int = 0) -> Optional[CpuEncodePlan]:
+    """
+    Preset and threads for one CPU transcode while `concurrent` of them run
+    on this host. `faster_presets` moves the choice that many presets faster
+    (the enforcer's fallback for jobs that could not keep up).
+    """
+    encoder = cpu_encoder(chan)
+    if encoder is None:
+        return None
+    # This job's share of the cores; with more transcodes than cores, a
+    # fraction, which the preset choice has to account for.
+    share = min(cpu_count() / max(1, concurrent), settings.TRANSCODER_CPU_MAX_THREADS)
+    threads = max(1, int(share))
+
+    calibration = _calibration()
+    measured: Dict[str, float] = ((calibration or {}).get("encoders", {}).get(encoder) or {}).get("presets", {})
+    if measured:
+        efficiency = calibration["encoders"][encoder].get("thread_efficiency", 1.0)
+        needed = pixel_rate(chan) * settings.TRANSCODER_CPU_HEADROOM
+        usable = [p for p in PRESETS if p in measured]
+        fitting = [p for p in usable if measured[p] * 1e6 * share * efficiency >= needed]
+        if fitting:
+            index, reason = usable.index(fitting[-1]), f"calibrated, {share:.2g} core(s)"
+        else:
+            index, reason = 0, f"calibrated: no preset keeps up on {share:.2g} core(s)"
+    else:
+        usable = PRESETS
+        index, reason = usable.index(settings.TRANSCODER_CPU_DEFAULT_PRESET), "not calibrated"
+    if faster_presets:
+        index = max(0, index - faster_presets)
+        reason += f", {faster_presets} step(s) faster after slow progress"
+    return CpuEncodePlan(encoder=encoder, preset=usable[index], threads=threads, reason=reason, fastest=index == 0)
+
+
+# ------------------------
+# Speed fallback
+# ------------------------
+
+class SpeedMonitor:
+    """
+    Encode speed per job over a sliding window, from the -progress out_time
+    of the captured job output. ffmpeg's own `speed` is averaged since the
+    job started, so start-up probing drags it below 1.0x for a live input
+    forever; the window measures out_time advance against the wall clock.
+    """
+
+    def __init__(self, job_logs, min_speed: float, window: float):
+        self.job_logs = job_logs
+        self.min_speed = min_speed
+        self.window = window
+        self._marks: Dict[Hashable, tuple] = {}  # key -> (monotonic, out_time_us)
+
+    def forget(self, key: Hashable) -> None:
+        self._marks.pop(key, None)
+
+    def too_slow(self, keys, now: Optional[float] = None) -> Dict[Hashable, float]:
+        """
+        {key: speed} for the jobs among `keys` that ran below min_speed over
+        a whole window. A job's window restarts after every verdict.
+        """
+        now = now if now is not None else time.monotonic()
+        slow = {}
+        for key in keys:
+            log = self.job_logs.jobs.get(key)
+            out_time = log.progress.get("out_time_us", "") if log is not None else ""
+            if not out_time.isdigit():
+                continue
+            out_time = int(out_time)
+            mark = self._marks.get(key)
+            if mark is None:
+                self._marks[key] = (now, out_time)
+                continue
+            elapsed = now - mark[0]
+            if elapsed < self.window:
+                continue
+            speed = (out_time - mark[1]) / 1e6 / elapsed
+            self._marks[key] = (now, out_time)
+            if speed < self.min_speed:
+                slow[key] = speed
+        return slow
@@ -1,5 +1,6 @@
 # transcoder/ffmpeg_runner.py
 import shlex
+import sys
 from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Optional, Tuple
@@ -7,7 +8,12 @@ from typing import List, Optional, Tuple
 from django.conf import settings
 from django.utils import timezone
 
-from .models import Channel, VideoMode, AudioMode, TimeShiftProfile
+from .encoder_tuning import CpuEncodePlan, bitrate_args, plan_cpu_encode, scale_args
+from .models import Channel, RecordingFormat, VideoMode, AudioMode, TimeShiftProfile
+from .mp4 import MOVFLAGS
+from .nic_placement import bitrate_to_kbps, interface_ipv4, is_multicast_url
+from .segment_watcher import SEGMENT_SUFFIXES
+from .staging import staged_path, staging_root
 from datetime import datetime, timedelta
 
 
@@ -15,12 +21,80 @@ from datetime import datetime, timedelta
 class FFmpegJobConfig:
     channel: Channel
     purpose: str  # "live_forward" | "record" | "playback"
+    # NIC overrides chosen by the enforcer's placement mode; when None the
+    # channel's multicast_interface (or the default route) is used.
+    input_interface: Optional[str] = None
+    output_interface: Optional[str] = None
+    # Schedule boundary this job serves. When it lies in the future the job was
+    # started early (pre-roll) and recordings are cut exactly at the boundary.
+    start_boundary: Optional[datetime] = None
+    # Report progress (fps, bitrate, speed...) as key=value blocks on stdout
+    # instead of the interactive status line; set by the enforcer when it
+    # captures job output.
+    progress: bool = False
+    # Playback: the enabled TimeShiftProfiles to serve. Loaded by the caller,
+    # so build_command() needs no database access.
+    timeshift_profiles: Optional[List[TimeShiftProfile]] = None
+    # CPU transcodes: how many run on this host at once (threads are split
+    # between them), and how many presets faster than planned to encode
+    # after this job could not keep up.
+    cpu_transcodes: int = 1
+    faster_presets: int = 0
+    # Set by build_command for CPU transcodes: the preset and threads used.
+    cpu_plan: Optional[CpuEncodePlan] = None
+    # Set by build_command for record jobs: the folder segments go to when it
+    # starts (aligned jobs move on to each new day's {date} folder).
+    record_dir: Optional[Path] = None
+
+    def _bind_udp_url(self, url: str, interface: Optional[str]) -> str:
+        """
+        Bind a multicast udp:// URL to a NIC by adding ffmpeg's localaddr option,
+        which is used both as the bind address and as the multicast join/egress interface.
+        Unicast URLs and URLs that already set localaddr are returned unchanged.
+        """
+        if not interface or not is_multicast_url(url) or "localaddr=" in url:
+            return url
+
+        local_ip = interface_ipv4(interface)
+        if local_ip is None:
+            raise ValueError(
+                f"Cannot resolve an IPv4 address for interface {interface!r} "
+                f"(channel {self.channel.name!r})"
+            )
+        sep = "&" if "?" in url else "?"
+        return f"{url}{sep}localaddr={local_ip}"
+
+    def _udp_output_url(self, url: str) -> str:
+        return self._bind_udp_url(
+            url, self.output_interface or self.channel.multicast_interface
+        )
+
+    def _udp_ts_output(self, url: str) -> List[str]:
+        """
+        mpegts to a udp:// URL. With a udp_muxrate the stream is constant
+        bitrate: the muxer pads it with null packets up to the muxrate, and
+        ffmpeg's UDP sender thread paces datagrams at that same rate, so
+        I-frames no longer leave the host as line-rate bursts.
+        """
+        url = self._udp_output_url(url)
+        kbps = bitrate_to_kbps(self.channel.udp_muxrate)
+        if not kbps:
+            return ["-f", "mpegts", url]
+        bits = kbps * 1000
+        options = [f"bitrate={bits}"] if "bitrate=" not in url else []
+        if "pkt_size=" not in url:
+            options.append("pkt_size=1316")  # 7 TS packets: equal datagrams, evenly spaced
+        if options:
+            sep = "&" if "?" in url else "?"
+            url = f"{url}{sep}{'&'.join(options)}"
+        return ["-muxrate", str(bits), "-f", "mpegts", url]
 
     def _resolve_input_url_for_live(self) -> str:
         """
         Resolve the input URL for live_forward/record purposes.
         - FILE inputs: relative paths are resolved under MEDIA_ROOT.
         - UDP/RTSP/RTMP: returned as-is (with multicast tuning if needed).
+        - Multicast inputs are joined on input_interface / multicast_interface if set.
         """
         chan = self.channel
         raw_input_url = chan.input_url
@@ -36,94 +110,200 @@ class FFmpegJobConfig:
             if "fifo_size=" not in input_url:
                 sep = "&" if "?" in input_url else "?"
                 input_url = f"{input_url}{sep}fifo_size=1000000&overrun_nonfatal=1"
-            return input_url
+            return self._bind_udp_url(
+                input_url, self.input_interface or chan.multicast_interface
+            )
 
         # RTSP/RTMP or others: use as-is
         return raw_input_url
 
-    def _build_record_output(self, args: List[str]) -> None:
+    def _recording_dir(self, when: datetime) -> Path:
         """
-        Append arguments to record input into TS segments under MEDIA_ROOT,
-        with timestamped filenames so we can map back from a datetime later.
+        Directory recording_path_template resolves to at a given (naive, local) time.
+        Relative paths are under MEDIA_ROOT.
         """
         chan = self.channel
-        now = datetime.now()
-        date_str = now.strftime("%Y%m%d")
-
-        base_dir_str = chan.recording_path_template.format(
-            channel=chan.name,
-            date=date_str,
-            time=now.strftime("%H%M%S"),
+        base_dir = Path(
+            chan.recording_path_template.format(
+                channel=chan.name,
+                date=when.strftime("%Y%m%d"),
+                time=when.strftime("%H%M%S"),
+            )
         )
-        base_dir = Path(base_dir_str)
         if not base_dir.is_absolute():
             base_dir = Path(settings.MEDIA_ROOT) / base_dir
+        return base_dir
+
+    def _write_dir(self, when: datetime) -> Path:
+        """
+        Directory a record job writes to: the recording directory, or its
+        mirror under TRANSCODER_RECORDING_STAGING_DIR for staged channels.
+        """
+        base_dir = self._recording_dir(when)
+        return staged_path(base_dir) if self.channel.recording_staged else base_dir
+
+    def _segment_dirs(self, when: datetime) -> List[Path]:
+        """
+        Directories a segment recorded at `when` may be in: its final one and,
+        while staging is configured, the staged one not moved yet.
+        """
+        base_dir = self._recording_dir(when)
+        return [base_dir, staged_path(base_dir)] if staging_root() is not None else [base_dir]
 
-        base_dir.mkdir(parents=True, exist_ok=True)
+    def _build_record_output(self, args: List[str]) -> None:
+        """
+        Append arguments to record input into TS or fragmented MP4 segments
+        under MEDIA_ROOT, with timestamped filenames so we can map back from a
+        datetime later.
+
+        In aligned mode (Channel.recording_aligned) segments are cut on wall-clock
+        multiples of the segment length and the {date} folder is expanded by ffmpeg
+        per segment, so the file for any instant can be computed
+        (see _aligned_segment_at) instead of searched for.
+        """
+        chan = self.channel
+        now = datetime.now()
+        segment_seconds = chan.segment_seconds
+        # strftime patterns below: a literal '%' in the channel name must be doubled.
+        file_prefix = chan.name.replace("%", "%%")
 
-        segment_seconds = chan.recording_segment_minutes * 60
+        if chan.recording_aligned:
+            if "{time}" in chan.recording_path_template:
+                raise ValueError(
+                    f"Aligned recording for {chan.name!r} cannot use {{time}} in "
+                    f"recording_path_template"
+                )
+            # ffmpeg does not create folders; make sure today's and tomorrow's exist.
+            # The enforcer keeps creating the next day's folder while the job runs.
+            ensure_recording_dirs(chan, now)
+            base_dir = Path(
+                chan.recording_path_template.format(
+                    channel=file_prefix, date="%Y%m%d", time=""
+                )
+            )
+            if not base_dir.is_absolute():
+                base_dir = Path(settings.MEDIA_ROOT) / base_dir
+            if chan.recording_staged:
+                base_dir = staged_path(base_dir)
+            self.record_dir = self._write_dir(now)
+        else:
+            base_dir = self._write_dir(now)
+            base_dir.mkdir(parents=True, exist_ok=True)
+            self.record_dir = base_dir
 
         # Filename pattern includes timestamp: e.g. "ChannelName_20251210-120000.ts"
-        segment_pattern = str(base_dir / f"{chan.name}_%Y%m%d-%H%M%S.ts")
+        segment_pattern = str(base_dir / f"{file_prefix}_%Y%m%d-%H%M%S{chan.segment_suffix}")
 
         args += [
             "-f", "segment",
             "-segment_time", str(segment_seconds),
+        ]
+        if chan.recording_format == RecordingFormat.FMP4:
+            args += ["-segment_format", "mp4", "-segment_format_options", f"movflags={MOVFLAGS}"]
+
+        boundary = self.start_boundary
+        if chan.recording_aligned:
+            # Cut at multiples of segment_time since local midnight. A pre-roll
+            # boundary is honoured only if it lies on this grid (e.g. 20:00 with
+            # 60-minute segments), which keeps every segment name computable.
+            args += ["-segment_atclocktime", "1"]
+        elif boundary is not None and boundary.timestamp() > now.timestamp():
+            # Pre-roll: cut segments on a wall-clock grid that passes through the
+            # boundary, so the pre-roll lands in its own short leading file and the
+            # first full segment starts (and is named) at the boundary.
+            # ffmpeg uses the system local time, like the strftime names above.
+            local_boundary = boundary.astimezone()
+            since_midnight = (
+                local_boundary.hour * 3600 + local_boundary.minute * 60 + local_boundary.second
+            )
+            args += [
+                "-segment_atclocktime", "1",
+                "-segment_clocktime_offset", str(since_midnight % segment_seconds),
+            ]
+
+        args += [
             "-reset_timestamps", "1",
             "-strftime", "1",
             segment_pattern,
         ]
 
-    def _find_playback_segment(self, profile: TimeShiftProfile) -> Path:
+    def _aligned_segment_at(self, target_dt: datetime) -> Optional[Tuple[datetime, Path]]:
         """
-        Given an enabled TimeShiftProfile (with delay_minutes), find the recorded
-        segment file that corresponds to "now - delay_minutes".
+        Aligned mode: compute the segment covering target_dt (naive, local) from
+        the segment length alone. ffmpeg names a segment when it opens it, which
+        is at the grid point or slightly after if the cut waits for a keyframe,
+        so a few names are probed with stat() – no directory listing.
+
+        Returns None for instants inside a partial first segment (the job started
+        mid-slot) or a gap; callers fall back to searching the directory.
+        """
+        chan = self.channel
+        segment_seconds = chan.segment_seconds
+        midnight = target_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        since_midnight = int((target_dt - midnight).total_seconds())
+        slot_start = midnight + timedelta(
+            seconds=since_midnight - since_midnight % segment_seconds
+        )
+
+        dirs = self._segment_dirs(slot_start)
+        # The current format first; older segments may be in the other one.
+        suffixes = sorted(SEGMENT_SUFFIXES, key=lambda suffix: suffix != chan.segment_suffix)
+        tolerance = min(settings.TRANSCODER_ALIGNED_CUT_TOLERANCE_SECONDS, segment_seconds - 1)
+        for delay in range(tolerance + 1):
+            name_dt = slot_start + timedelta(seconds=delay)
+            for base_dir in dirs:
+                for suffix in suffixes:
+                    path = base_dir / f"{chan.name}_{name_dt:%Y%m%d-%H%M%S}{suffix}"
+                    if path.exists():
+                        return name_dt, path
+        return None
+
+    def _find_segment_at(self, target_dt: datetime) -> Tuple[datetime, Path]:
+        """
+        Find the recorded segment covering target_dt (naive, local) and its start time.
 
         Recording files are expected to be named:
-          <channel>_YYYYMMDD-HHMMSS.ts
+          <channel>_YYYYMMDD-HHMMSS.ts (or .mp4)
         in:
           MEDIA_ROOT / recording_path_template.format(channel=..., date=YYYYMMDD, time=...)
         """
         chan = self.channel
 
-        # 'now_aware' is timezone-aware; convert to naive for filename comparisons.
-        now_aware = timezone.localtime()
-        target_dt_aware = now_aware - timedelta(minutes=profile.delay_minutes)
-        target_dt = target_dt_aware.replace(tzinfo=None)
-
-        date_str = target_dt.strftime("%Y%m%d")
+        if chan.recording_aligned:
+            found = self._aligned_segment_at(target_dt)
+            if found is not None:
+                return found
 
-        base_dir_str = chan.recording_path_template.format(
-            channel=chan.name,
-            date=date_str,
-            time=target_dt.strftime("%H%M%S"),
-        )
-        base_dir = Path(base_dir_str)
-        if not base_dir.is_absolute():
-            base_dir = Path(settings.MEDIA_ROOT) / base_dir
+        dirs = [d for d in self._segment_dirs(target_dt) if d.exists()]
+        base_dir = self._recording_dir(target_dt)
 
-        if not base_dir.exists():
+        if not dirs:
             raise FileNotFoundError(
                 f"No recording directory found for {chan.name!r} at {base_dir}"
             )
 
         prefix = f"{chan.name}_"
-        candidates: List[Tuple[datetime, Path]] = []
-
-        for path in base_dir.glob(f"{chan.name}_*.ts"):
-            stem = path.stem  # e.g. "Channel_20251210-120000"
-            if not stem.startswith(prefix):
-                continue
-            ts_str = stem[len(prefix):]  # "20251210-120000"
-            try:
-                ts_dt = datetime.strptime(ts_str, "%Y%m%d-%H%M%S")  # naive
-            except ValueError:
-                continue
-            candidates.append((ts_dt, path))
+        found: dict = {}
+
+        # Final directory last: a segment caught mid-move is in both.
+        for folder in reversed(dirs):
+            for path in folder.glob(f"{chan.name}_*"):
+                if path.suffix not in SEGMENT_SUFFIXES:
+                    continue
+                stem = path.stem  # e.g. "Channel_20251210-120000"
+                if not stem.startswith(prefix):
+                    continue
+                ts_str = stem[len(prefix):]  # "20251210-120000"
+                try:
+                    ts_dt = datetime.strptime(ts_str, "%Y%m%d-%H%M%S")  # naive
+                except ValueError:
+                    continue
+                found[ts_dt] = path
+        candidates: List[Tuple[datetime, Path]] = list(found.items())
 
         if not candidates:
             raise FileNotFoundError(
-                f"No timestamped TS segments found in {base_dir} for channel {chan.name!r}"
+                f"No timestamped segments found in {base_dir} for channel {chan.name!r}"
             )
 
         candidates.sort(key=lambda x: x[0])
@@ -140,7 +320,33 @@ class FFmpegJobConfig:
             # All segments are later than target_dt -> pick the earliest one
             chosen = candidates[0]
 
-        return chosen[1]
+        return chosen
+
+    def _playback_target(self, profile: TimeShiftProfile) -> datetime:
+        # 'now_aware' is timezone-aware; convert to naive for filename comparisons.
+        now_aware = timezone.localtime()
+        target_dt_aware = now_aware - timedelta(minutes=profile.delay_minutes)
+        return target_dt_aware.replace(tzinfo=None)
+
+    def _playout_command(self) -> List[str]:
+        """
+        Time-shifted playback is served by the channel's playout engine
+        (transcoder_playout), one process for all of its enabled profiles.
+        """
+        chan = self.channel
+        if not self.timeshift_profiles:
+            raise ValueError(
+                f"No enabled TimeShiftProfile configured for channel {chan.name!r}"
+            )
+        args = [
+            sys.executable, str(Path(settings.BASE_DIR) / "manage.py"),
+            "transcoder_playout", chan.name,
+        ]
+        if self.output_interface:
+            args += ["--interface", self.output_interface]
+        if self.progress:
+            args.append("--progress")
+        return args
 
     def build_command(self) -> List[str]:
         """
@@ -153,11 +359,16 @@ class FFmpegJobConfig:
             - Recording paths: relative recording_path_template is treated under MEDIA_ROOT.
             - Network URLs (UDP/RTSP/RTMP) are used as-is.
         - For playback:
-            - Input is a recorded TS segment chosen based on TimeShiftProfile.delay_minutes.
-            - Output is MPEG-TS to TimeShiftProfile.output_udp_url.
+            - Not ffmpeg: the channel's playout engine, which reads the recorded
+              segments once and paces one UDP output per enabled TimeShiftProfile.
         """
         chan = self.channel
+        if self.purpose == "playback":
+            return self._playout_command()
+
         args: List[str] = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "warning"]
+        if self.progress:
+            args += ["-nostats", "-progress", "pipe:1", "-stats_period", "1"]
 
         # ------------------------
         # LIVE_FORWARD / RECORD
@@ -170,7 +381,11 @@ class FFmpegJobConfig:
             if chan.video_mode == VideoMode.COPY:
                 args += ["-c:v", "copy"]
             else:
-                args += ["-c:v", chan.video_codec or "libx264"]
+                self.cpu_plan = plan_cpu_encode(chan, self.cpu_transcodes, self.faster_presets)
+                if self.cpu_plan is not None:
+                    args += self.cpu_plan.args(chan)
+                else:
+                    args += scale_args(chan) + ["-c:v", chan.video_codec or "libx264"] + bitrate_args(chan)
 
             # Audio
             if chan.audio_mode == AudioMode.COPY:
@@ -202,14 +417,19 @@ class FFmpegJobConfig:
                     args += ["-f", "flv", raw_output_target]
 
                 elif chan.output_type == "udp_ts":
-                    args += ["-f", "mpegts", raw_output_target]
+                    args += self._udp_ts_output(raw_output_target)
 
                 else:
-                    # fallback: TS file under MEDIA_ROOT
+                    # File under MEDIA_ROOT: fragmented MP4 (playable while it is
+                    # written, and intact up to the last fragment if ffmpeg dies),
+                    # or TS as the fallback.
                     out_path = Path(raw_output_target)
                     if not out_path.is_absolute():
                         out_path = Path(settings.MEDIA_ROOT) / out_path
-                    args += ["-f", "mpegts", str(out_path)]
+                    if chan.output_type == "file_mp4":
+                        args += ["-f", "mp4", "-movflags", MOVFLAGS, str(out_path)]
+                    else:
+                        args += ["-f", "mpegts", str(out_path)]
 
             elif self.purpose == "record":
                 self._build_record_output(args)
@@ -217,39 +437,29 @@ class FFmpegJobConfig:
             return args
 
         # ------------------------
-        # PLAYBACK (time-shifted)
+        # Unknown purpose
         # ------------------------
-        if self.purpose == "playback":
-            # We ignore channel.input_url and instead read from recorded segments.
-            profile: Optional[TimeShiftProfile] = getattr(chan, "timeshift_profile", None)
-            if not profile or not profile.enabled:
-                raise ValueError(
-                    f"No enabled TimeShiftProfile configured for channel {chan.name!r}"
-                )
+        raise ValueError(f"Unsupported purpose: {self.purpose!r}")
 
-            # Pick the TS segment that corresponds to "now - delay_minutes"
-            playback_file = self._find_playback_segment(profile)
 
-            # Important:
-            # - We KEEP -re so the file is pushed at real-time pace.
-            # - We REMOVE -stream_loop so ffmpeg exits at the end of this segment.
-            #   The transcoder_enforcer will then start a new playback job, which
-            #   will select the next appropriate segment based on (now - delay).
-            args += [
-                "-re",
-                # "-stream_loop", "-1",  # loop the chosen segment infinitely for now
-                "-i", str(playback_file),
-                "-c:v", "copy",
-                "-c:a", "copy",
-                "-f", "mpegts",
-                profile.output_udp_url,
-            ]
-            return args
+# (channel_id, template, staged, YYYYMMDD) folders already created by ensure_recording_dirs()
+_ensured_dirs: set = set()
 
-        # ------------------------
-        # Unknown purpose
-        # ------------------------
-        raise ValueError(f"Unsupported purpose: {self.purpose!r}")
+
+def ensure_recording_dirs(chan: Channel, now: Optional[datetime] = None) -> None:
+    """
+    Aligned recordings let ffmpeg expand {date} per segment, but ffmpeg cannot
+    create folders: make sure today's and tomorrow's folders exist.
+    Cheap to call every enforcer tick; each folder is created once per process.
+    """
+    now = now or datetime.now()
+    job = FFmpegJobConfig(channel=chan, purpose="record")
+    for day in (now, now + timedelta(days=1)):
+        key = (chan.id, chan.recording_path_template, chan.recording_staged, day.strftime("%Y%m%d"))
+        if key in _ensured_dirs:
+            continue
+        job._write_dir(day).mkdir(parents=True, exist_ok=True)
+        _ensured_dirs.add(key)
 
 
 def build_ffmpeg_cmd_for_channel(channel_id: int, purpose: str = "live_forward") -> str:
@@ -258,5 +468,7 @@ def build_ffmpeg_cmd_for_channel(channel_id: int, purpose: str = "live_forward")
     """
     chan = Channel.objects.get(pk=channel_id)
     job = FFmpegJobConfig(channel=chan, purpose=purpose)
+    if purpose == "playback":
+        job.timeshift_profiles = list(chan.timeshift_profiles.filter(enabled=True))
     cmd_list = job.build_command()
     return " ".join(shlex.quote(part) for part in cmd_list)
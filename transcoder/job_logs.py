@@ -0,0 +1,364 @@
+# transcoder/job_logs.py
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import re
+import selectors
+import shutil
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import IO, Deque, Dict, Hashable, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .profiling import state_dir
+
+logger = logging.getLogger(__name__)
+
+# ffmpeg rewrites its "frame=... speed=..." status line in place with \r.
+STATS_RE = re.compile(rb"^\s*(frame|size)=")
+ERROR_RE = re.compile(r"error|failed|invalid|refused|timed? ?out|not found|no such", re.IGNORECASE)
+
+READ_CHUNK = 65536
+MAX_LINE = 4096  # longer lines are cut; a runaway writer can't grow the buffer
+
+
+def logs_snapshot_path() -> Path:
+    return state_dir() / "job_logs.json"
+
+
+def read_job_logs() -> Dict[str, List[dict]]:
+    """
+    Captured output of the enforcer's jobs, grouped by channel name.
+    """
+    try:
+        jobs = json.loads(logs_snapshot_path().read_text()).get("jobs", {})
+    except (OSError, ValueError):
+        return {}
+    by_channel: Dict[str, List[dict]] = {}
+    for key, job in sorted(jobs.items()):
+        by_channel.setdefault(job["channel"], []).append(dict(job, key=key))
+    return by_channel
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("_") or "channel"
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class _RateLimiter:
+    """
+    Token bucket: `rate` lines per second, bursts of up to `burst`.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "stamp", "dropped", "suppressed")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+        self.dropped = 0  # since the last line that got through
+        self.suppressed = 0  # total, already reported
+
+    def allow(self) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.dropped += 1
+        return False
+
+
+def _suppressed(limiter: _RateLimiter) -> str:
+    line = f"[{limiter.dropped} line(s) suppressed by rate limit]"
+    limiter.suppressed += limiter.dropped
+    limiter.dropped = 0
+    return line
+
+
+class JobLog:
+    """
+    Captured stderr of one job: the last `lines` lines in memory, plus the
+    latest ffmpeg status line kept apart so it doesn't flood the buffer.
+    """
+
+    def __init__(self, key: Hashable, channel_name: str, lines: int, limiter: _RateLimiter):
+        self.key = key
+        self.channel_name = channel_name
+        self.lines: Deque[str] = deque(maxlen=lines)
+        self.status = ""
+        self.limiter = limiter
+        self.partial = b""
+        self.started_at = timezone.now()
+        self.closed = False
+        self.last_error = ""
+        # Latest complete -progress block (frame, fps, bitrate, speed, ...).
+        self.progress: Dict[str, str] = {}
+        self.progress_at = None
+        self.progress_block: Dict[str, str] = {}
+        self.progress_partial = b""
+
+    def tail(self, n: Optional[int] = None) -> List[str]:
+        lines = list(self.lines)
+        return lines if n is None else lines[-n:]
+
+
+class JobLogHub:
+    """
+    Collects stderr of all ffmpeg jobs without one thread per job.
+
+    A single selector thread waits on every job's stderr pipe (non-blocking)
+    and splits the output into lines. Each line goes to the job's in-memory
+    ring buffer and, subject to a per-job rate limit, to a per-channel
+    rotating log file (older files gzip-compressed). Lines dropped by the
+    limiter are counted and reported once the stream calms down.
+
+    On Windows, where select() does not work on pipes, each job gets a
+    reader thread instead.
+    """
+
+    def __init__(
+        self,
+        log_dir: Optional[Path] = None,
+        lines: Optional[int] = None,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+    ):
+        self.log_dir = Path(log_dir or settings.TRANSCODER_JOB_LOG_DIR)
+        self.max_lines = lines or settings.TRANSCODER_JOB_LOG_LINES
+        self.rate = settings.TRANSCODER_JOB_LOG_RATE if rate is None else rate
+        self.burst = settings.TRANSCODER_JOB_LOG_BURST if burst is None else burst
+        self.jobs: Dict[Hashable, JobLog] = {}
+        self._handlers: Dict[str, logging.Handler] = {}
+        self._lock = threading.Lock()
+        self.dirty = False
+
+        self._threaded = os.name == "nt"
+        self._selector = None if self._threaded else selectors.DefaultSelector()
+        self._wake_r = self._wake_w = None
+        self._stopping = False
+        self._thread = None
+        if not self._threaded:
+            self._wake_r, self._wake_w = os.pipe()
+            os.set_blocking(self._wake_r, False)
+            self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+            self._thread = threading.Thread(target=self._run, name="job-stderr", daemon=True)
+            self._thread.start()
+
+    # ------------------------
+    # Registration
+    # ------------------------
+
+    def attach(
+        self,
+        key: Hashable,
+        channel_name: str,
+        stream: IO[bytes],
+        progress: Optional[IO[bytes]] = None,
+    ) -> JobLog:
+        """
+        Start capturing `stream` (a Popen stderr pipe) for job `key`, and
+        optionally the job's `-progress pipe:1` output.
+        A job restarted under the same key gets a fresh buffer.
+        """
+        job = JobLog(key, channel_name, self.max_lines, _RateLimiter(self.rate, self.burst))
+        with self._lock:
+            self.jobs[key] = job
+            self.dirty = True
+        streams = [(stream, False)] + ([(progress, True)] if progress is not None else [])
+        for pipe, is_progress in streams:
+            if self._threaded:
+                threading.Thread(
+                    target=self._read_blocking,
+                    args=(job, pipe, is_progress),
+                    name=f"job-output-{key}",
+                    daemon=True,
+                ).start()
+            else:
+                os.set_blocking(pipe.fileno(), False)
+                self._selector.register(pipe, selectors.EVENT_READ, (job, is_progress))
+        if not self._threaded:
+            os.write(self._wake_w, b"x")  # make select() pick up the new fds
+        return job
+
+    def forget(self, key: Hashable) -> None:
+        """
+        Drop a job's buffer (its pipe is closed by the reader on EOF).
+        """
+        with self._lock:
+            if self.jobs.pop(key, None) is not None:
+                self.dirty = True
+
+    def last_line(self, key: Hashable) -> str:
+        with self._lock:
+            job = self.jobs.get(key)
+            return job.lines[-1] if job is not None and job.lines else ""
+
+    def snapshot(self, lines: Optional[int] = None) -> Dict[str, dict]:
+        lines = lines or settings.TRANSCODER_JOB_LOG_SNAPSHOT_LINES
+        with self._lock:
+            self.dirty = False
+            return {
+                f"{key[0]}:{key[1]}" if isinstance(key, tuple) else str(key): {
+                    "channel": job.channel_name,
+                    "started_at": job.started_at.isoformat(),
+                    "status": job.status,
+                    "last_error": job.last_error,
+                    "progress": job.progress,
+                    "dropped": job.limiter.dropped + job.limiter.suppressed,
+                    "closed": job.closed,
+                    "lines": job.tail(lines),
+                }
+                for key, job in self.jobs.items()
+            }
+
+    def close(self) -> None:
+        self._stopping = True
+        if self._thread is not None:
+            os.write(self._wake_w, b"x")
+            self._thread.join(timeout=2)
+        for handler in self._handlers.values():
+            handler.close()
+
+    # ------------------------
+    # Reading
+    # ------------------------
+
+    def _run(self) -> None:
+        while not self._stopping:
+            for sel_key, _ in self._selector.select():
+                if sel_key.data is None:
+                    try:
+                        os.read(self._wake_r, 4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                stream, (job, is_progress) = sel_key.fileobj, sel_key.data
+                try:
+                    chunk = os.read(stream.fileno(), READ_CHUNK)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    chunk = b""
+                if chunk:
+                    (self._feed_progress if is_progress else self._feed)(job, chunk)
+                else:
+                    self._selector.unregister(stream)
+                    stream.close()
+                    if not is_progress:
+                        self._finish(job)
+
+    def _read_blocking(self, job: JobLog, stream: IO[bytes], is_progress: bool = False) -> None:
+        feed = self._feed_progress if is_progress else self._feed
+        try:
+            while True:
+                chunk = stream.read1(READ_CHUNK) if hasattr(stream, "read1") else stream.read(READ_CHUNK)
+                if not chunk:
+                    break
+                feed(job, chunk)
+        except (OSError, ValueError):
+            pass
+        finally:
+            stream.close()
+            if not is_progress:
+                self._finish(job)
+
+    def _feed_progress(self, job: JobLog, chunk: bytes) -> None:
+        """
+        Parse `-progress` output: key=value lines, each block ending with
+        progress=continue|end.
+        """
+        data = job.progress_partial + chunk
+        lines = data.split(b"\n")
+        job.progress_partial = lines.pop()[-MAX_LINE:]
+        for raw in lines:
+            name, sep, value = raw.decode("utf-8", "replace").strip().partition("=")
+            if not sep:
+                continue
+            if name == "progress":
+                with self._lock:
+                    job.progress = dict(job.progress_block, progress=value)
+                    job.progress_at = timezone.now()
+                    self.dirty = True
+                job.progress_block = {}
+            else:
+                job.progress_block[name] = value
+
+    def _feed(self, job: JobLog, chunk: bytes) -> None:
+        data = job.partial + chunk
+        parts = re.split(rb"\r\n|\r|\n", data)
+        job.partial = parts.pop()[-MAX_LINE:]
+        accepted = []
+        with self._lock:
+            for raw in parts:
+                if not raw.strip():
+                    continue
+                text = raw[:MAX_LINE].decode("utf-8", "replace")
+                if STATS_RE.match(raw):
+                    job.status = text.strip()
+                    continue
+                job.lines.append(text)
+                if ERROR_RE.search(text):
+                    job.last_error = text
+                if job.limiter.allow():
+                    if job.limiter.dropped:
+                        accepted.append(_suppressed(job.limiter))
+                    accepted.append(text)
+            self.dirty = True
+        self._write(job, accepted)
+
+    def _finish(self, job: JobLog) -> None:
+        if job.partial:
+            self._feed(job, b"\n")
+        job.closed = True
+        if job.limiter.dropped:
+            self._write(job, [_suppressed(job.limiter)])
+
+    # ------------------------
+    # Files
+    # ------------------------
+
+    def _handler(self, channel_name: str) -> logging.Handler:
+        handler = self._handlers.get(channel_name)
+        if handler is None:
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                self.log_dir / f"{_safe_name(channel_name)}.log",
+                maxBytes=settings.TRANSCODER_JOB_LOG_MAX_BYTES,
+                backupCount=settings.TRANSCODER_JOB_LOG_BACKUPS,
+                encoding="utf-8",
+                delay=True,
+            )
+            handler.namer = lambda name: name + ".gz"
+            handler.rotator = _gzip_rotator
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self._handlers[channel_name] = handler
+        return handler
+
+    def _write(self, job: JobLog, lines: List[str]) -> None:
+        if not lines:
+            return
+        try:
+            handler = self._handler(job.channel_name)
+            kind, ident = job.key if isinstance(job.key, tuple) else ("job", job.key)
+            for line in lines:
+                handler.emit(logging.LogRecord(
+                    "ffmpeg", logging.WARNING, "", 0, f"[{kind}={ident}] {line}", None, None
+                ))
+        except OSError:
+            logger.exception("Could not write job log for %s", job.channel_name)
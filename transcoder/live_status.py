@@ -0,0 +1,150 @@
+# transcoder/live_status.py
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from .profiling import state_dir
+
+
+def status_path():
+    return state_dir() / "job_status.json"
+
+
+def progress_kbps(progress: Dict[str, str]) -> Optional[float]:
+    """
+    Output bitrate of a -progress block ("bitrate=1234.5kbits/s"), or None
+    while ffmpeg reports N/A.
+    """
+    bitrate = progress.get("bitrate", "")
+    if bitrate.endswith("kbits/s"):
+        try:
+            return float(bitrate[:-7])
+        except ValueError:
+            pass
+    return None
+
+
+def _round_progress(progress: Dict[str, str]) -> dict:
+    """
+    Keep the -progress fields the dashboard shows, rounded so that jitter in
+    the last digit does not turn every job into a diff on every update.
+    """
+    out = {}
+    fps = progress.get("fps")
+    if fps:
+        try:
+            out["fps"] = round(float(fps))
+        except ValueError:
+            pass
+    kbps = progress_kbps(progress)
+    if kbps is not None:
+        out["kbps"] = int(round(kbps / 50) * 50)
+    speed = progress.get("speed", "")
+    if speed.endswith("x"):
+        try:
+            out["speed"] = round(float(speed[:-1]), 1)
+        except ValueError:
+            pass
+    for name in ("drop_frames", "dup_frames"):
+        if progress.get(name, "").isdigit():
+            out[name] = int(progress[name])
+    return out
+
+
+def job_status_entry(meta: dict, log=None, usage=None) -> dict:
+    """
+    One job's row in the status snapshot: enforcer metadata plus what the
+    job log hub and the /proc sampler know about it.
+    """
+    entry = dict(meta)
+    if log is not None:
+        entry.update(_round_progress(log.progress))
+        entry["last_error"] = log.last_error
+    if usage is not None:
+        entry["cpu_percent"] = round(usage.cpu_percent)
+        entry["rss_mb"] = round(usage.rss_bytes / 2 ** 20)
+    return entry
+
+
+class StatusBroker:
+    """
+    Process-wide cache of the enforcer's status snapshot for dashboards.
+
+    The snapshot file is checked at most every `min_interval` seconds no
+    matter how many clients are connected, and each change is turned into a
+    diff (changed rows + removed keys) once. Clients remember the version
+    they have; those that fell further behind than the retained history get
+    a full snapshot instead. Nothing here touches the database.
+    """
+
+    def __init__(self, min_interval: Optional[float] = None, history: int = 64):
+        self.min_interval = (
+            settings.TRANSCODER_STATUS_REFRESH_SECONDS if min_interval is None else min_interval
+        )
+        self.version = 0
+        self.jobs: Dict[str, dict] = {}
+        self.updated_at: Optional[str] = None
+        self._diffs: Deque[Tuple[int, dict]] = deque(maxlen=history)
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> int:
+        """
+        Pick up a new snapshot if the file changed; returns the current version.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked < self.min_interval:
+                return self.version
+            self._checked = now
+            path = status_path()
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                if mtime == self._mtime:
+                    return self.version
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                return self.version
+            self._mtime = mtime
+
+            jobs = data.get("jobs", {})
+            changed = {k: v for k, v in jobs.items() if self.jobs.get(k) != v}
+            removed = [k for k in self.jobs if k not in jobs]
+            self.jobs = jobs
+            self.updated_at = data.get("updated_at")
+            if changed or removed or self.version == 0:
+                self.version += 1
+                self._diffs.append((self.version, {"jobs": changed, "removed": removed}))
+            return self.version
+
+    def since(self, version: int) -> dict:
+        """
+        What a client at `version` needs to catch up: a diff, or a full
+        snapshot if it is new or too far behind.
+        """
+        with self._lock:
+            payload = {"version": self.version, "updated_at": self.updated_at}
+            if version == self.version:
+                return dict(payload, full=False, jobs={}, removed=[])
+            if version and self._diffs and self._diffs[0][0] <= version + 1:
+                jobs, removed = {}, set()
+                for v, diff in self._diffs:
+                    if v <= version:
+                        continue
+                    for k in diff["removed"]:
+                        jobs.pop(k, None)
+                        removed.add(k)
+                    for k, row in diff["jobs"].items():
+                        jobs[k] = row
+                        removed.discard(k)
+                return dict(payload, full=False, jobs=jobs, removed=sorted(removed))
+            return dict(payload, full=True, jobs=dict(self.jobs), removed=[])
+
+
+broker = StatusBroker()
@@ -27,6 +27,8 @@ class Command(BaseCommand):
             raise CommandError(f"Channel with id={channel_id} does not exist.")
 
         job = FFmpegJobConfig(channel=chan, purpose=purpose)
+        if purpose == "playback":
+            job.timeshift_profiles = list(chan.timeshift_profiles.filter(enabled=True))
         cmd_list = job.build_command()
 
         self.stdout.write(f"Running FFmpeg:\n{' '.join(cmd_list)}")
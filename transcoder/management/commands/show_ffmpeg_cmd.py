@@ -1,6 +1,7 @@
 # transcoder/management/commands/show_ffmpeg_cmd.py
 from django.core.management.base import BaseCommand, CommandError
 
+from transcoder.encoder_tuning import plan_cpu_encode
 from transcoder.ffmpeg_runner import build_ffmpeg_cmd_for_channel
 from transcoder.models import Channel
 
@@ -22,5 +23,11 @@ class Command(BaseCommand):
 
         cmd = build_ffmpeg_cmd_for_channel(channel_id, purpose="live_forward")
         self.stdout.write(self.style.SUCCESS(f"Channel: {chan.name}"))
+        plan = plan_cpu_encode(chan)
+        if plan is not None:
+            self.stdout.write(
+                f"CPU encode: {plan.encoder} preset {plan.preset}, {plan.threads} thread(s) "
+                f"when it runs alone ({plan.reason})"
+            )
         self.stdout.write("FFmpeg command:")
         self.stdout.write(cmd)
@@ -0,0 +1,79 @@
+# transcoder/management/commands/transcoder_archive.py
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from transcoder.archive import archive_stats, archive_worker_pool, enqueue_existing, requeue_stale
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-encode aging recordings to each channel's ArchiveProfile: 'run' the "
+        "low-priority worker pool, 'scan' the recording folders into the queue, "
+        "or show 'stats'. Run one 'run' per host."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["run", "scan", "stats"])
+        parser.add_argument("--workers", type=int, help="run: concurrent encodes (default TRANSCODER_ARCHIVE_WORKERS).")
+        parser.add_argument("--once", action="store_true", help="run: exit when no job is due.")
+        parser.add_argument("--no-scan", action="store_true", help="run: rely on the segment watcher only.")
+        parser.add_argument("--days", type=float, help="stats: only jobs finished in the last N days.")
+
+    def handle(self, *args, **options):
+        action = options["action"]
+        if action == "scan":
+            seen = enqueue_existing()
+            self.stdout.write(self.style.SUCCESS(f"{seen} closed segment(s) offered to the queue."))
+            self._stats()
+        elif action == "stats":
+            since = timezone.now() - timedelta(days=options["days"]) if options["days"] else None
+            self._stats(since)
+        else:
+            self._run(options)
+
+    def _run(self, options):
+        stale = requeue_stale()
+        if stale:
+            self.stdout.write(self.style.WARNING(f"{stale} interrupted job(s) put back in the queue."))
+
+        last_scan = [float("-inf")]
+
+        def scan():
+            if options["no_scan"] or time.monotonic() - last_scan[0] < settings.TRANSCODER_ARCHIVE_SCAN_INTERVAL:
+                return
+            last_scan[0] = time.monotonic()
+            enqueue_existing()
+
+        scan()
+        pool = archive_worker_pool(options["workers"])
+        self.stdout.write(f"Archive workers: {pool.workers}")
+        started = timezone.now()
+        try:
+            pool.run(once=options["once"], poll_interval=30.0, idle=scan)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Interrupted; waiting for running encodes."))
+        self.stdout.write(self.style.SUCCESS(f"{pool.done} segment(s) processed, {pool.failed} failed."))
+        self._stats(started)
+
+    def _stats(self, since=None):
+        stats = archive_stats(since)
+        counts = ", ".join(f"{status} {n}" for status, n in stats["counts"].items())
+        self.stdout.write(f"Queue: {counts} ({stats['due']} due now)")
+        if not stats["segments"]:
+            self.stdout.write("No segments archived" + (" in this period." if since else " yet."))
+            return
+        self.stdout.write(
+            f"Archived {stats['segments']} segment(s): {filesizeformat(stats['original_bytes'])} -> "
+            f"{filesizeformat(stats['archived_bytes'])}, saved {filesizeformat(stats['saved_bytes'])} "
+            f"({(1 - stats['ratio']) * 100:.0f}%)"
+        )
+        if stats["mb_per_second"] is not None:
+            self.stdout.write(
+                f"Throughput: {stats['mb_per_second']:.1f} MB/s of source over "
+                f"{stats['encode_seconds']:.0f}s of encoding"
+            )
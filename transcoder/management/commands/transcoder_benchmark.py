@@ -0,0 +1,315 @@
+import datetime as dt
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from transcoder.ffmpeg_runner import FFmpegJobConfig
+from transcoder.management.commands.transcoder_enforcer import Command as EnforcerCommand
+from transcoder.models import Channel, RecurringSchedule, Schedule, TimeShiftProfile
+from transcoder.profiling import TickProfiler
+from transcoder.reconcile import desired_jobs, plan_actions
+from transcoder.start_pipeline import StartPipeline
+
+INPUTS = [
+    ("file", "test_media/testsrc.mp4"),
+    ("udp_multicast", "udp://@239.10.0.1:2001"),
+    ("rtsp", "rtsp://10.0.0.10:554/stream1"),
+]
+OUTPUTS = [
+    ("hls", "hls/{name}"),
+    ("udp_ts", "udp://239.20.0.1:5000?ttl=1"),
+    ("rtmp", "rtmp://127.0.0.1/live/{name}"),
+]
+
+
+class _FakeProc:
+    """
+    Stands in for subprocess.Popen so reconcile passes never spawn ffmpeg.
+    """
+    returncode = None
+    pid = 0
+
+    def __init__(self, cmd):
+        self.args = cmd
+
+    def poll(self):
+        return None
+
+    def terminate(self):
+        pass
+
+
+def _timed(fn, repeat: int = 1) -> float:
+    """
+    Best wall time of `repeat` runs, in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark scheduling, command building and segment lookup on synthetic data. "
+        "Rows are created inside a transaction that is rolled back; output is JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="10,100,1000,10000",
+            help="Comma-separated population sizes (channels, and as many one-off and recurring schedules).",
+        )
+        parser.add_argument(
+            "--segment-sizes",
+            default="10,100,1000,10000",
+            help="Comma-separated numbers of fake segments per recording folder.",
+        )
+        parser.add_argument(
+            "--build-samples",
+            type=int,
+            default=1000,
+            help="build_command() calls timed per purpose.",
+        )
+        parser.add_argument("--output", help="Write JSON here instead of stdout.")
+
+    def handle(self, *args, **options):
+        sizes = [int(x) for x in options["sizes"].split(",") if x]
+        segment_sizes = [int(x) for x in options["segment_sizes"].split(",") if x]
+        results = []
+
+        with tempfile.TemporaryDirectory(prefix="tx-bench-") as media_root:
+            with override_settings(
+                MEDIA_ROOT=media_root,
+                TRANSCODER_STATE_DIR=Path(media_root) / "run",
+                TRANSCODER_START_JITTER={},
+            ):
+                for n in sizes:
+                    results += self._bench_population(n)
+                    self.stderr.write(f"population {n}: done")
+                results += self._bench_build_command(options["build_samples"])
+                for n in segment_sizes:
+                    results += self._bench_segment_lookup(Path(media_root), n)
+                    self.stderr.write(f"segments {n}: done")
+
+        report = {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "python": sys.version.split()[0],
+                "django": django.get_version(),
+                "platform": platform.platform(),
+                "machine": platform.machine(),
+            },
+            "results": results,
+        }
+        data = json.dumps(report, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(data + "\n")
+        else:
+            self.stdout.write(data)
+
+    # ------------------------
+    # Synthetic populations
+    # ------------------------
+
+    def _populate(self, n: int, now: dt.datetime) -> None:
+        channels = []
+        for i in range(n):
+            in_type, in_url = INPUTS[i % len(INPUTS)]
+            out_type, out_target = OUTPUTS[i % len(OUTPUTS)]
+            name = f"bench-{i:06d}"
+            channels.append(Channel(
+                name=name,
+                input_type=in_type,
+                input_url=in_url,
+                output_type=out_type,
+                output_target=out_target.format(name=name),
+            ))
+        channels = Channel.objects.bulk_create(channels, batch_size=1000)
+
+        oneoff = []
+        recurring = []
+        for i, chan in enumerate(channels):
+            purpose = "record" if i % 2 else "live_forward"
+            # Half of the one-off schedules are open now.
+            start_at = now + dt.timedelta(hours=(i % 4) - 2)
+            oneoff.append(Schedule(
+                name=f"bench-oneoff-{i}",
+                channel=chan,
+                purpose=purpose,
+                start_at=start_at,
+                end_at=start_at + dt.timedelta(hours=1, minutes=30),
+            ))
+            # Windows spread over the day; some overnight, some full-day.
+            start_hour = i % 24
+            recurring.append(RecurringSchedule(
+                name=f"bench-recurring-{i}",
+                channel=chan,
+                purpose=purpose,
+                start_time=dt.time(start_hour, 0),
+                end_time=dt.time((start_hour + 2 + i % 5) % 24, 0),
+                saturday=bool(i % 7),
+            ))
+        Schedule.objects.bulk_create(oneoff, batch_size=1000)
+        RecurringSchedule.objects.bulk_create(recurring, batch_size=1000)
+
+    def _bench_population(self, n: int):
+        results = []
+        now = timezone.localtime()
+
+        with transaction.atomic():
+            t_populate = _timed(lambda: self._populate(n, now))
+            results.append({"benchmark": "populate", "size": n, "seconds": t_populate})
+
+            enforcer = EnforcerCommand(stdout=io.StringIO(), stderr=io.StringIO())
+            enforcer.placer = None
+            enforcer.channel_prefix = ""
+            enforcer.profiler = TickProfiler()
+            enforcer.procstats = None
+            enforcer.job_logs = None
+            enforcer.watchdog = None
+            enforcer.speed_monitor = None
+            enforcer.faster_presets = {}
+            enforcer.job_meta = {}
+            enforcer.channels = {}
+            enforcer.held = set()
+            enforcer.draining = False
+            enforcer.pipeline = StartPipeline(jitter={}, popen=_FakeProc)
+            running = {}
+            try:
+                t_cold = _timed(lambda: enforcer.tick(running, now=now))
+                started = len(running)
+                cold_phases = dict(enforcer.profiler.last_tick)
+                t_steady = _timed(lambda: enforcer.tick(running, now=now), repeat=3)
+            finally:
+                enforcer.pipeline.shutdown()
+            results.append({
+                "benchmark": "reconcile_cold",
+                "size": n,
+                "seconds": t_cold,
+                "jobs_started": started,
+                "phases": cold_phases,
+            })
+            results.append({
+                "benchmark": "reconcile_steady",
+                "size": n,
+                "seconds": t_steady,
+                "phases": dict(enforcer.profiler.last_tick),
+            })
+
+            # The same pass without the database: snapshot loaded once, steady state.
+            t_snapshot = _timed(lambda: enforcer._load_snapshot(now), repeat=3)
+            results.append({"benchmark": "snapshot_load", "size": n, "seconds": t_snapshot})
+            snapshot = enforcer._load_snapshot(now)
+            max_preroll = settings.TRANSCODER_MAX_PREROLL_SECONDS
+            alive = dict.fromkeys(desired_jobs(snapshot, now, max_preroll), True)
+            t_core = _timed(lambda: plan_actions(desired_jobs(snapshot, now, max_preroll), alive), repeat=3)
+            results.append({
+                "benchmark": "reconcile_core",
+                "size": n,
+                "seconds": t_core,
+                "schedules": len(snapshot.oneoff) + len(snapshot.recurring),
+            })
+
+            schedules = list(RecurringSchedule.objects.all())
+            t_active = _timed(lambda: [rs.is_active_now(now) for rs in schedules], repeat=3)
+            results.append({
+                "benchmark": "is_active_now",
+                "size": n,
+                "seconds": t_active,
+                "per_item_us": t_active / max(len(schedules), 1) * 1e6,
+            })
+
+            transaction.set_rollback(True)
+        return results
+
+    # ------------------------
+    # Command building
+    # ------------------------
+
+    def _bench_build_command(self, samples: int):
+        results = []
+        channels = []
+        for i in range(len(INPUTS) * len(OUTPUTS)):
+            in_type, in_url = INPUTS[i % len(INPUTS)]
+            out_type, out_target = OUTPUTS[(i // len(INPUTS)) % len(OUTPUTS)]
+            channels.append(Channel(
+                id=i + 1,
+                name=f"bench-build-{i}",
+                input_type=in_type,
+                input_url=in_url,
+                output_type=out_type,
+                output_target=out_target.format(name=i),
+            ))
+
+        # Playback starts the channel's playout engine for its profiles.
+        profiles = [
+            TimeShiftProfile(enabled=True, delay_minutes=delay, output_udp_url=f"udp://239.30.0.1:{5000 + delay}")
+            for delay in (60, 180, 360)
+        ]
+
+        for purpose in ("live_forward", "record", "playback"):
+            jobs = [
+                FFmpegJobConfig(
+                    channel=channels[i % len(channels)],
+                    purpose=purpose,
+                    timeshift_profiles=profiles if purpose == "playback" else None,
+                )
+                for i in range(samples)
+            ]
+            seconds = _timed(lambda: [j.build_command() for j in jobs], repeat=3)
+            results.append({
+                "benchmark": f"build_command_{purpose}",
+                "size": samples,
+                "seconds": seconds,
+                "per_item_us": seconds / max(samples, 1) * 1e6,
+            })
+        return results
+
+    # ------------------------
+    # Segment lookup
+    # ------------------------
+
+    def _bench_segment_lookup(self, media_root: Path, n: int):
+        results = []
+        for aligned in (False, True):
+            chan = Channel(
+                id=10_000_000 + n * 2 + int(aligned),
+                name=f"bench-seg-{n}-{'aligned' if aligned else 'plain'}",
+                input_type="file",
+                input_url="x",
+                output_type="hls",
+                output_target="x",
+                recording_path_template="bench-segments/{channel}/",
+                recording_segment_seconds=10,
+                recording_aligned=aligned,
+            )
+            job = FFmpegJobConfig(channel=chan, purpose="playback")
+            first = dt.datetime(2025, 1, 1, 0, 0, 0)
+            seg_dir = job._recording_dir(first)
+            seg_dir.mkdir(parents=True, exist_ok=True)
+            for i in range(n):
+                (seg_dir / f"{chan.name}_{first + dt.timedelta(seconds=10 * i):%Y%m%d-%H%M%S}.ts").touch()
+
+            target = first + dt.timedelta(seconds=10 * (n // 2) + 3)
+            seconds = _timed(lambda: job._find_segment_at(target), repeat=5)
+            results.append({
+                "benchmark": "find_segment_aligned" if aligned else "find_segment_listing",
+                "size": n,
+                "seconds": seconds,
+            })
+        return results
@@ -0,0 +1,90 @@
+# transcoder/management/commands/transcoder_calibrate.py
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transcoder.encoder_tuning import PRESETS, calibration_path, cpu_count, read_calibration
+from transcoder.profiling import write_json_atomic
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark libx264/libx265 presets on this host and save the throughput "
+        "the enforcer uses to pick a preset and thread count per CPU transcode. "
+        "Run it while no jobs are running: it loads every core."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--encoder", default="libx264", choices=["libx264", "libx265"])
+        parser.add_argument(
+            "--presets",
+            default="ultrafast,superfast,veryfast,faster,fast,medium",
+            help="Comma-separated presets to measure (slower ones take long).",
+        )
+        parser.add_argument("--size", default="1920x1080", help="Test picture size (default 1920x1080).")
+        parser.add_argument("--frames", type=int, default=100, help="Frames encoded per measurement.")
+        parser.add_argument("--ffmpeg", default="ffmpeg")
+
+    def _run(self, options, codec_args) -> float:
+        """
+        Seconds to encode the test frames with `codec_args`.
+        """
+        cmd = [
+            options["ffmpeg"], "-hide_banner", "-loglevel", "error", "-nostdin",
+            "-f", "lavfi", "-i", f"testsrc2=size={options['size']}:rate=25",
+            "-frames:v", str(options["frames"]), *codec_args, "-f", "null", "-",
+        ]
+        started = time.perf_counter()
+        try:
+            subprocess.run(cmd, capture_output=True, check=True)
+        except FileNotFoundError:
+            raise CommandError(f"{options['ffmpeg']} not found.")
+        except subprocess.CalledProcessError as exc:
+            raise CommandError(f"ffmpeg failed: {exc.stderr.decode(errors='replace').strip()[-300:]}")
+        return time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        presets = [p.strip() for p in options["presets"].split(",") if p.strip()]
+        unknown = [p for p in presets if p not in PRESETS]
+        if unknown:
+            raise CommandError(f"Unknown preset(s): {', '.join(unknown)}")
+        try:
+            width, height = (int(v) for v in options["size"].lower().split("x"))
+        except ValueError:
+            raise CommandError("--size must look like 1920x1080.")
+        encoder, cores = options["encoder"], cpu_count()
+        mpix = width * height * options["frames"] / 1e6
+
+        # Generating the test picture costs time too; measure it and take it off.
+        baseline = self._run(options, ["-c:v", "rawvideo"])
+        self.stdout.write(f"{cores} core(s), {options['size']}, {options['frames']} frames; source {baseline:.2f}s")
+
+        measured = {}
+        for preset in sorted(presets, key=PRESETS.index):
+            seconds = max(self._run(options, ["-c:v", encoder, "-preset", preset, "-threads", "1"]) - baseline, 1e-3)
+            measured[preset] = round(mpix / seconds, 3)
+            streams = measured[preset] * cores / (1920 * 1080 * 25 / 1e6)
+            self.stdout.write(
+                f"  {preset:<10} {measured[preset]:8.2f} Mpixel/s per thread  "
+                f"(~{streams:.1f} x 1080p25 on all cores)"
+            )
+
+        # How well one encode spreads over every core, on the middle preset.
+        efficiency = 1.0
+        if cores > 1:
+            probe = presets[len(presets) // 2]
+            seconds = max(self._run(options, ["-c:v", encoder, "-preset", probe, "-threads", str(cores)]) - baseline, 1e-3)
+            efficiency = round(min(1.0, mpix / seconds / (measured[probe] * cores)), 3)
+            self.stdout.write(f"  thread efficiency on {cores} threads ({probe}): {efficiency:.0%}")
+
+        data = read_calibration() or {}
+        data.setdefault("encoders", {})[encoder] = {
+            "presets": measured,
+            "thread_efficiency": efficiency,
+            "size": options["size"],
+        }
+        data.update(measured_at=timezone.now().isoformat(), cpus=cores)
+        write_json_atomic(calibration_path(), data)
+        self.stdout.write(self.style.SUCCESS(f"Saved to {calibration_path()}"))
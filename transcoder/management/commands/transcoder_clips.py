@@ -0,0 +1,118 @@
+# transcoder/management/commands/transcoder_clips.py
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transcoder.clips import ClipError, clip_worker_pool, export_clip, vod_playlist
+from transcoder.models import Channel, ClipExport, ClipStatus
+from transcoder.segment_watcher import recording_root
+from transcoder.staging import final_path, is_staged
+
+
+def _parse_time(value: str) -> datetime:
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError as exc:
+        raise CommandError(f"Invalid time {value!r}: {exc}")
+    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+
+class Command(BaseCommand):
+    help = (
+        "Cut clips from recordings with stream copy (or --precise re-encoding): "
+        "'export' one now, 'queue' one for the workers, or 'run' the worker pool. "
+        "'playlist' writes an HLS playlist serving fragmented MP4 recordings by byte range."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["export", "queue", "run", "playlist"])
+        parser.add_argument("channel", nargs="?", help="Channel name (export/queue/playlist).")
+        parser.add_argument("start", nargs="?", help="Local start time, e.g. 2026-10-19T14:03.")
+        parser.add_argument("end", nargs="?", help="Local end time, e.g. 2026-10-19T14:47.")
+        parser.add_argument("--precise", action="store_true", help="Cut exactly at start/end (re-encodes).")
+        parser.add_argument("--format", choices=["ts", "mp4"], default="ts")
+        parser.add_argument("-o", "--output", help="export: copy the clip here as well; playlist: write it here.")
+        parser.add_argument(
+            "--base-url", default="",
+            help="playlist: URL the channel's recording root is served under (default: paths relative to it, "
+                 "for a playlist stored there).",
+        )
+        parser.add_argument("--workers", type=int, help="run: concurrent exports (default TRANSCODER_CLIP_WORKERS).")
+        parser.add_argument("--once", action="store_true", help="run: exit when the queue is empty.")
+
+    def handle(self, *args, **options):
+        if options["action"] == "run":
+            pool = clip_worker_pool(options["workers"])
+            self.stdout.write(f"Clip workers: {pool.workers}")
+            try:
+                pool.run(once=options["once"])
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING("Interrupted; waiting for running exports."))
+            self.stdout.write(self.style.SUCCESS(f"{pool.done} clip(s) exported, {pool.failed} failed."))
+            return
+
+        if not (options["channel"] and options["start"] and options["end"]):
+            raise CommandError(f"'{options['action']}' needs a channel, a start and an end time.")
+        try:
+            chan = Channel.objects.get(name=options["channel"])
+        except Channel.DoesNotExist:
+            raise CommandError(f"Unknown channel {options['channel']!r}.")
+        start, end = _parse_time(options["start"]), _parse_time(options["end"])
+        if end <= start:
+            raise CommandError("The end must be after the start.")
+
+        if options["action"] == "playlist":
+            self._playlist(chan, start, end, options)
+            return
+
+        clip = ClipExport.objects.create(
+            channel=chan,
+            start_at=start,
+            end_at=end,
+            precise=options["precise"],
+            output_format=options["format"],
+            status=ClipStatus.QUEUED if options["action"] == "queue" else ClipStatus.RUNNING,
+            started_at=None if options["action"] == "queue" else timezone.now(),
+        )
+        if options["action"] == "queue":
+            self.stdout.write(self.style.SUCCESS(f"Queued clip {clip.pk}."))
+            return
+
+        export_clip(clip)
+        if clip.status != ClipStatus.DONE:
+            raise CommandError(f"Clip {clip.pk} failed: {clip.error}")
+        if options["output"]:
+            shutil.copyfile(clip.output_path, options["output"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Clip {clip.pk}: {clip.output_path} ({clip.size_bytes} bytes from {clip.segments} segment(s))"
+        ))
+
+    def _playlist(self, chan: Channel, start: datetime, end: datetime, options) -> None:
+        root = recording_root(chan)
+        base_url = options["base_url"]
+        if base_url and not base_url.endswith("/"):
+            base_url += "/"
+
+        def uri_for(path: Path) -> str:
+            # Segments still staged are listed where the mover puts them.
+            path = final_path(path) if is_staged(path) else path
+            return base_url + Path(os.path.relpath(path, root)).as_posix()
+
+        try:
+            text = vod_playlist(
+                chan,
+                timezone.localtime(start).replace(tzinfo=None),
+                timezone.localtime(end).replace(tzinfo=None),
+                uri_for,
+            )
+        except ClipError as exc:
+            raise CommandError(str(exc))
+        if options["output"]:
+            Path(options["output"]).write_text(text)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(text, ending="")
@@ -0,0 +1,91 @@
+# transcoder/management/commands/transcoder_continuity.py
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transcoder.continuity import rebuild_channel, scan_channel, timeline
+from transcoder.models import Channel
+
+
+def _parse_time(value: str) -> datetime:
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError as exc:
+        raise CommandError(f"Invalid time {value!r}: {exc}")
+    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}h{rest // 60:02d}m{rest % 60:02d}s" if hours else f"{rest // 60}m{rest % 60:02d}s"
+
+
+class Command(BaseCommand):
+    help = (
+        "Recording continuity map: 'show' a channel's coverage and gaps between two "
+        "times, 'scan' recording folders for segments not indexed yet, or 'rebuild' "
+        "the map after recordings were deleted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["show", "scan", "rebuild"])
+        parser.add_argument("channels", nargs="*", help="Channel names (default: all recording channels).")
+        parser.add_argument("--from", dest="start", help="show: local start time (default: 24 hours ago).")
+        parser.add_argument("--to", dest="end", help="show: local end time (default: now).")
+
+    def handle(self, *args, **options):
+        qs = Channel.objects.order_by("name")
+        if options["channels"]:
+            qs = qs.filter(name__in=options["channels"])
+            missing = set(options["channels"]) - set(qs.values_list("name", flat=True))
+            if missing:
+                raise CommandError(f"Unknown channel(s): {', '.join(sorted(missing))}")
+        else:
+            qs = qs.filter(record_enabled=True)
+
+        if options["action"] == "scan":
+            for chan in qs:
+                started = time.monotonic()
+                indexed, failed = scan_channel(chan)
+                style = self.style.WARNING if failed else self.style.SUCCESS
+                self.stdout.write(style(
+                    f"{chan.name}: {indexed} segment(s) indexed, {failed} unreadable "
+                    f"({time.monotonic() - started:.1f}s)"
+                ))
+        elif options["action"] == "rebuild":
+            for chan in qs:
+                count = rebuild_channel(chan)
+                self.stdout.write(self.style.SUCCESS(f"{chan.name}: {count} coverage interval(s)"))
+        else:
+            end = _parse_time(options["end"]) if options["end"] else timezone.now()
+            start = _parse_time(options["start"]) if options["start"] else end - timedelta(days=1)
+            if end <= start:
+                raise CommandError("--to must be after --from.")
+            for chan in qs:
+                self._show(chan, start, end)
+
+    def _show(self, chan: Channel, start: datetime, end: datetime) -> None:
+        started = time.perf_counter()
+        spans = timeline(chan, start, end)
+        elapsed = time.perf_counter() - started
+
+        covered = sum(span.seconds for span in spans if span.covered)
+        total = (end - start).total_seconds()
+        self.stdout.write(
+            f"{chan.name}: {_duration(covered)} of {_duration(total)} recorded "
+            f"({covered / total * 100:.1f}%), queried in {elapsed * 1000:.1f}ms"
+        )
+        for span in spans:
+            when = f"{timezone.localtime(span.start):%Y-%m-%d %H:%M:%S} - {timezone.localtime(span.end):%Y-%m-%d %H:%M:%S}"
+            if span.covered:
+                line = (
+                    f"  recorded {when} ({_duration(span.seconds)}, {span.segments} segment(s), "
+                    f"{span.cc_errors} CC error(s), {span.pcr_discontinuities} PCR discontinuity(ies))"
+                )
+                damaged = span.cc_errors or span.pcr_discontinuities
+                self.stdout.write(self.style.WARNING(line) if damaged else line)
+            else:
+                self.stdout.write(self.style.ERROR(f"  GAP      {when} ({_duration(span.seconds)})"))
@@ -0,0 +1,92 @@
+# transcoder/management/commands/transcoder_ctl.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transcoder.control import ControlError, call, parse_job_key
+
+
+class Command(BaseCommand):
+    help = (
+        "Talk to a running transcoder_enforcer over its control socket: list jobs, "
+        "reconcile now, restart/stop/start one job, drain or resume the node."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "action",
+            choices=["list", "reconcile", "restart", "stop", "start", "drain", "resume"],
+        )
+        parser.add_argument(
+            "job",
+            nargs="?",
+            help="Job key for restart/stop/start, e.g. oneoff:12 or recurring:3.",
+        )
+        parser.add_argument(
+            "--grace",
+            type=float,
+            help="Seconds to wait for ffmpeg to exit after SIGTERM before killing it.",
+        )
+        parser.add_argument("--socket", help="Control socket path (default from settings).")
+        parser.add_argument("--json", action="store_true", help="Print the raw JSON reply.")
+
+    def handle(self, *args, **options):
+        action = options["action"]
+        request = {}
+        if action in ("restart", "stop", "start"):
+            if not options["job"]:
+                raise CommandError(f"'{action}' needs a job key, e.g. oneoff:12.")
+            try:
+                parse_job_key(options["job"])
+            except ControlError as exc:
+                raise CommandError(str(exc))
+            request["job"] = options["job"]
+        if options["grace"] is not None:
+            request["grace"] = options["grace"]
+
+        try:
+            reply = call(action, path=options["socket"], **request)
+        except (ControlError, OSError) as exc:
+            raise CommandError(str(exc))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(reply, indent=2))
+            return
+        if not reply.get("ok"):
+            raise CommandError(reply.get("error", "request failed"))
+
+        if action == "list":
+            self._print_jobs(reply)
+        elif "job" in reply:
+            job = reply["job"]
+            state = "running" if job["alive"] else ("held" if job["held"] else "not running")
+            pid = f" pid={job['pid']}" if job.get("pid") and job["alive"] else ""
+            self.stdout.write(self.style.SUCCESS(f"{job['key']}: {state}{pid}"))
+        elif "killed" in reply:
+            self.stdout.write(self.style.SUCCESS(
+                f"Stopped {reply['stopped']} job(s), killed {reply['killed']} after the grace period."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{reply.get('running', 0)} job(s) running."))
+
+    def _print_jobs(self, reply: dict) -> None:
+        if reply.get("draining"):
+            self.stdout.write(self.style.WARNING("Node is draining: no jobs will be started."))
+        jobs = reply.get("jobs", [])
+        if not jobs:
+            self.stdout.write("No jobs.")
+            return
+        self.stdout.write(
+            f"{'job':<16}{'state':<10}{'pid':>8}  {'purpose':<14}{'channel':<24}schedule"
+        )
+        for job in jobs:
+            if job["alive"]:
+                state = "running"
+            elif job["held"]:
+                state = "held"
+            else:
+                state = job.get("state", "-")
+            self.stdout.write(
+                f"{job['key']:<16}{state:<10}{job.get('pid') or '-':>8}  "
+                f"{job.get('purpose', '-'):<14}{job.get('channel', '-'):<24}{job.get('schedule', '-')}"
+            )
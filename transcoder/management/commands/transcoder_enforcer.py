@@ -1,14 +1,28 @@
+import functools
+import socket
 import subprocess
 import time
-from typing import Dict, Tuple
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
-from transcoder.ffmpeg_runner import FFmpegJobConfig
-from transcoder.models import Schedule, RecurringSchedule
-
-JobKey = Tuple[str, int]  # ("oneoff" or "recurring", schedule_id)
+from transcoder.control import ControlError, ControlServer, parse_job_key
+from transcoder.encoder_tuning import SpeedMonitor, cpu_encoder_for
+from transcoder.ffmpeg_runner import FFmpegJobConfig, ensure_recording_dirs
+from transcoder.job_logs import JobLogHub, logs_snapshot_path
+from transcoder.live_status import job_status_entry, progress_kbps, status_path
+from transcoder.models import Channel, Schedule, RecurringSchedule
+from transcoder.nic_placement import NicPlacer, RX, TX, is_multicast_url
+from transcoder.procstats import AVAILABLE as PROCSTATS_AVAILABLE, ProcSampler, procstats_path
+from transcoder.profiling import TickProfiler, metrics_path, write_json_atomic
+from transcoder.reconcile import (
+    ChannelSnap, JobKey, OneOffSnap, RecurringSnap, Snapshot, cpu_transcodes, desired_jobs, plan_actions,
+)
+from transcoder.start_pipeline import StartPipeline, StartRequest, worst_lag_by_boundary
+from transcoder.watchdog import OutputWatchdog
 
 
 class Command(BaseCommand):
@@ -16,132 +30,691 @@ class Command(BaseCommand):
 
     POLL_INTERVAL = 5  # seconds
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--nic-placement",
+            action="store_true",
+            default=settings.TRANSCODER_NIC_PLACEMENT,
+            help=(
+                "Spread multicast inputs and UDP outputs of channels without a "
+                "multicast_interface across settings.TRANSCODER_NICS."
+            ),
+        )
+        parser.add_argument(
+            "--start-workers",
+            type=int,
+            default=settings.TRANSCODER_START_WORKERS,
+            help="Threads preparing ffmpeg commands when many jobs start at once.",
+        )
+        parser.add_argument(
+            "--spawn-concurrency",
+            type=int,
+            default=settings.TRANSCODER_SPAWN_CONCURRENCY,
+            help="Maximum number of ffmpeg processes being spawned in parallel.",
+        )
+        parser.add_argument(
+            "--channel-prefix",
+            default="",
+            help="Only enforce schedules of channels whose name starts with this prefix.",
+        )
+        parser.add_argument(
+            "--job-stderr",
+            choices=["capture", "inherit"],
+            default=settings.TRANSCODER_JOB_STDERR,
+            help=(
+                "capture: collect each job's stderr into per-job buffers and per-channel "
+                "log files under TRANSCODER_JOB_LOG_DIR; inherit: jobs write to this console."
+            ),
+        )
+        parser.add_argument(
+            "--stall-seconds",
+            type=float,
+            default=settings.TRANSCODER_STALL_SECONDS,
+            help=(
+                "Restart jobs whose output (HLS playlist, recording segment, -progress "
+                "out_time) has not advanced for this many seconds (0 disables)."
+            ),
+        )
+        parser.add_argument(
+            "--no-control",
+            action="store_true",
+            help="Don't open the control socket (TRANSCODER_CONTROL_SOCKET) used by transcoder_ctl.",
+        )
+        parser.add_argument(
+            "--slow-tick",
+            type=float,
+            default=settings.TRANSCODER_SLOW_TICK_SECONDS,
+            help=(
+                "Ticks slower than this many seconds leave stack samples in "
+                "TRANSCODER_STATE_DIR/slow_ticks/ (0 disables)."
+            ),
+        )
+        parser.add_argument(
+            "--profile-slow-ticks",
+            action="store_true",
+            help="Also run every tick under cProfile and keep the stats of slow ones.",
+        )
+
+    def _place_job(self, key: JobKey, chan, purpose: str) -> FFmpegJobConfig:
+        """
+        Build the job config, choosing NICs when placement mode is on.
+        Channels with an explicit multicast_interface are never moved.
+        """
+        job = FFmpegJobConfig(channel=chan, purpose=purpose)
+        if purpose == "playback":
+            # Loaded here: build_command() runs in a start worker thread.
+            job.timeshift_profiles = list(chan.timeshift_profiles.filter(enabled=True))
+        if self.placer is None or chan.multicast_interface:
+            return job
+
+        if purpose in ("live_forward", "record") and chan.input_type == "udp_multicast":
+            job.input_interface = self.placer.assign(key, RX, chan)
+
+        if purpose == "live_forward" and chan.output_type == "udp_ts":
+            output_url = chan.output_target
+        elif purpose == "playback":
+            # One engine serves all of the channel's delays, from one NIC.
+            output_url = next(
+                (p.output_udp_url for p in job.timeshift_profiles if is_multicast_url(p.output_udp_url)), ""
+            )
+        else:
+            output_url = ""
+        if is_multicast_url(output_url):
+            job.output_interface = self.placer.assign(key, TX, chan)
+
+        return job
+
+    def _forget(self, key: JobKey) -> None:
+        """
+        Drop per-job bookkeeping of a stopped or exited job.
+        """
+        if self.placer is not None:
+            self.placer.release(key)
+        if self.procstats is not None:
+            self.procstats.untrack(key)
+        if self.watchdog is not None:
+            self.watchdog.untrack(key)
+        if self.speed_monitor is not None:
+            self.speed_monitor.forget(key)
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS("Starting transcoder enforcer..."))
 
+        self.placer = None
+        if options["nic_placement"]:
+            self.placer = NicPlacer()
+            self.stdout.write(
+                f"NIC placement enabled across: {', '.join(self.placer.nics) or '(none configured)'}"
+            )
+
+        self.channel_prefix = options["channel_prefix"]
+        self.profiler = TickProfiler(
+            slow_threshold=options["slow_tick"] or None,
+            cprofile=options["profile_slow_ticks"],
+            dump_path=metrics_path() if settings.TRANSCODER_ENFORCER_METRICS else None,
+        )
+        self.procstats = ProcSampler() if PROCSTATS_AVAILABLE else None
+        self._procstats_due = 0.0
+        # job_key -> what the live status view shows about it
+        self.job_meta: Dict[JobKey, dict] = {}
+        # channel id -> Channel of the jobs started, refreshed when the row changes
+        self.channels: Dict[int, Channel] = {}
+
+        popen = subprocess.Popen
+        self.job_logs = None
+        if options["job_stderr"] == "capture":
+            self.job_logs = JobLogHub()
+            popen = functools.partial(
+                subprocess.Popen,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,  # -progress
+                stderr=subprocess.PIPE,
+            )
+        self.watchdog = None
+        if options["stall_seconds"] > 0:
+            self.watchdog = OutputWatchdog(options["stall_seconds"], job_logs=self.job_logs)
+        # CPU transcodes that fall behind are restarted one preset faster;
+        # job key -> presets faster than planned.
+        self.faster_presets: Dict[JobKey, int] = {}
+        self.speed_monitor = None
+        if self.job_logs is not None and settings.TRANSCODER_CPU_MIN_SPEED:
+            self.speed_monitor = SpeedMonitor(
+                self.job_logs, settings.TRANSCODER_CPU_MIN_SPEED, settings.TRANSCODER_CPU_SPEED_WINDOW
+            )
+        self.pipeline = StartPipeline(
+            workers=options["start_workers"],
+            spawn_limit=options["spawn_concurrency"],
+            popen=popen,
+        )
+
         # job_key -> subprocess.Popen
         running: Dict[JobKey, subprocess.Popen] = {}
+        self.running = running
+        # Jobs stopped through the control socket stay down until started
+        # again or until their schedule ends; draining keeps everything down.
+        self.held = set()
+        self.draining = False
+
+        self.control = None
+        if not options["no_control"] and hasattr(socket, "AF_UNIX"):
+            self.control = ControlServer()
+            try:
+                self.control.start()
+            except (ControlError, OSError) as exc:
+                self.stdout.write(self.style.ERROR(f"Control socket disabled: {exc}"))
+                self.control = None
+            else:
+                self.stdout.write(f"Control socket: {self.control.path}")
 
         try:
             while True:
-                now = timezone.localtime()
-
-                # ============================
-                # 1) Collect ACTIVE one-off schedules
-                # ============================
-                active_oneoff = list(
-                    Schedule.objects.filter(
-                        enabled=True,
-                        start_at__lte=now,
-                        end_at__gt=now,
-                    ).select_related("channel")
+                self.tick(running)
+                self._idle(self.POLL_INTERVAL)
+
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Enforcer stopping (Ctrl+C)..."))
+            for key, proc in running.items():
+                if proc.poll() is None:
+                    kind, ident = key
+                    self.stdout.write(
+                        self.style.WARNING(
+                            f"Terminating ffmpeg for {kind}={ident}..."
+                        )
+                    )
+                    proc.terminate()
+            self.pipeline.shutdown()
+            if self.procstats is not None:
+                self.procstats.close()
+            if self.job_logs is not None:
+                self.job_logs.close()
+            if self.control is not None:
+                self.control.close()
+            self.stdout.write(self.style.SUCCESS("Enforcer stopped."))
+
+    # ------------------------
+    # Control socket
+    # ------------------------
+
+    def _idle(self, seconds: float) -> None:
+        """
+        Sleep until the next poll, serving control requests as they arrive.
+        """
+        if self.control is None:
+            time.sleep(seconds)
+            return
+        deadline = time.monotonic() + seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if self.control.wake.wait(remaining):
+                self.control.wake.clear()
+                self.control.handle_pending(self._control_command)
+
+    def _stop_gracefully(self, keys: Iterable[JobKey], grace: float) -> Dict[str, int]:
+        """
+        SIGTERM the jobs (ffmpeg then finalises its outputs), wait up to
+        `grace` seconds for all of them, and kill what is left.
+        """
+        procs = [self.running[k] for k in keys if k in self.running]
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()
+        deadline = time.monotonic() + grace
+        while time.monotonic() < deadline and any(p.poll() is None for p in procs):
+            time.sleep(0.05)
+        killed = 0
+        for proc in procs:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+                killed += 1
+        return {"stopped": len(procs) - killed, "killed": killed}
+
+    def _job_info(self, key: JobKey) -> dict:
+        proc = self.running.get(key)
+        return dict(
+            self.job_meta.get(key, {}),
+            key=f"{key[0]}:{key[1]}",
+            alive=proc is not None and proc.poll() is None,
+            held=key in self.held,
+        )
+
+    def _control_command(self, command: str, args: Dict[str, Any]) -> dict:
+        grace = float(args.get("grace", settings.TRANSCODER_STOP_GRACE_SECONDS))
+
+        if command == "list":
+            keys = sorted(set(self.running) | set(self.job_meta) | self.held)
+            return {"draining": self.draining, "jobs": [self._job_info(k) for k in keys]}
+
+        if command == "reconcile":
+            self.tick(self.running)
+            return {"running": len(self.running)}
+
+        if command in ("restart", "stop", "start"):
+            key = parse_job_key(args.get("job", ""))
+            if command == "start":
+                self.held.discard(key)
+                self.tick(self.running)
+                return {"job": self._job_info(key)}
+            if key not in self.running:
+                raise ControlError(f"Job {key[0]}:{key[1]} is not running.")
+            result = self._stop_gracefully([key], grace)
+            if command == "restart":
+                self.running.pop(key)
+                self._forget(key)
+            else:
+                self.held.add(key)
+            self.stdout.write(self.style.WARNING(f"Control: {command} {key[0]}:{key[1]}"))
+            self.tick(self.running)
+            return dict(result, job=self._job_info(key))
+
+        if command == "drain":
+            self.draining = True
+            self.stdout.write(self.style.WARNING(f"Control: draining (grace {grace:.0f}s)..."))
+            result = self._stop_gracefully(list(self.running), grace)
+            self.tick(self.running)
+            return result
+
+        if command == "resume":
+            self.draining = False
+            self.stdout.write(self.style.WARNING("Control: resuming"))
+            self.tick(self.running)
+            return {"running": len(self.running)}
+
+        raise ControlError(f"Unknown command {command!r}.")
+
+    def tick(self, running: Dict[JobKey, subprocess.Popen], now: Optional[datetime] = None) -> None:
+        """
+        One reconcile pass: start desired jobs that are not running, stop jobs
+        that are no longer desired and reap exited processes. `running` is
+        updated in place.
+        """
+        with self.profiler.tick():
+            self._reconcile(running, now or timezone.localtime())
+            self.profiler.gauge("jobs_running", len(running))
+            if self.procstats is not None and time.monotonic() >= self._procstats_due:
+                self._procstats_due = time.monotonic() + settings.TRANSCODER_PROC_SAMPLE_INTERVAL
+                with self.profiler.phase("proc_sample"):
+                    self._sample_resources()
+
+    def _sample_resources(self) -> None:
+        """
+        One /proc pass over all running jobs; the current view goes to the
+        state dir for the admin, closed history buckets to the database.
+        """
+        self.procstats.sample()
+        self.procstats.flush_history()
+        write_json_atomic(procstats_path(), {
+            "updated_at": timezone.now().isoformat(),
+            "jobs": {
+                f"{kind}:{ident}": summary
+                for (kind, ident), summary in self.procstats.job_summary().items()
+            },
+            "channels": self.procstats.channel_summary(),
+        })
+
+    def _observe_bitrates(self) -> None:
+        """
+        Hand the -progress output bitrate of running live and recording jobs
+        to the NIC placer, so channels are placed by what they really carry
+        rather than by their configured video_bitrate. Playout is left out:
+        its bitrate is the sum of all of the channel's delays.
+        """
+        if self.job_logs is None:
+            return
+        logs = self.job_logs.jobs
+        for key, meta in self.job_meta.items():
+            log = logs.get(key)
+            if log is None or meta["state"] != "running" or meta["purpose"] == "playback":
+                continue
+            kbps = progress_kbps(log.progress)
+            if kbps:
+                self.placer.observe_channel_bitrate(meta["channel_id"], kbps)
+
+    def _write_status(self) -> None:
+        """
+        Snapshot of every known job for the live status view.
+        """
+        logs = self.job_logs.jobs if self.job_logs is not None else {}
+        usage = self.procstats.current if self.procstats is not None else {}
+        write_json_atomic(status_path(), {
+            "updated_at": timezone.now().isoformat(),
+            "jobs": {
+                f"{kind}:{ident}": job_status_entry(
+                    meta, logs.get((kind, ident)), usage.get((kind, ident))
                 )
+                for (kind, ident), meta in self.job_meta.items()
+            },
+        })
 
-                # Build a list of desired jobs
-                desired_jobs: Dict[JobKey, Tuple[str, str, str]] = {}
-                # value = (channel_name, purpose, schedule_name)
+    def _stalled_jobs(self, running: Dict[JobKey, subprocess.Popen], desired_keys) -> List[JobKey]:
+        """
+        Live jobs whose output probe has not advanced within the stall
+        deadline; they are restarted in the same tick.
+        """
+        stalled = [
+            stall for stall in self.watchdog.check()
+            if stall.key in desired_keys and stall.key in running and running[stall.key].poll() is None
+        ]
+        idle = [self.watchdog.idle(key) for key in running]
+        self.profiler.gauge("output_idle_max_seconds", max((i for i in idle if i is not None), default=0.0))
+        for stall in stalled:
+            kind, ident = stall.key
+            self.stdout.write(
+                self.style.ERROR(
+                    f"Job for {kind}={ident} stalled: no {stall.probe} progress for "
+                    f"{stall.idle:.0f}s, restarting"
+                )
+            )
+            self.profiler.count("jobs_stalled")
+            self.profiler.count(f"stalls.{stall.probe}")
+        return [stall.key for stall in stalled]
 
-                for sched in active_oneoff:
-                    key: JobKey = ("oneoff", sched.id)
-                    desired_jobs[key] = (
-                        sched.channel.name,
-                        sched.purpose,
-                        sched.name,
-                    )
+    def _slow_jobs(self, running: Dict[JobKey, subprocess.Popen], desired_keys) -> List[JobKey]:
+        """
+        CPU transcodes that encoded slower than real time over the speed
+        window; they are restarted in the same tick, one preset faster.
+        """
+        cpu_jobs = [
+            key for key in running
+            if key in desired_keys and "preset" in self.job_meta.get(key, {}) and running[key].poll() is None
+        ]
+        restart = []
+        for key, speed in self.speed_monitor.too_slow(cpu_jobs).items():
+            kind, ident = key
+            meta = self.job_meta[key]
+            if meta["fastest_preset"]:
+                self.profiler.count("slow_at_fastest_preset")
+                self.stdout.write(self.style.ERROR(
+                    f"Job for {kind}={ident} encodes at {speed:.2f}x with preset "
+                    f"{meta['preset']}, nothing faster left: host overloaded"
+                ))
+                continue
+            self.stdout.write(self.style.WARNING(
+                f"Job for {kind}={ident} encodes at {speed:.2f}x with preset "
+                f"{meta['preset']}, restarting one preset faster"
+            ))
+            self.profiler.count("preset_fallbacks")
+            self.faster_presets[key] = self.faster_presets.get(key, 0) + 1
+            restart.append(key)
+        return restart
+
+    def _load_snapshot(self, now: datetime) -> Snapshot:
+        """
+        Enabled schedules as plain values for the reconcile core: one query
+        per schedule table, no model instances. One-off schedules are limited
+        to those that can be open within the pre-roll window.
+        """
+        channel_fields = (
+            "channel_id", "channel__name", "channel__preroll_seconds", "channel__recording_aligned",
+            "channel__video_mode", "channel__hardware_preference", "channel__video_codec",
+            "channel__updated_at",
+        )
+        channels: Dict[int, ChannelSnap] = {}
 
-                # ============================
-                # 2) Collect ACTIVE recurring schedules
-                # ============================
-                active_recurring = list(
-                    RecurringSchedule.objects.filter(
-                        enabled=True,
-                    ).select_related("channel")
+        def channel(values) -> ChannelSnap:
+            snap = channels.get(values[0])
+            if snap is None:
+                ident, name, preroll, aligned, video_mode, hw, codec, updated_at = values
+                snap = channels[ident] = ChannelSnap(
+                    ident, name, preroll, aligned, cpu_encoder_for(video_mode, hw, codec) is not None, updated_at
                 )
+            return snap
 
-                for rs in active_recurring:
-                    if not rs.is_active_now(now):
-                        continue
+        oneoff_qs = Schedule.objects.filter(
+            enabled=True,
+            start_at__lte=now + timedelta(seconds=settings.TRANSCODER_MAX_PREROLL_SECONDS),
+            end_at__gt=now,
+        )
+        recurring_qs = RecurringSchedule.objects.filter(enabled=True)
+        if self.channel_prefix:
+            oneoff_qs = oneoff_qs.filter(channel__name__startswith=self.channel_prefix)
+            recurring_qs = recurring_qs.filter(channel__name__startswith=self.channel_prefix)
 
-                    key: JobKey = ("recurring", rs.id)
-                    desired_jobs[key] = (
-                        rs.channel.name,
-                        rs.purpose,
-                        rs.name,
-                    )
+        n = len(channel_fields)
+        oneoff = [
+            OneOffSnap(row[n], channel(row[:n]), row[n + 1], row[n + 2],
+                       timezone.localtime(row[n + 3]), row[n + 4], row[n + 5])
+            for row in oneoff_qs.values_list(
+                *channel_fields, "id", "name", "purpose", "start_at", "end_at", "preroll_seconds"
+            )
+        ]
+        recurring = [
+            RecurringSnap(row[n], channel(row[:n]), row[n + 1], row[n + 2], row[n + 3:n + 10],
+                          *row[n + 10:])
+            for row in recurring_qs.values_list(
+                *channel_fields, "id", "name", "purpose",
+                "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+                "start_time", "end_time", "date_from", "date_to", "preroll_seconds",
+            )
+        ]
+        return Snapshot(oneoff, recurring)
 
-                desired_keys = set(desired_jobs.keys())
+    def _channels(self, snaps: Iterable[ChannelSnap]) -> Dict[int, Channel]:
+        """
+        Channel instances for jobs about to start or recordings to prepare,
+        kept between ticks and loaded again only when the row changed.
+        """
+        stale = [
+            snap.id for snap in snaps
+            if snap.id not in self.channels or self.channels[snap.id].updated_at != snap.updated_at
+        ]
+        if stale:
+            self.channels.update(Channel.objects.in_bulk(stale))
+        return self.channels
 
-                # ============================
-                # 3) Start jobs that should be running but are not
-                # ============================
-                for key in desired_keys:
-                    if key in running:
-                        continue  # already running
+    def _reconcile(self, running: Dict[JobKey, subprocess.Popen], now: datetime) -> None:
+        phase = self.profiler.phase
+        if self.placer is not None:
+            with phase("nic_sample"):
+                self.placer.sample()
+                self._observe_bitrates()
 
-                    kind, ident = key
+        # ============================
+        # 1) Load the schedules that can be active
+        # ============================
+        with phase("snapshot"):
+            snapshot = self._load_snapshot(now)
+        for ident in self.channels.keys() - snapshot.channels.keys():
+            del self.channels[ident]
 
-                    if kind == "oneoff":
-                        sched = next(s for s in active_oneoff if s.id == ident)
-                        chan = sched.channel
-                        purpose = sched.purpose
-                        name = sched.name
-                    else:
-                        rs = next(s for s in active_recurring if s.id == ident)
-                        chan = rs.channel
-                        purpose = rs.purpose
-                        name = rs.name
+        # ============================
+        # 2) Work out the jobs that should run now (including pre-roll)
+        # ============================
+        with phase("desired"):
+            desired = desired_jobs(snapshot, now, settings.TRANSCODER_MAX_PREROLL_SECONDS)
 
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f"Starting job: {kind}={ident} name={name!r} "
-                            f"channel={chan.name!r} purpose={purpose}"
-                        )
-                    )
+        desired_keys = set(desired)
+        # Manual holds end with their schedule; draining wants nothing running.
+        self.held &= desired_keys
+        if self.draining:
+            desired_keys = set()
+        else:
+            desired_keys -= self.held
 
-                    job = FFmpegJobConfig(channel=chan, purpose=purpose)
-                    cmd_list = job.build_command()
-                    proc = subprocess.Popen(cmd_list)
-                    running[key] = proc
-
-                # ============================
-                # 4) Stop jobs that should no longer be running
-                # ============================
-                for key, proc in list(running.items()):
-                    if key not in desired_keys:
-                        kind, ident = key
-                        self.stdout.write(
-                            self.style.WARNING(
-                                f"Stopping job for {kind}={ident} (no longer active)..."
-                            )
-                        )
-                        if proc.poll() is None:
-                            proc.terminate()
-                        running.pop(key, None)
-
-                # ============================
-                # 5) Cleanup finished processes
-                # ============================
-                for key, proc in list(running.items()):
-                    if proc.poll() is not None:
-                        kind, ident = key
-                        self.stdout.write(
-                            self.style.WARNING(
-                                f"Job for {kind}={ident} exited (return code {proc.returncode})"
-                            )
-                        )
-                        running.pop(key, None)
+        # Aligned recordings need the next day's folder before midnight.
+        recording_channels = {
+            job.channel for job in desired.values() if job.purpose == "record" and job.channel.recording_aligned
+        }
+        with phase("ensure_dirs"):
+            channels = self._channels(recording_channels)
+            for snap in recording_channels:
+                if snap.id in channels:
+                    ensure_recording_dirs(channels[snap.id])
 
-                time.sleep(self.POLL_INTERVAL)
+        # ============================
+        # 3) Restart jobs that are alive but whose output stopped advancing
+        # ============================
+        restart = []
+        if self.watchdog is not None:
+            with phase("watchdog"):
+                restart += self._stalled_jobs(running, desired_keys)
+        if self.speed_monitor is not None:
+            with phase("speed"):
+                restart += self._slow_jobs(running, desired_keys)
 
-        except KeyboardInterrupt:
-            self.stdout.write(self.style.WARNING("Enforcer stopping (Ctrl+C)..."))
-            for key, proc in running.items():
-                if proc.poll() is None:
-                    kind, ident = key
+        with phase("plan"):
+            actions = plan_actions(
+                {key: desired[key] for key in desired_keys},
+                {key: proc.poll() is None for key, proc in running.items()},
+                restart,
+            )
+        if actions.restart:
+            self._stop_gracefully(actions.restart, settings.TRANSCODER_STOP_GRACE_SECONDS)
+            for key in actions.restart:
+                running.pop(key, None)
+                self._forget(key)
+
+        # ============================
+        # 4) Start jobs that should be running but are not
+        # ============================
+        requests = []
+        # CPU transcodes split the host's cores between them.
+        n_cpu = max(1, cpu_transcodes(desired, desired_keys))
+        with phase("lookup"):
+            channels = self._channels({desired[key].channel for key in actions.start})
+        for key in actions.start:
+            kind, ident = key
+            want = desired[key]
+            chan = channels.get(want.channel.id)
+            if chan is None:
+                continue  # deleted since the snapshot
+
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Starting job: {kind}={ident} name={want.schedule!r} "
+                    f"channel={chan.name!r} purpose={want.purpose}"
+                )
+            )
+
+            with phase("placement"):
+                job = self._place_job(key, chan, want.purpose)
+            job.progress = self.job_logs is not None
+            job.start_boundary = want.boundary
+            job.cpu_transcodes = n_cpu
+            job.faster_presets = self.faster_presets.get(key, 0)
+            requests.append(StartRequest(key=key, job=job, boundary=want.boundary))
+
+        if requests:
+            with phase("start"):
+                results = self.pipeline.start_many(requests)
+            for res in results:
+                kind, ident = res.request.key
+                if res.cmd is not None:
+                    self.profiler.observe("job.build_command", res.build_seconds)
+                if res.error is not None:
+                    self.profiler.count("start_failures")
                     self.stdout.write(
-                        self.style.WARNING(
-                            f"Terminating ffmpeg for {kind}={ident}..."
+                        self.style.ERROR(
+                            f"Failed to start job for {kind}={ident}: {res.error}"
                         )
                     )
+                    if self.placer is not None:
+                        self.placer.release(res.request.key)
+                    continue
+                self.profiler.observe("job.popen", res.spawn_seconds)
+                self.profiler.count("jobs_started")
+                running[res.request.key] = res.proc
+                if self.procstats is not None:
+                    self.procstats.track(res.request.key, res.proc.pid, res.request.job.channel.id)
+                if self.watchdog is not None:
+                    self.watchdog.track(res.request.key, res.request.job)
+                if self.job_logs is not None and res.proc.stderr is not None:
+                    self.job_logs.attach(
+                        res.request.key,
+                        res.request.job.channel.name,
+                        res.proc.stderr,
+                        progress=res.proc.stdout,
+                    )
+                job = res.request.job
+                self.job_meta[res.request.key] = {
+                    "channel_id": job.channel.id,
+                    "channel": job.channel.name,
+                    "purpose": job.purpose,
+                    "schedule": desired[res.request.key].schedule,
+                    "pid": res.proc.pid,
+                    "started_at": res.started_at.isoformat(),
+                    "state": "running",
+                    "stalls": self.watchdog.stalls[res.request.key] if self.watchdog is not None else 0,
+                }
+                if job.cpu_plan is not None:
+                    self.job_meta[res.request.key].update(
+                        preset=job.cpu_plan.preset,
+                        threads=job.cpu_plan.threads,
+                        fastest_preset=job.cpu_plan.fastest,
+                    )
+
+            # Boundaries crossed since the previous tick (plus the
+            # configured jitter) count as lag; older ones are catch-ups.
+            since = now - timedelta(
+                seconds=self.POLL_INTERVAL + max(self.pipeline.jitter.values(), default=0)
+            )
+            for boundary, (count, worst) in sorted(
+                worst_lag_by_boundary(results, since).items()
+            ):
+                self.stdout.write(
+                    f"Boundary {boundary:%Y-%m-%d %H:%M:%S}: started {count} job(s), "
+                    f"worst start lag {worst:.2f}s (negative = early via pre-roll)"
+                )
+
+        # ============================
+        # 5) Stop jobs that should no longer be running
+        # ============================
+        for key in actions.stop:
+            kind, ident = key
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Stopping job for {kind}={ident} (no longer active)..."
+                )
+            )
+            proc = running.pop(key)
+            with phase("stop"):
+                if proc.poll() is None:
                     proc.terminate()
-            self.stdout.write(self.style.SUCCESS("Enforcer stopped."))
+            self.profiler.count("jobs_stopped")
+            self._forget(key)
+
+        # ============================
+        # 6) Cleanup finished processes
+        # ============================
+        # Jobs that exited before this tick; they start again on the next one.
+        for key in actions.reap:
+            kind, ident = key
+            proc = running.pop(key)
+            last_line = self.job_logs.last_line(key) if self.job_logs is not None else ""
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Job for {kind}={ident} exited (return code {proc.returncode})"
+                    + (f": {last_line}" if last_line else "")
+                )
+            )
+            self.profiler.count("jobs_exited")
+            if key in self.job_meta:
+                self.job_meta[key].update(state="exited", returncode=proc.returncode)
+            self._forget(key)
+
+        # Output and status of exited jobs stay visible until their schedule ends.
+        for key in list(self.job_meta):
+            if key not in desired_keys:
+                del self.job_meta[key]
+        if self.watchdog is not None:
+            for key in list(self.watchdog.stalls):
+                if key not in desired_keys:
+                    self.watchdog.forget(key)
+        for key in list(self.faster_presets):
+            if key not in desired_keys:
+                del self.faster_presets[key]
+        with phase("status"):
+            self._write_status()
+
+        if self.job_logs is not None:
+            for key in list(self.job_logs.jobs):
+                if key not in desired_keys:
+                    self.job_logs.forget(key)
+            if self.job_logs.dirty:
+                with phase("job_logs"):
+                    write_json_atomic(logs_snapshot_path(), {
+                        "updated_at": timezone.now().isoformat(),
+                        "jobs": self.job_logs.snapshot(),
+                    })
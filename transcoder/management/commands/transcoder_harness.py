@@ -0,0 +1,495 @@
+import json
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transcoder.models import Channel, Schedule
+
+# The source burns its frame number into the picture as BITS black/white
+# blocks along the top edge. Decoding that strip at the receiver gives the
+# exact source frame, so latency and gaps can be measured for copy and
+# transcode alike, with nothing but ffmpeg.
+BITS = 20
+BLOCK = 32
+WIDTH, HEIGHT, FPS = BITS * BLOCK, 360, 25
+
+MODES = {
+    # name: (video_mode, output_type, purpose)
+    "copy-udp": ("copy", "udp_ts", "live_forward"),
+    "transcode-udp": ("transcode", "udp_ts", "live_forward"),
+    "copy-hls": ("copy", "hls", "live_forward"),
+    "transcode-hls": ("transcode", "hls", "live_forward"),
+    "record": ("copy", "file_ts", "record"),
+}
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _source_filter(drawtext: bool) -> str:
+    chain = [f"testsrc=size={WIDTH}x{HEIGHT}:rate={FPS}"]
+    chain.append(f"drawbox=x=0:y=0:w={WIDTH}:h={BLOCK}:color=black:t=fill")
+    for bit in range(BITS):
+        chain.append(
+            f"drawbox=x={bit * BLOCK}:y=0:w={BLOCK}:h={BLOCK}:color=white:t=fill"
+            f":enable='mod(floor(n/{2 ** bit}),2)'"
+        )
+    if drawtext:
+        # Human-readable burned-in wall clock for eyeballing outputs in a player.
+        chain.append(
+            r"drawtext=text='%{localtime\:%T}':x=10:y=h-50:fontsize=36"
+            r":fontcolor=white:box=1:boxcolor=black"
+        )
+    return ",".join(chain)
+
+
+def _decode_cmd(url: str) -> List[str]:
+    # Average each block down to one grey pixel: BITS bytes per frame.
+    return [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-fflags", "nobuffer", "-flags", "low_delay",
+        "-i", url,
+        "-map", "0:v:0",
+        "-vf", f"crop={WIDTH}:{BLOCK}:0:0,scale={BITS}:1:flags=area",
+        "-pix_fmt", "gray", "-f", "rawvideo", "pipe:1",
+    ]
+
+
+def _frame_index(strip: bytes) -> int:
+    return sum(1 << bit for bit, value in enumerate(strip[:BITS]) if value > 127)
+
+
+def _decode_file_indices(path: Path) -> List[int]:
+    out = subprocess.run(_decode_cmd(str(path)), capture_output=True, check=False).stdout
+    return [_frame_index(out[i:i + BITS]) for i in range(0, len(out) - BITS + 1, BITS)]
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+@dataclass
+class HarnessChannel:
+    index: int
+    mode: str
+    channel: Channel
+    source_port: int
+    tap_port: int
+    output_port: int
+    output_dir: Optional[Path] = None
+    source_proc: Optional[subprocess.Popen] = None
+    receiver_proc: Optional[subprocess.Popen] = None
+    t_source0: Optional[float] = None  # wall time source frame 0 was emitted
+    first_frame_at: Optional[float] = None
+    latencies: List[float] = field(default_factory=list)
+    job_pids: set = field(default_factory=set)
+    spawned_at: Optional[float] = None
+    cpu_ticks: Dict[int, Tuple[float, int]] = field(default_factory=dict)
+    cpu_seconds: float = 0.0
+    rss_samples: List[int] = field(default_factory=list)
+
+    def emitted_at(self, frame: int) -> Optional[float]:
+        if self.t_source0 is None:
+            return None
+        return self.t_source0 + frame / FPS
+
+
+class Command(BaseCommand):
+    help = (
+        "End-to-end harness: N synthetic lavfi channels over loopback UDP, run through the "
+        "real enforcer; measures time-to-first-output, latency, CPU/RSS per job and "
+        "recording gaps, and compares modes (copy vs transcode, HLS vs UDP)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--channels", type=int, default=2, help="Channels per mode.")
+        parser.add_argument("--duration", type=int, default=30, help="Seconds per mode.")
+        parser.add_argument(
+            "--modes",
+            default=",".join(MODES),
+            help=f"Comma-separated modes out of: {', '.join(MODES)}.",
+        )
+        parser.add_argument(
+            "--multicast",
+            action="store_true",
+            help=(
+                "Feed sources over loopback multicast (239.255.42.x) instead of unicast; "
+                "needs a multicast route on lo (ip route add 239.0.0.0/8 dev lo)."
+            ),
+        )
+        parser.add_argument(
+            "--preroll",
+            type=int,
+            default=0,
+            help="Channel pre-roll (seconds) for the record mode's back-to-back schedules.",
+        )
+        parser.add_argument("--base-port", type=int, default=40000)
+        parser.add_argument("--output", help="Write the JSON report here.")
+        parser.add_argument("--keep", action="store_true", help="Keep the work directory.")
+
+    # ------------------------
+    # Entry point
+    # ------------------------
+
+    def handle(self, *args, **options):
+        if not shutil.which("ffmpeg"):
+            raise CommandError("ffmpeg not found on PATH.")
+        if not sys.platform.startswith("linux"):
+            raise CommandError("The harness reads /proc and needs Linux.")
+
+        modes = [m for m in options["modes"].split(",") if m]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown mode(s): {', '.join(sorted(unknown))}")
+
+        self.drawtext = b"drawtext" in subprocess.run(
+            ["ffmpeg", "-hide_banner", "-filters"], capture_output=True
+        ).stdout
+        self.options = options
+        run_id = timezone.now().strftime("%H%M%S")
+        workdir = Path(tempfile.mkdtemp(prefix="tx-harness-"))
+
+        results = []
+        try:
+            port = options["base_port"]
+            for mode in modes:
+                prefix = f"harness-{run_id}-{mode}-"
+                self.stdout.write(self.style.WARNING(f"== {mode} =="))
+                results.append(self._run_mode(mode, prefix, workdir / mode, port))
+                port += options["channels"] * 3
+        finally:
+            Channel.objects.filter(name__startswith=f"harness-{run_id}-").delete()
+            if not options["keep"]:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "channels_per_mode": options["channels"],
+            "duration": options["duration"],
+            "modes": results,
+        }
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2) + "\n")
+        self._print_table(results)
+
+    # ------------------------
+    # One mode
+    # ------------------------
+
+    def _source_url(self, hc: HarnessChannel) -> str:
+        if self.options["multicast"]:
+            return f"udp://239.255.42.{hc.index + 1}:{hc.source_port}"
+        return f"udp://127.0.0.1:{hc.source_port}"
+
+    def _create_channels(self, mode: str, prefix: str, workdir: Path, port: int):
+        video_mode, output_type, purpose = MODES[mode]
+        hcs = []
+        for i in range(self.options["channels"]):
+            source_port, tap_port, output_port = port + 3 * i, port + 3 * i + 1, port + 3 * i + 2
+            output_dir = workdir / f"out{i}"
+            if output_type == "udp_ts":
+                output_target = f"udp://127.0.0.1:{output_port}?pkt_size=1316"
+            elif output_type == "hls":
+                output_target = str(output_dir)
+            else:
+                output_target = str(output_dir / "unused.ts")
+            hc = HarnessChannel(
+                index=i, mode=mode, channel=None,
+                source_port=source_port, tap_port=tap_port, output_port=output_port,
+                output_dir=output_dir,
+            )
+            input_url = self._source_url(hc).replace("udp://", "udp://@")
+            if self.options["multicast"]:
+                input_url += "?localaddr=127.0.0.1"
+            hc.channel = Channel.objects.create(
+                name=f"{prefix}{i}",
+                input_type="udp_multicast",
+                input_url=input_url,
+                output_type=output_type,
+                output_target=output_target,
+                video_mode=video_mode,
+                video_codec="libx264",
+                recording_path_template=str(workdir / "rec" / "{channel}") + "/",
+                recording_segment_seconds=5,
+                recording_aligned=True,
+                preroll_seconds=self.options["preroll"],
+            )
+            hcs.append(hc)
+        return hcs
+
+    def _create_schedules(self, hcs: List[HarnessChannel], purpose: str, duration: int):
+        boundary = timezone.now()
+        end = boundary + timedelta(seconds=duration)
+        switch_at = None
+        for hc in hcs:
+            if purpose == "record":
+                # Two back-to-back schedules: measures the gap (or overlap) at the switch.
+                switch_at = boundary + timedelta(seconds=duration // 2)
+                Schedule.objects.create(
+                    name="harness A", channel=hc.channel, purpose=purpose,
+                    start_at=boundary, end_at=switch_at,
+                )
+                Schedule.objects.create(
+                    name="harness B", channel=hc.channel, purpose=purpose,
+                    start_at=switch_at, end_at=end,
+                )
+            else:
+                Schedule.objects.create(
+                    name="harness", channel=hc.channel, purpose=purpose,
+                    start_at=boundary, end_at=end,
+                )
+        return boundary.timestamp(), switch_at.timestamp() if switch_at else None
+
+    def _start_source(self, hc: HarnessChannel) -> None:
+        tap = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        tap.bind(("127.0.0.1", hc.tap_port))
+        tap.settimeout(10)
+
+        out = self._source_url(hc)
+        if self.options["multicast"]:
+            out += "?localaddr=127.0.0.1&ttl=0"
+        sep = "&" if "?" in out else "?"
+        tee = (
+            f"[f=mpegts]{out}{sep}pkt_size=1316|"
+            f"[f=mpegts]udp://127.0.0.1:{hc.tap_port}?pkt_size=1316"
+        )
+        hc.source_proc = subprocess.Popen([
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-re",
+            "-f", "lavfi", "-i", _source_filter(self.drawtext),
+            "-f", "lavfi", "-i", "sine=frequency=1000:sample_rate=48000",
+            "-map", "0:v", "-map", "1:a",
+            "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency",
+            "-g", str(FPS), "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", "96k",
+            "-f", "tee", tee,
+        ])
+
+        def wait_first_packet():
+            try:
+                tap.recv(2048)
+                hc.t_source0 = time.time()  # frame 0 is in the first packet
+            except socket.timeout:
+                pass
+            finally:
+                tap.close()
+
+        threading.Thread(target=wait_first_packet, daemon=True).start()
+
+    def _receive(self, hc: HarnessChannel, stop: threading.Event) -> None:
+        if hc.channel.output_type == "udp_ts":
+            url = f"udp://@127.0.0.1:{hc.output_port}?fifo_size=1000000&overrun_nonfatal=1"
+        else:
+            playlist = hc.output_dir / "index.m3u8"
+            while not playlist.exists() and not stop.is_set():
+                time.sleep(0.05)
+            if stop.is_set():
+                return
+            url = str(playlist)
+
+        cmd = _decode_cmd(url)
+        if hc.channel.output_type == "hls":
+            cmd[cmd.index("-i"):cmd.index("-i")] = ["-live_start_index", "-1"]
+        proc = hc.receiver_proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=0)
+        try:
+            while not stop.is_set():
+                strip = proc.stdout.read(BITS)
+                if len(strip) < BITS:
+                    break
+                now = time.time()
+                if hc.first_frame_at is None:
+                    hc.first_frame_at = now
+                emitted = hc.emitted_at(_frame_index(strip))
+                if emitted is not None:
+                    hc.latencies.append(now - emitted)
+        finally:
+            proc.kill()
+            proc.wait()
+
+    def _sample_jobs(self, hcs: List[HarnessChannel], stop: threading.Event) -> None:
+        """
+        Find each channel's ffmpeg job in /proc (its input URL is unique) and
+        accumulate CPU time and RSS.
+        """
+        while not stop.is_set():
+            for pid_dir in Path("/proc").iterdir():
+                if not pid_dir.name.isdigit():
+                    continue
+                try:
+                    cmdline = (pid_dir / "cmdline").read_bytes().replace(b"\0", b" ")
+                    if b"ffmpeg" not in cmdline or b"lavfi" in cmdline or b"rawvideo" in cmdline:
+                        continue
+                    for hc in hcs:
+                        if f"@{self._source_url(hc)[6:]}?".encode() in cmdline:
+                            pid = int(pid_dir.name)
+                            if pid not in hc.job_pids:
+                                hc.job_pids.add(pid)
+                                hc.spawned_at = hc.spawned_at or time.time()
+                            stat = (pid_dir / "stat").read_text().rsplit(")", 1)[1].split()
+                            ticks = int(stat[11]) + int(stat[12])  # utime + stime
+                            prev = hc.cpu_ticks.get(pid, (time.time(), ticks))[1]
+                            hc.cpu_seconds += (ticks - prev) / CLK_TCK
+                            hc.cpu_ticks[pid] = (time.time(), ticks)
+                            rss_pages = int((pid_dir / "statm").read_text().split()[1])
+                            hc.rss_samples.append(rss_pages * PAGE_SIZE)
+                except (OSError, ValueError, IndexError):
+                    continue
+            stop.wait(0.5)
+
+    def _run_mode(self, mode: str, prefix: str, workdir: Path, port: int) -> dict:
+        workdir.mkdir(parents=True, exist_ok=True)
+        duration = self.options["duration"]
+        _, _, purpose = MODES[mode]
+        hcs = self._create_channels(mode, prefix, workdir, port)
+
+        for hc in hcs:
+            self._start_source(hc)
+        time.sleep(1.0)
+
+        stop = threading.Event()
+        threads = []
+        if purpose == "live_forward":
+            threads += [
+                threading.Thread(target=self._receive, args=(hc, stop), daemon=True)
+                for hc in hcs
+            ]
+        threads.append(threading.Thread(target=self._sample_jobs, args=(hcs, stop), daemon=True))
+        for t in threads:
+            t.start()
+
+        boundary, switch_at = self._create_schedules(hcs, purpose, duration)
+        enforcer_log = open(workdir / "enforcer.log", "w")
+        enforcer = subprocess.Popen(
+            [sys.executable, str(Path(settings.BASE_DIR) / "manage.py"),
+             "transcoder_enforcer", "--channel-prefix", prefix],
+            stdout=enforcer_log, stderr=subprocess.STDOUT,
+        )
+        try:
+            time.sleep(duration + 2)
+        finally:
+            enforcer.send_signal(signal.SIGINT)
+            try:
+                enforcer.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                enforcer.kill()
+            enforcer_log.close()
+            stop.set()
+            for hc in hcs:
+                hc.source_proc.terminate()
+                hc.source_proc.wait()
+                # The receive thread blocks in read(); killing its ffmpeg unblocks it.
+                if hc.receiver_proc is not None:
+                    hc.receiver_proc.kill()
+            for t in threads:
+                t.join(timeout=5)
+
+        return self._summarise(mode, hcs, boundary, switch_at, workdir)
+
+    # ------------------------
+    # Results
+    # ------------------------
+
+    def _recording_gaps(self, hc: HarnessChannel, switch_at: Optional[float], workdir: Path) -> dict:
+        segments = sorted((workdir / "rec" / hc.channel.name).rglob("*.ts"))
+        frames = set()
+        for seg in segments:
+            frames.update(_decode_file_indices(seg))
+        if not frames:
+            return {"segments": len(segments), "gaps": []}
+
+        # Segments overlap where back-to-back jobs both recorded; the union of
+        # decoded frame numbers is the coverage.
+        ordered = sorted(frames)
+        switch_frame = None
+        if switch_at is not None and hc.t_source0 is not None:
+            switch_frame = int((switch_at - hc.t_source0) * FPS)
+        gaps = []
+        for prev, cur in zip(ordered, ordered[1:]):
+            if cur - prev > 1:
+                at_switch = switch_frame is not None and prev - FPS * 10 <= switch_frame <= cur + FPS * 10
+                gaps.append({
+                    "missing_ms": (cur - prev - 1) * 1000 / FPS,
+                    "where": "schedule_boundary" if at_switch else "segment_boundary",
+                })
+        return {"segments": len(segments), "gaps": gaps}
+
+    def _summarise(self, mode, hcs, boundary, switch_at, workdir) -> dict:
+        per_channel = []
+        for hc in hcs:
+            entry = {
+                "channel": hc.channel.name,
+                "ttfo_from_boundary": (hc.first_frame_at - boundary) if hc.first_frame_at else None,
+                "ttfo_from_spawn": (
+                    hc.first_frame_at - hc.spawned_at
+                    if hc.first_frame_at and hc.spawned_at else None
+                ),
+                "latency_p50": _percentile(hc.latencies, 50),
+                "latency_p95": _percentile(hc.latencies, 95),
+                "cpu_seconds": hc.cpu_seconds,
+                "rss_max_mb": max(hc.rss_samples, default=0) / 2 ** 20,
+                "job_processes": len(hc.job_pids),
+            }
+            if MODES[mode][2] == "record":
+                entry.update(self._recording_gaps(hc, switch_at, workdir))
+            per_channel.append(entry)
+
+        def agg(key, fn=statistics.median):
+            values = [c[key] for c in per_channel if c.get(key) is not None]
+            return fn(values) if values else None
+
+        gaps = [g for c in per_channel for g in c.get("gaps", [])]
+        return {
+            "mode": mode,
+            "ttfo_from_boundary": agg("ttfo_from_boundary"),
+            "ttfo_from_spawn": agg("ttfo_from_spawn"),
+            "latency_p50": agg("latency_p50"),
+            "latency_p95": agg("latency_p95", max),
+            "cpu_percent_per_job": (
+                agg("cpu_seconds", statistics.mean) / self.options["duration"] * 100
+                if agg("cpu_seconds") is not None else None
+            ),
+            "rss_mb_per_job": agg("rss_max_mb", statistics.mean),
+            "gap_ms_schedule_boundary": sum(
+                g["missing_ms"] for g in gaps if g["where"] == "schedule_boundary"
+            ),
+            "gap_ms_segment_boundary": sum(
+                g["missing_ms"] for g in gaps if g["where"] == "segment_boundary"
+            ),
+            "channels": per_channel,
+        }
+
+    def _print_table(self, results: List[dict]) -> None:
+        def fmt(value, unit=""):
+            return "-" if value is None else f"{value:.2f}{unit}"
+
+        header = (
+            f"{'mode':<15}{'TTFO(bnd)':>11}{'TTFO(spawn)':>13}{'lat p50':>10}{'lat p95':>10}"
+            f"{'CPU/job':>10}{'RSS/job':>10}{'gap@sched':>11}{'gap@seg':>10}"
+        )
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for r in results:
+            self.stdout.write(
+                f"{r['mode']:<15}{fmt(r['ttfo_from_boundary'], 's'):>11}"
+                f"{fmt(r['ttfo_from_spawn'], 's'):>13}"
+                f"{fmt(r['latency_p50'], 's'):>10}{fmt(r['latency_p95'], 's'):>10}"
+                f"{fmt(r['cpu_percent_per_job'], '%'):>10}{fmt(r['rss_mb_per_job'], 'M'):>10}"
+                f"{r['gap_ms_schedule_boundary']:>9.0f}ms{r['gap_ms_segment_boundary']:>8.0f}ms"
+            )
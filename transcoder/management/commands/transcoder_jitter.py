@@ -0,0 +1,199 @@
+# transcoder/management/commands/transcoder_jitter.py
+import json
+import shutil
+import socket
+import statistics
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transcoder.ffmpeg_runner import FFmpegJobConfig
+from transcoder.models import Channel
+from transcoder.mpegts import PACKET
+
+NULL_PID = 0x1FFF
+BURST_GAP = 0.0005  # datagrams closer than this arrived back to back
+WINDOW = 0.01  # seconds per window of the peak rate
+WARMUP = 2.0  # seconds after the first datagram that are not measured
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def _null_packets(datagram: bytes) -> int:
+    return sum(
+        1 for i in range(0, len(datagram) - PACKET + 1, PACKET)
+        if ((datagram[i + 1] & 0x1F) << 8 | datagram[i + 2]) == NULL_PID
+    )
+
+
+def measure(arrivals: List[Tuple[float, int, int]]) -> dict:
+    """
+    Pacing of received datagrams, given as (arrival time, bytes, null
+    packets): inter-arrival gaps, the longest run of back-to-back datagrams
+    and the peak rate over WINDOW relative to the mean.
+    """
+    if len(arrivals) < 2:
+        return {"datagrams": len(arrivals)}
+    times = [t for t, _, _ in arrivals]
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    total = sum(n for _, n, _ in arrivals)
+    seconds = times[-1] - times[0]
+
+    burst = longest = 1
+    for gap in gaps:
+        burst = burst + 1 if gap < BURST_GAP else 1
+        longest = max(longest, burst)
+
+    windows = {}
+    for t, n, _ in arrivals:
+        key = int((t - times[0]) / WINDOW)
+        windows[key] = windows.get(key, 0) + n
+    mean_window = total / max(1, int(seconds / WINDOW) + 1)
+
+    packets = total // PACKET
+    return {
+        "datagrams": len(arrivals),
+        "kbps": round(total * 8 / seconds / 1000, 1) if seconds else None,
+        "gap_mean_ms": round(statistics.fmean(gaps) * 1000, 3),
+        "jitter_ms": round(statistics.pstdev(gaps) * 1000, 3),  # standard deviation of the gaps
+        "gap_p99_ms": round(_percentile(gaps, 99) * 1000, 3),
+        "gap_max_ms": round(max(gaps) * 1000, 3),
+        "longest_burst": longest,
+        "peak_to_mean": round(max(windows.values()) / mean_window, 2) if mean_window else None,
+        "null_percent": round(100 * sum(n for _, _, n in arrivals) / packets, 1) if packets else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Loopback test of udp_ts pacing: a synthetic bursty source is forwarded by the "
+        "job command the enforcer would run, once as variable bitrate and once with a "
+        "udp_muxrate, and the datagrams received are timed: inter-packet jitter, burst "
+        "size, peak rate and null-packet padding, before and after."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--duration", type=int, default=20, help="Seconds measured per mode.")
+        parser.add_argument(
+            "--muxrate", default="3000k",
+            help="udp_muxrate of the CBR run (default 3000k, above the source's peak).",
+        )
+        parser.add_argument(
+            "--source-bitrate", default="2000k",
+            help="Video bitrate of the synthetic source (1 s VBV, so I-frames are large).",
+        )
+        parser.add_argument("--gop", type=int, default=50, help="Source keyframe interval in frames.")
+        parser.add_argument("--base-port", type=int, default=41000)
+        parser.add_argument("--output", help="Write the JSON report here.")
+
+    def handle(self, *args, **options):
+        if not shutil.which("ffmpeg"):
+            raise CommandError("ffmpeg not found on PATH.")
+        results = []
+        port = options["base_port"]
+        for mode, muxrate in (("vbr", ""), ("cbr", options["muxrate"])):
+            self.stdout.write(self.style.WARNING(f"== {mode} {muxrate} =="))
+            result = {"mode": mode, "muxrate": muxrate}
+            result.update(self._run(options, muxrate, port, port + 1))
+            results.append(result)
+            port += 2
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps({"modes": results}, indent=2) + "\n")
+        self._print_table(results)
+
+    def _source_cmd(self, options, port: int) -> List[str]:
+        return [
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin", "-re",
+            "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=25",
+            "-f", "lavfi", "-i", "sine=frequency=1000:sample_rate=48000",
+            "-c:v", "libx264", "-preset", "ultrafast", "-g", str(options["gop"]), "-pix_fmt", "yuv420p",
+            "-b:v", options["source_bitrate"], "-maxrate", options["source_bitrate"],
+            "-bufsize", options["source_bitrate"],
+            "-c:a", "aac", "-b:a", "96k",
+            "-f", "mpegts", f"udp://127.0.0.1:{port}?pkt_size=1316",
+        ]
+
+    def _run(self, options, muxrate: str, source_port: int, output_port: int) -> dict:
+        # Not saved: only its job command is needed.
+        chan = Channel(
+            name=f"jitter-{output_port}",
+            input_type="udp_multicast",
+            input_url=f"udp://@127.0.0.1:{source_port}",
+            output_type="udp_ts",
+            output_target=f"udp://127.0.0.1:{output_port}?pkt_size=1316",
+            udp_muxrate=muxrate,
+        )
+        job_cmd = FFmpegJobConfig(channel=chan, purpose="live_forward").build_command()
+        self.stdout.write(" ".join(job_cmd))
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        sock.bind(("127.0.0.1", output_port))
+        sock.settimeout(0.5)
+        arrivals: List[Tuple[float, int, int]] = []
+        stop = threading.Event()
+
+        def receive():
+            while not stop.is_set():
+                try:
+                    data = sock.recv(65536)
+                except socket.timeout:
+                    continue
+                arrivals.append((time.perf_counter(), len(data), _null_packets(data)))
+
+        receiver = threading.Thread(target=receive, daemon=True)
+        receiver.start()
+        job = subprocess.Popen(job_cmd, stdin=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        time.sleep(0.5)  # listening before the source starts
+        source = subprocess.Popen(self._source_cmd(options, source_port), stdin=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + options["duration"] + WARMUP + 5
+            while time.monotonic() < deadline:
+                if job.poll() is not None or source.poll() is not None:
+                    break
+                if arrivals and arrivals[-1][0] - arrivals[0][0] >= options["duration"] + WARMUP:
+                    break
+                time.sleep(0.2)
+        finally:
+            for proc in (source, job):
+                proc.terminate()
+                try:
+                    proc.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+            stop.set()
+            receiver.join()
+            sock.close()
+
+        if not arrivals:
+            raise CommandError(f"Nothing received on port {output_port} (job exited with {job.returncode}).")
+        start = arrivals[0][0] + WARMUP
+        return measure([a for a in arrivals if a[0] >= start])
+
+    def _print_table(self, results: List[dict]) -> None:
+        columns = [
+            ("mode", "mode"), ("kbps", "kbit/s"), ("jitter_ms", "jitter ms"), ("gap_p99_ms", "p99 gap"),
+            ("gap_max_ms", "max gap"), ("longest_burst", "burst"), ("peak_to_mean", "peak/mean"),
+            ("null_percent", "null %"),
+        ]
+        self.stdout.write("")
+        self.stdout.write("  ".join(f"{title:>10}" for _, title in columns))
+        for result in results:
+            self.stdout.write("  ".join(f"{str(result.get(key, '-')):>10}" for key, _ in columns))
+        if len(results) == 2 and results[0].get("jitter_ms") and results[1].get("jitter_ms"):
+            before, after = results
+            self.stdout.write(self.style.SUCCESS(
+                f"CBR: jitter {before['jitter_ms']} -> {after['jitter_ms']} ms, "
+                f"longest burst {before['longest_burst']} -> {after['longest_burst']} datagrams, "
+                f"peak/mean over {WINDOW * 1000:.0f} ms {before['peak_to_mean']} -> {after['peak_to_mean']}"
+            ))
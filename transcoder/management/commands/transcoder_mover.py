@@ -0,0 +1,65 @@
+# transcoder/management/commands/transcoder_mover.py
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.template.defaultfilters import filesizeformat
+
+from transcoder.staging import closed_staged_segments, move_segments, staging_root
+
+
+class Command(BaseCommand):
+    help = (
+        "Move closed segments of staged recordings (Channel.recording_staged) from "
+        "TRANSCODER_RECORDING_STAGING_DIR to their final recording folders, in large "
+        "sequential, throttled copies. Run one per host."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Move what is closed now and exit.")
+        parser.add_argument(
+            "--interval", type=float, default=settings.TRANSCODER_MOVER_INTERVAL,
+            help="Seconds between staging scans.",
+        )
+        parser.add_argument(
+            "--bwlimit", type=float,
+            help="MB/s to copy at most (default TRANSCODER_MOVER_BANDWIDTH_MB, 0 = unlimited).",
+        )
+
+    def handle(self, *args, **options):
+        root = staging_root()
+        if root is None:
+            raise CommandError("TRANSCODER_RECORDING_STAGING_DIR is not set.")
+        self.stdout.write(f"Staging: {root}")
+        try:
+            while True:
+                close_old_connections()
+                self._pass(root, options["bwlimit"])
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Mover stopped."))
+
+    def _pass(self, root, bwlimit) -> None:
+        closed = closed_staged_segments()
+        if not closed:
+            return
+        result = move_segments([path for _, path in closed], bwlimit)
+        rate = result.bytes / result.seconds if result.seconds else 0
+        style = self.style.WARNING if result.failed else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Moved {result.moved} segment(s), {filesizeformat(result.bytes)} in "
+            f"{result.seconds:.1f}s ({filesizeformat(rate)}/s), {result.failed} failed"
+        ))
+        try:
+            st = os.statvfs(root)
+        except OSError:
+            return
+        if st.f_blocks and st.f_bavail / st.f_blocks < 0.1:
+            self.stdout.write(self.style.ERROR(
+                f"Staging is {100 - st.f_bavail * 100 // st.f_blocks}% full: "
+                f"the mover is not keeping up or the array is stalled."
+            ))
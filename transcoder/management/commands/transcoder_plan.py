@@ -0,0 +1,92 @@
+# transcoder/management/commands/transcoder_plan.py
+import json
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transcoder.planner import plan_capacity
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate the schedules over a horizon (default one week) and report "
+        "per-minute peaks of concurrent jobs, CPU and NIC bandwidth, periods "
+        "above capacity, and schedules that would start duplicate jobs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=float, help="Horizon length (default TRANSCODER_PLANNER_HORIZON_DAYS).")
+        parser.add_argument("--start", help="Local start time, e.g. 2026-11-02T00:00 (default: now).")
+        parser.add_argument("--channel-prefix", default="", help="Only schedules of channels with this name prefix.")
+        parser.add_argument("--top", type=int, default=20, help="How many overloads/duplicates to list.")
+        parser.add_argument("--json", action="store_true", help="Print peaks, overloads and duplicates as JSON.")
+
+    def handle(self, *args, **options):
+        start = None
+        if options["start"]:
+            try:
+                start = datetime.fromisoformat(options["start"])
+            except ValueError as exc:
+                raise CommandError(f"--start: {exc}")
+            if timezone.is_naive(start):
+                start = timezone.make_aware(start)
+
+        started = time.perf_counter()
+        plan = plan_capacity(start, options["days"], options["channel_prefix"])
+        elapsed = time.perf_counter() - started
+
+        if options["json"]:
+            self.stdout.write(json.dumps({
+                "origin": plan.origin.isoformat(),
+                "minutes": plan.minutes,
+                "windows": len(plan.windows),
+                "seconds": round(elapsed, 3),
+                "capacity": plan.capacity,
+                "peaks": {k: {"value": v, "at": plan.at(m).isoformat()} for k, (v, m) in plan.peaks().items()},
+                "overloads": [
+                    {"resource": o.resource, "start": plan.at(o.start).isoformat(),
+                     "end": plan.at(o.end).isoformat(), "peak": o.peak, "capacity": o.capacity}
+                    for o in plan.overloads
+                ],
+                "duplicates": [
+                    {"channel": a.channel, "purpose": a.purpose, "jobs": [list(a.key), list(b.key)],
+                     "schedules": [a.schedule, b.schedule], "from": plan.at(max(a.start, b.start)).isoformat()}
+                    for a, b in plan.duplicates
+                ],
+                "inputs": plan.inputs,
+            }, indent=2))
+            return
+
+        self.stdout.write(
+            f"{len(plan.windows)} job windows from {plan.origin:%Y-%m-%d %H:%M} over "
+            f"{plan.minutes / 1440:g} day(s), simulated in {elapsed:.2f}s"
+        )
+        for name, (value, minute) in plan.peaks().items():
+            capacity = plan.capacity.get(name)
+            unit = "" if name == "jobs" else ("%" if name == "cpu" else " kbit/s")
+            limit = f" of {capacity:.0f}{unit}" if capacity else ""
+            line = f"  peak {name:<24}{value:>10.0f}{unit}{limit} at {plan.at(minute):%a %Y-%m-%d %H:%M}"
+            self.stdout.write(self.style.WARNING(line) if capacity and value > capacity else line)
+
+        shared = {url: e for url, e in plan.inputs.items() if e["peak_readers"] > 1}
+        if shared:
+            self.stdout.write(f"{len(shared)} multicast input(s) read by more than one job at once")
+
+        if plan.overloads:
+            self.stdout.write(self.style.ERROR(f"{len(plan.overloads)} period(s) over capacity:"))
+            for o in plan.overloads[: options["top"]]:
+                self.stdout.write(
+                    f"  {o.resource:<24}{plan.at(o.start):%a %Y-%m-%d %H:%M} - {plan.at(o.end):%a %Y-%m-%d %H:%M}  "
+                    f"peak {o.peak:.0f} / {o.capacity:.0f}"
+                )
+        if plan.duplicates:
+            self.stdout.write(self.style.ERROR(f"{len(plan.duplicates)} pair(s) of schedules start duplicate jobs:"))
+            for a, b in plan.duplicates[: options["top"]]:
+                self.stdout.write(
+                    f"  {a.channel} {a.purpose}: {a.schedule!r} ({a.key[0]}:{a.key[1]}) and "
+                    f"{b.schedule!r} ({b.key[0]}:{b.key[1]}) from {plan.at(max(a.start, b.start)):%a %Y-%m-%d %H:%M}"
+                )
+        if not plan.overloads and not plan.duplicates:
+            self.stdout.write(self.style.SUCCESS("No capacity problems or duplicate jobs found."))
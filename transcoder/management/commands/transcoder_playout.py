@@ -0,0 +1,66 @@
+# transcoder/management/commands/transcoder_playout.py
+import logging
+import signal
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transcoder.models import Channel
+from transcoder.playout import PlayoutEngine
+
+
+class Command(BaseCommand):
+    help = (
+        "Play a channel's recording out to all of its enabled time-shift profiles "
+        "(one UDP output per delay) from a single shared reader. Started by the "
+        "enforcer for playback schedules."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("channel", help="Channel name.")
+        parser.add_argument("--interface", help="NIC for multicast outputs (default: the channel's).")
+        parser.add_argument("--window-mb", type=int, help="Shared read window (default TRANSCODER_PLAYOUT_WINDOW_MB).")
+        parser.add_argument(
+            "--progress",
+            action="store_true",
+            help="Write key=value progress blocks to stdout every second, like ffmpeg -progress.",
+        )
+
+    def handle(self, *args, **options):
+        # stderr is the job log when the enforcer runs us.
+        logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(levelname)s %(message)s")
+        try:
+            chan = Channel.objects.get(name=options["channel"])
+        except Channel.DoesNotExist:
+            raise CommandError(f"Unknown channel {options['channel']!r}.")
+
+        window = options["window_mb"] * 1024 * 1024 if options["window_mb"] else None
+        engine = PlayoutEngine(chan, output_interface=options["interface"], window_bytes=window)
+        signal.signal(signal.SIGTERM, lambda *_: engine.stop())
+
+        last = {"packets_sent": 0}
+
+        def progress(stats: dict) -> None:
+            kbps = (stats["packets_sent"] - last["packets_sent"]) * 188 * 8 / 1000
+            last.update(stats)
+            self.stdout.write(
+                f"bitrate={kbps:.1f}kbits/s\n"
+                f"total_size={stats['packets_sent'] * 188}\n"
+                f"outputs={stats['outputs']}\n"
+                f"read_bytes={stats['bytes_read']}\n"
+                f"window_hit_ratio={stats['window_hit_ratio']:.2f}\n"
+                f"resyncs={stats['resyncs']}\n"
+                f"gaps={stats['gaps']}\n"
+                "progress=continue"
+            )
+            self.stdout.flush()
+
+        try:
+            engine.run(on_tick=progress if options["progress"] else None)
+        except KeyboardInterrupt:
+            pass
+        stats = engine.stats()
+        self.stderr.write(
+            f"Playout of {chan.name} stopped: {stats['packets_sent'] * 188} bytes sent, "
+            f"{stats['bytes_read']} read, window hit ratio {stats['window_hit_ratio']:.2f}"
+        )
@@ -0,0 +1,43 @@
+# transcoder/management/commands/transcoder_previews.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from transcoder.previews import PreviewService, preview_root
+
+
+class Command(BaseCommand):
+    help = (
+        "Grab thumbnails of live channels and build sprite sheets of recorded segments "
+        "for the admin overview: a fixed amount of keyframe-only work per pass on a "
+        "small low-priority ffmpeg pool. Run one per host."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run one pass and exit.")
+        parser.add_argument(
+            "--interval", type=float, default=settings.TRANSCODER_PREVIEW_PASS_SECONDS,
+            help="Seconds between the starts of passes.",
+        )
+        parser.add_argument("--workers", type=int, help="Concurrent ffmpegs (default TRANSCODER_PREVIEW_WORKERS).")
+
+    def handle(self, *args, **options):
+        service = PreviewService(options["workers"])
+        self.stdout.write(f"Previews: {preview_root()}, {service.workers} worker(s)")
+        try:
+            while True:
+                close_old_connections()
+                result = service.run_pass()
+                if result.thumbnails or result.sprites or result.failed or result.evicted:
+                    style = self.style.WARNING if result.failed else self.style.SUCCESS
+                    self.stdout.write(style(
+                        f"{result.thumbnails} thumbnail(s), {result.sprites} sprite(s), "
+                        f"{result.failed} failed, {result.evicted} evicted in {result.seconds:.1f}s"
+                    ))
+                if options["once"]:
+                    return
+                time.sleep(max(0.0, options["interval"] - result.seconds))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Previews stopped."))
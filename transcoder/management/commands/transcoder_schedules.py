@@ -0,0 +1,116 @@
+# transcoder/management/commands/transcoder_schedules.py
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transcoder.bulk_io import (
+    KIND_ORDER,
+    KINDS,
+    BulkImportError,
+    apply_import,
+    export_csv,
+    export_json,
+    parse_csv,
+    parse_json,
+    plan_import,
+)
+from transcoder.models import Channel
+
+
+class Command(BaseCommand):
+    help = (
+        "Export or import channels, schedules, recurring schedules and time-shift "
+        "profiles as JSON (everything) or CSV (one kind per file). Imports are "
+        "validated in full and written in one transaction; --dry-run shows the diff."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["export", "import"])
+        parser.add_argument(
+            "path",
+            nargs="?",
+            help="File to import from / export to (default: stdout for export).",
+        )
+        parser.add_argument("--format", choices=["json", "csv"], help="Default: from the file extension, else json.")
+        parser.add_argument("--kind", choices=list(KINDS), help="What a CSV file contains.")
+        parser.add_argument("--channel-prefix", default="", help="Export only channels with this name prefix.")
+        parser.add_argument("--dry-run", action="store_true", help="Validate and show the diff, write nothing.")
+        parser.add_argument(
+            "--allow-overlaps",
+            action="store_true",
+            help="Report overlapping schedules of the same channel and purpose as warnings instead of errors.",
+        )
+        parser.add_argument("--verbose-diff", action="store_true", help="List every created/updated row.")
+
+    def handle(self, *args, **options):
+        fmt = options["format"]
+        if not fmt:
+            fmt = "csv" if (options["path"] or "").endswith(".csv") else "json"
+        if fmt == "csv" and not options["kind"]:
+            raise CommandError("CSV needs --kind (one of: %s)." % ", ".join(KINDS))
+
+        if options["action"] == "export":
+            self._export(fmt, options)
+        else:
+            self._import(fmt, options)
+
+    def _export(self, fmt, options):
+        channels = Channel.objects.filter(name__startswith=options["channel_prefix"])
+        if fmt == "json":
+            text = export_json(channels)
+        else:
+            model = KINDS[options["kind"]][0]
+            qs = channels if model is Channel else model.objects.filter(channel__in=channels)
+            text = export_csv(options["kind"], qs)
+        if options["path"]:
+            Path(options["path"]).write_text(text)
+            self.stdout.write(self.style.SUCCESS(f"Exported to {options['path']}"))
+        else:
+            self.stdout.write(text, ending="")
+
+    def _import(self, fmt, options):
+        if not options["path"]:
+            raise CommandError("import needs a file path ('-' for stdin).")
+        text = sys.stdin.read() if options["path"] == "-" else Path(options["path"]).read_text()
+
+        started = time.perf_counter()
+        try:
+            data = parse_json(text) if fmt == "json" else parse_csv(text, options["kind"])
+            plan = plan_import(data, allow_overlaps=options["allow_overlaps"])
+        except ValueError as exc:
+            raise CommandError(f"Cannot parse {options['path']}: {exc}")
+        except BulkImportError as exc:
+            for message in exc.errors[:200]:
+                self.stderr.write(self.style.ERROR(message))
+            if len(exc.errors) > 200:
+                self.stderr.write(self.style.ERROR(f"... and {len(exc.errors) - 200} more"))
+            raise CommandError(f"Import rejected with {len(exc.errors)} error(s); nothing was written.")
+
+        for message in plan.warnings:
+            self.stdout.write(self.style.WARNING(message))
+        if options["verbose_diff"] or options["dry_run"]:
+            changes = plan.changes if options["verbose_diff"] else plan.changes[:50]
+            for change in changes:
+                self.stdout.write(change.describe())
+            if len(changes) < len(plan.changes):
+                self.stdout.write(f"... {len(plan.changes) - len(changes)} more (use --verbose-diff)")
+
+        if options["dry_run"]:
+            summary = plan.summary()
+        else:
+            summary = apply_import(plan)
+        elapsed = time.perf_counter() - started
+
+        for kind in KIND_ORDER:
+            counts = summary[kind]
+            if any(counts.values()):
+                self.stdout.write(
+                    f"{kind}: {counts['create']} to create, {counts['update']} to update, "
+                    f"{counts['unchanged']} unchanged"
+                )
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"Dry run, nothing written ({elapsed:.2f}s)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Import applied in {elapsed:.2f}s."))
@@ -0,0 +1,38 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from transcoder.segment_watcher import SegmentWatcher, log_consumer, register_consumer
+
+
+class Command(BaseCommand):
+    help = (
+        "Watch recording folders and publish segment-closed events to the consumers "
+        "in settings.TRANSCODER_SEGMENT_CONSUMERS (inotify, or polling as a fallback)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll",
+            action="store_true",
+            help="Force the polling fallback (e.g. for NFS/SMB recording storage).",
+        )
+
+    def handle(self, *args, **options):
+        if options["verbosity"] >= 2:
+            logging.basicConfig(level=logging.INFO)
+            register_consumer(log_consumer)
+
+        watcher = SegmentWatcher(use_inotify=False if options["poll"] else None)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Watching {len(watcher.source.roots.roots)} recording root(s) "
+                f"({watcher.mode}), {len(watcher.consumers)} consumer(s)..."
+            )
+        )
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Segment watcher stopping (Ctrl+C)..."))
+            watcher.stop()
+        self.stdout.write(self.style.SUCCESS("Segment watcher stopped."))
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcoder', '0007_alter_recurringschedule_purpose_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='preroll_seconds',
+            field=models.PositiveIntegerField(default=0, help_text='Start jobs this many seconds before the schedule boundary, so ffmpeg has probed its input and output is live exactly on time. Schedules can override this.'),
+        ),
+        migrations.AddField(
+            model_name='recurringschedule',
+            name='preroll_seconds',
+            field=models.PositiveIntegerField(blank=True, help_text="Optional: overrides the channel's pre-roll (seconds started before start time).", null=True),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='preroll_seconds',
+            field=models.PositiveIntegerField(blank=True, help_text="Optional: overrides the channel's pre-roll (seconds started before start_at).", null=True),
+        ),
+        migrations.AlterField(
+            model_name='timeshiftprofile',
+            name='output_udp_url',
+            field=models.CharField(help_text='UDP TS URL for delayed output, e.g. udp://239.0.0.10:2001?ttl=1&pkt_size=1316', max_length=512),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcoder', '0008_schedule_preroll'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='recording_aligned',
+            field=models.BooleanField(default=False, help_text='Cut segments on wall-clock boundaries (e.g. 12:00, 13:00), so the file for any instant can be computed without listing the folder. The path template may not use {time}.'),
+        ),
+        migrations.AddField(
+            model_name='channel',
+            name='recording_segment_seconds',
+            field=models.PositiveIntegerField(blank=True, help_text='Optional: segment length in seconds, overriding the minutes above (e.g. 10 for fast seeking in time-shift playback).', null=True),
+        ),
+    ]
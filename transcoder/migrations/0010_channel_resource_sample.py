@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 00:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcoder', '0009_channel_aligned_recording'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelResourceSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField(db_index=True)),
+                ('bucket_seconds', models.PositiveIntegerField()),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('cpu_percent_avg', models.FloatField(help_text='100 = one CPU core.')),
+                ('cpu_percent_max', models.FloatField()),
+                ('rss_bytes_max', models.BigIntegerField()),
+                ('read_bps_avg', models.FloatField(help_text='Storage reads, bytes/s.')),
+                ('write_bps_avg', models.FloatField(help_text='Storage writes, bytes/s.')),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resource_samples', to='transcoder.channel')),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+                'unique_together': {('channel', 'bucket_start')},
+            },
+        ),
+    ]
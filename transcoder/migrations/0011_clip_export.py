@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-19 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcoder', '0010_channel_resource_sample'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClipExport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_at', models.DateTimeField()),
+                ('end_at', models.DateTimeField()),
+                ('precise', models.BooleanField(default=False, help_text='Cut exactly at start/end by re-encoding. Off: stream copy from the keyframe at or before the start (fast, may begin up to one GOP early).')),
+                ('output_format', models.CharField(choices=[('ts', 'MPEG-TS'), ('mp4', 'MP4')], default='ts', max_length=8)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=16)),
+                ('output_path', models.CharField(blank=True, max_length=1024)),
+                ('size_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('segments', models.PositiveIntegerField(default=0, help_text='Recording segments read.')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clip_exports', to='transcoder.channel')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-19 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcoder', '0011_clip_export'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enabled', models.BooleanField(default=True)),
+                ('after_days', models.PositiveIntegerField(default=7, help_text='Re-encode segments this many days after they were closed.')),
+                ('video_codec', models.CharField(default='h264', help_text='E.g. h264, hevc.', max_length=16)),
+                ('video_bitrate', models.CharField(blank=True, default='1500k', help_text='E.g. 1500k. If blank, constant quality (CRF) is used.', max_length=16)),
+                ('crf', models.PositiveSmallIntegerField(default=26, help_text='Used when no bitrate is set.')),
+                ('preset', models.CharField(default='slow', help_text='Encoder preset.', max_length=16)),
+                ('max_height', models.PositiveIntegerField(blank=True, help_text='E.g. 720 to downscale; blank keeps the size.', null=True)),
+                ('audio_bitrate', models.CharField(default='96k', max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('channel', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archive_profile', to='transcoder.channel')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchiveJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=1024, unique=True)),
+                ('due_at', models.DateTimeField(help_text='Not processed before this time.')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('skipped', 'Skipped (no saving)'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('original_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('archived_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('encode_seconds', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_jobs', to='transcoder.channel')),
+            ],
+            options={
+                'ordering': ['due_at'],
+                'indexes': [models.Index(fields=['status', 'due_at'], name='transcoder__status_698a05_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-19 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcoder', '0012_archive_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeshiftprofile',
+            name='gap_mode',
+            field=models.CharField(choices=[('skip', 'No output until the recording resumes'), ('slate', 'Play a slate until the recording resumes')], default='skip', help_text='What to play when the delayed time falls into a hole in the recording (needs the continuity map, see transcoder_continuity).', max_length=8),
+        ),
+        migrations.CreateModel(
+            name='CoverageInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_at', models.DateTimeField()),
+                ('end_at', models.DateTimeField()),
+                ('segments', models.PositiveIntegerField(default=0)),
+                ('cc_errors', models.PositiveIntegerField(default=0)),
+                ('pcr_discontinuities', models.PositiveIntegerField(default=0)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coverage', to='transcoder.channel')),
+            ],
+            options={
+                'ordering': ['channel', 'start_at'],
+                'indexes': [models.Index(fields=['channel', 'start_at'], name='transcoder__channel_46e40b_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecordingSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=1024, unique=True)),
+                ('start_at', models.DateTimeField()),
+                ('end_at', models.DateTimeField()),
+                ('size_bytes', models.BigIntegerField(default=0)),
+                ('cc_errors', models.PositiveIntegerField(default=0)),
+                ('pcr_discontinuities', models.PositiveIntegerField(default=0)),
+                ('scanned_at', models.DateTimeField(auto_now_add=True)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recording_segments', to='transcoder.channel')),
+            ],
+            options={
+                'ordering': ['channel', 'start_at'],
+                'indexes': [models.Index(fields=['channel', 'start_at'], name='transcoder__channel_84684c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcoder', '0013_continuity_map'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='timeshiftprofile',
+            options={'ordering': ['channel', 'delay_minutes'], 'verbose_name': 'Time-shift profile', 'verbose_name_plural': 'Time-shift profiles'},
+        ),
+        migrations.AlterField(
+            model_name='timeshiftprofile',
+            name='channel',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeshift_profiles', to='transcoder.channel'),
+        ),
+        migrations.AlterField(
+            model_name='timeshiftprofile',
+            name='gap_mode',
+            field=models.CharField(choices=[('skip', 'No output until the recording resumes'), ('slate', 'Play a slate until the recording resumes')], default='skip', help_text='What to play when the delayed time falls into a hole in the recording.', max_length=8),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timeshiftprofile',
+            unique_together={('channel', 'delay_minutes')},
+        ),
+    ]
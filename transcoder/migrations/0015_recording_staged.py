@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcoder', '0014_timeshift_profiles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='recording_staged',
+            field=models.BooleanField(default=False, help_text='Write segments to TRANSCODER_RECORDING_STAGING_DIR (tmpfs/SSD) first; transcoder_mover moves them to the path above once closed.'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcoder', '0015_recording_staged'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='recording_format',
+            field=models.CharField(choices=[('ts', 'MPEG-TS (.ts)'), ('fmp4', 'Fragmented MP4 / CMAF (.mp4)')], default='ts', help_text='Fragmented MP4 segments carry a per-fragment index: HLS/DASH players can seek them by byte range without a remux, and they are smaller than TS.', max_length=8),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcoder', '0016_recording_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='udp_muxrate',
+            field=models.CharField(blank=True, help_text="UDP TS outputs only, e.g. 8000k: send at this constant bitrate, padded with null packets and paced evenly, instead of in bursts that follow the GOP. Must exceed the stream's peak bitrate. Blank = variable bitrate.", max_length=16),
+        ),
+    ]
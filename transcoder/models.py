@@ -2,6 +2,8 @@ from django.db import models
 from django.utils import timezone
 import datetime
 
+from .reconcile import recurring_active
+
 
 class InputType(models.TextChoices):
     MULTICAST_UDP = "udp_multicast", "UDP Multicast (MPEG-TS)"
@@ -18,6 +20,11 @@ class OutputType(models.TextChoices):
     FILE_MP4 = "file_mp4", "File (MP4)"
 
 
+class RecordingFormat(models.TextChoices):
+    TS = "ts", "MPEG-TS (.ts)"
+    FMP4 = "fmp4", "Fragmented MP4 / CMAF (.mp4)"
+
+
 class VideoMode(models.TextChoices):
     COPY = "copy", "Copy (no transcode)"
     TRANSCODE = "transcode", "Transcode"
@@ -36,6 +43,26 @@ class HardwarePreference(models.TextChoices):
     CPU = "cpu", "Force CPU"
 
 
+class ClipStatus(models.TextChoices):
+    QUEUED = "queued", "Queued"
+    RUNNING = "running", "Running"
+    DONE = "done", "Done"
+    FAILED = "failed", "Failed"
+
+
+class GapMode(models.TextChoices):
+    SKIP = "skip", "No output until the recording resumes"
+    SLATE = "slate", "Play a slate until the recording resumes"
+
+
+class ArchiveStatus(models.TextChoices):
+    QUEUED = "queued", "Queued"
+    RUNNING = "running", "Running"
+    DONE = "done", "Done"
+    SKIPPED = "skipped", "Skipped (no saving)"
+    FAILED = "failed", "Failed"
+
+
 class JobPurpose(models.TextChoices):
     LIVE_FORWARD = "live_forward", "Live forward"
     RECORD = "record", "Record"
@@ -72,6 +99,15 @@ class Channel(models.Model):
         max_length=512,
         help_text="For HLS: directory path; for RTMP/UDP: URL (udp://ip:port, rtmp://...).",
     )
+    udp_muxrate = models.CharField(
+        max_length=16,
+        blank=True,
+        help_text=(
+            "UDP TS outputs only, e.g. 8000k: send at this constant bitrate, padded with null "
+            "packets and paced evenly, instead of in bursts that follow the GOP. Must exceed "
+            "the stream's peak bitrate. Blank = variable bitrate."
+        ),
+    )
 
     # Recording settings
     record_enabled = models.BooleanField(
@@ -90,6 +126,48 @@ class Channel(models.Model):
         default=60,
         help_text="Length of each recording segment in minutes.",
     )
+    recording_segment_seconds = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text=(
+            "Optional: segment length in seconds, overriding the minutes above "
+            "(e.g. 10 for fast seeking in time-shift playback)."
+        ),
+    )
+    recording_aligned = models.BooleanField(
+        default=False,
+        help_text=(
+            "Cut segments on wall-clock boundaries (e.g. 12:00, 13:00), so the file for any "
+            "instant can be computed without listing the folder. "
+            "The path template may not use {time}."
+        ),
+    )
+    recording_staged = models.BooleanField(
+        default=False,
+        help_text=(
+            "Write segments to TRANSCODER_RECORDING_STAGING_DIR (tmpfs/SSD) first; "
+            "transcoder_mover moves them to the path above once closed."
+        ),
+    )
+    recording_format = models.CharField(
+        max_length=8,
+        choices=RecordingFormat.choices,
+        default=RecordingFormat.TS,
+        help_text=(
+            "Fragmented MP4 segments carry a per-fragment index: HLS/DASH players can "
+            "seek them by byte range without a remux, and they are smaller than TS."
+        ),
+    )
+
+    # Scheduling
+    preroll_seconds = models.PositiveIntegerField(
+        default=0,
+        help_text=(
+            "Start jobs this many seconds before the schedule boundary, so ffmpeg has "
+            "probed its input and output is live exactly on time. "
+            "Schedules can override this."
+        ),
+    )
 
     # Codec / processing – copy by default
     video_mode = models.CharField(
@@ -139,6 +217,20 @@ class Channel(models.Model):
     def __str__(self) -> str:
         return self.name
 
+    @property
+    def segment_seconds(self) -> int:
+        """
+        Effective recording segment length in seconds.
+        """
+        return self.recording_segment_seconds or self.recording_segment_minutes * 60
+
+    @property
+    def segment_suffix(self) -> str:
+        """
+        File extension of new recording segments.
+        """
+        return ".mp4" if self.recording_format == RecordingFormat.FMP4 else ".ts"
+
 
 class Schedule(models.Model):
     """
@@ -167,6 +259,11 @@ class Schedule(models.Model):
     end_at = models.DateTimeField(
         help_text="When this job should stop (server/local time)."
     )
+    preroll_seconds = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Optional: overrides the channel's pre-roll (seconds started before start_at).",
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -233,6 +330,11 @@ class RecurringSchedule(models.Model):
         blank=True,
         help_text="Optional: only apply up to this date (inclusive).",
     )
+    preroll_seconds = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Optional: overrides the channel's pre-roll (seconds started before start time).",
+    )
 
     # auto add & read-only (via admin): creation timestamp
     created_at = models.DateTimeField(auto_now_add=True)
@@ -279,40 +381,19 @@ class RecurringSchedule(models.Model):
         if not self.enabled:
             return False
 
-        local_date = now.date()
-        local_time = now.time()
-        weekday = now.weekday()  # Monday=0, Sunday=6
-
-        # Date range check
-        if self.date_from and local_date < self.date_from:
-            return False
-        if self.date_to and local_date > self.date_to:
-            return False
-
-        # Weekday check via booleans (note: weekday() is Mon=0..Sun=6)
-        weekday_flags = [
-            self.monday,  # 0
-            self.tuesday,  # 1
-            self.wednesday,  # 2
-            self.thursday,  # 3
-            self.friday,  # 4
-            self.saturday,  # 5
-            self.sunday,  # 6
-        ]
-        if not weekday_flags[weekday]:
-            return False
-
-        # Time window semantics
-        if self.start_time == self.end_time:
-            # Full-day: active 24 hours for the selected weekdays
-            return True
-
-        if self.start_time < self.end_time:
-            # Normal daytime window: e.g. 08:00 -> 20:00
-            return self.start_time <= local_time < self.end_time
-        else:
-            # Overnight window: e.g. 20:00 -> 06:00
-            return (local_time >= self.start_time) or (local_time < self.end_time)
+        # Monday first, like datetime.weekday()
+        weekday_flags = (
+            self.monday,
+            self.tuesday,
+            self.wednesday,
+            self.thursday,
+            self.friday,
+            self.saturday,
+            self.sunday,
+        )
+        return recurring_active(
+            self.start_time, self.end_time, weekday_flags, self.date_from, self.date_to, now
+        )
 
 
 class TimeShiftProfile(models.Model):
@@ -321,12 +402,13 @@ class TimeShiftProfile(models.Model):
     This defines:
       - how much delay (in minutes)
       - where to restream (udp_ts URL)
-    Playback logic will read this config.
+    A channel may have several (e.g. +1h, +3h, +6h); one playout process
+    per channel serves all enabled ones (see transcoder/playout.py).
     """
-    channel = models.OneToOneField(
+    channel = models.ForeignKey(
         Channel,
         on_delete=models.CASCADE,
-        related_name="timeshift_profile",
+        related_name="timeshift_profiles",
     )
     enabled = models.BooleanField(default=False)
 
@@ -339,6 +421,12 @@ class TimeShiftProfile(models.Model):
         max_length=512,
         help_text="UDP TS URL for delayed output, e.g. udp://239.0.0.10:2001?ttl=1&pkt_size=1316",
     )
+    gap_mode = models.CharField(
+        max_length=8,
+        choices=GapMode.choices,
+        default=GapMode.SKIP,
+        help_text="What to play when the delayed time falls into a hole in the recording.",
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -346,6 +434,208 @@ class TimeShiftProfile(models.Model):
     class Meta:
         verbose_name = "Time-shift profile"
         verbose_name_plural = "Time-shift profiles"
+        ordering = ["channel", "delay_minutes"]
+        unique_together = [("channel", "delay_minutes")]
 
     def __str__(self) -> str:
         return f"TimeShift({self.channel.name}, {self.delay_minutes} min)"
+
+
+class ChannelResourceSample(models.Model):
+    """
+    Down-sampled host cost of a channel's ffmpeg jobs (sum over its jobs),
+    one row per channel per bucket. Written by the enforcer's /proc sampler.
+    """
+    channel = models.ForeignKey(
+        Channel,
+        on_delete=models.CASCADE,
+        related_name="resource_samples",
+    )
+    bucket_start = models.DateTimeField(db_index=True)
+    bucket_seconds = models.PositiveIntegerField()
+    samples = models.PositiveIntegerField(default=0)
+
+    cpu_percent_avg = models.FloatField(help_text="100 = one CPU core.")
+    cpu_percent_max = models.FloatField()
+    rss_bytes_max = models.BigIntegerField()
+    read_bps_avg = models.FloatField(help_text="Storage reads, bytes/s.")
+    write_bps_avg = models.FloatField(help_text="Storage writes, bytes/s.")
+
+    class Meta:
+        ordering = ["-bucket_start"]
+        unique_together = [("channel", "bucket_start")]
+
+    def __str__(self) -> str:
+        return f"{self.channel.name} @ {self.bucket_start:%Y-%m-%d %H:%M}"
+
+
+class ClipExport(models.Model):
+    """
+    A clip cut from a channel's recordings, e.g. "channel X from 14:03 to
+    14:47". Queued here and processed by `transcoder_clips run`.
+    """
+    channel = models.ForeignKey(
+        Channel,
+        on_delete=models.CASCADE,
+        related_name="clip_exports",
+    )
+    start_at = models.DateTimeField()
+    end_at = models.DateTimeField()
+    precise = models.BooleanField(
+        default=False,
+        help_text=(
+            "Cut exactly at start/end by re-encoding. Off: stream copy from the "
+            "keyframe at or before the start (fast, may begin up to one GOP early)."
+        ),
+    )
+    output_format = models.CharField(
+        max_length=8,
+        choices=[("ts", "MPEG-TS"), ("mp4", "MP4")],
+        default="ts",
+    )
+
+    status = models.CharField(
+        max_length=16,
+        choices=ClipStatus.choices,
+        default=ClipStatus.QUEUED,
+        db_index=True,
+    )
+    output_path = models.CharField(max_length=1024, blank=True)
+    size_bytes = models.BigIntegerField(null=True, blank=True)
+    segments = models.PositiveIntegerField(default=0, help_text="Recording segments read.")
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self) -> str:
+        return f"{self.channel.name} {self.start_at:%Y-%m-%d %H:%M}-{self.end_at:%H:%M}"
+
+
+class ArchiveProfile(models.Model):
+    """
+    How a channel's recordings are shrunk once they age: segments older
+    than `after_days` are re-encoded in place by `transcoder_archive run`.
+    """
+    channel = models.OneToOneField(
+        Channel,
+        on_delete=models.CASCADE,
+        related_name="archive_profile",
+    )
+    enabled = models.BooleanField(default=True)
+    after_days = models.PositiveIntegerField(
+        default=7,
+        help_text="Re-encode segments this many days after they were closed.",
+    )
+
+    video_codec = models.CharField(max_length=16, default="h264", help_text="E.g. h264, hevc.")
+    video_bitrate = models.CharField(
+        max_length=16,
+        blank=True,
+        default="1500k",
+        help_text="E.g. 1500k. If blank, constant quality (CRF) is used.",
+    )
+    crf = models.PositiveSmallIntegerField(default=26, help_text="Used when no bitrate is set.")
+    preset = models.CharField(max_length=16, default="slow", help_text="Encoder preset.")
+    max_height = models.PositiveIntegerField(
+        null=True, blank=True, help_text="E.g. 720 to downscale; blank keeps the size."
+    )
+    audio_bitrate = models.CharField(max_length=16, default="96k")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"Archive profile for {self.channel.name}"
+
+
+class ArchiveJob(models.Model):
+    """
+    One recording segment to re-encode with its channel's ArchiveProfile.
+    The table is the queue: rows survive restarts, `path` is unique so a
+    segment is queued once however often it is reported.
+    """
+    channel = models.ForeignKey(
+        Channel,
+        on_delete=models.CASCADE,
+        related_name="archive_jobs",
+    )
+    path = models.CharField(max_length=1024, unique=True)
+    due_at = models.DateTimeField(help_text="Not processed before this time.")
+    status = models.CharField(
+        max_length=16,
+        choices=ArchiveStatus.choices,
+        default=ArchiveStatus.QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    original_bytes = models.BigIntegerField(null=True, blank=True)
+    archived_bytes = models.BigIntegerField(null=True, blank=True)
+    encode_seconds = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["due_at"]
+        indexes = [models.Index(fields=["status", "due_at"])]
+
+    def __str__(self) -> str:
+        return self.path
+
+
+class RecordingSegment(models.Model):
+    """
+    One closed recording segment as seen by the continuity scan: the span it
+    covers and how damaged its transport stream is.
+    """
+    channel = models.ForeignKey(
+        Channel,
+        on_delete=models.CASCADE,
+        related_name="recording_segments",
+    )
+    path = models.CharField(max_length=1024, unique=True)
+    start_at = models.DateTimeField()
+    end_at = models.DateTimeField()
+    size_bytes = models.BigIntegerField(default=0)
+    cc_errors = models.PositiveIntegerField(default=0)
+    pcr_discontinuities = models.PositiveIntegerField(default=0)
+    scanned_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["channel", "start_at"]
+        indexes = [models.Index(fields=["channel", "start_at"])]
+
+    def __str__(self) -> str:
+        return self.path
+
+
+class CoverageInterval(models.Model):
+    """
+    Continuity map: a maximal stretch of time a channel was recorded without
+    a gap, merged from its RecordingSegments as they close. Error counts are
+    totals over the stretch.
+    """
+    channel = models.ForeignKey(
+        Channel,
+        on_delete=models.CASCADE,
+        related_name="coverage",
+    )
+    start_at = models.DateTimeField()
+    end_at = models.DateTimeField()
+    segments = models.PositiveIntegerField(default=0)
+    cc_errors = models.PositiveIntegerField(default=0)
+    pcr_discontinuities = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["channel", "start_at"]
+        indexes = [models.Index(fields=["channel", "start_at"])]
+
+    def __str__(self) -> str:
+        return f"{self.channel.name}: {self.start_at} - {self.end_at}"
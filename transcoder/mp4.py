@@ -0,0 +1,286 @@
+# transcoder/mp4.py
+"""
+Just enough ISO-BMFF parsing to use fragmented MP4 (CMAF) recordings the way
+mpegts.py uses TS ones: find the init section (ftyp + moov) and index the
+fragments (moof + mdat, each preceded by ffmpeg's per-fragment sidx) by
+decode time. Only box headers and the small moov/moof boxes are read; media
+data is skipped by size, so indexing an hour-long segment reads a few KB
+per fragment.
+
+Fragments start on a keyframe (ffmpeg's cmaf/frag_keyframe), so a fragment
+is also the unit clips are cut and recordings are seeked on. A file still
+being written is indexed up to its last complete fragment; refresh() picks
+up what was appended since.
+"""
+import os
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .mpegts import PCR_MAX_GAP, ContinuityScan
+
+# movflags of fragmented MP4 outputs: CMAF fragments starting on keyframes,
+# each preceded by a sidx (its byte range and duration) for DASH/HLS players,
+# and the moov written once the first packets have filled in the codec setup.
+MOVFLAGS = "+cmaf+dash+delay_moov"
+
+HEADER = 8
+FRAGMENT_BOXES = {b"styp", b"sidx", b"prft", b"emsg"}  # may precede a moof
+
+
+class Mp4Error(Exception):
+    pass
+
+
+@dataclass
+class Fragment:
+    offset: int  # first byte of the fragment (its sidx/styp, or the moof)
+    end: int  # end of its mdat
+    start: float  # seconds since the segment's first fragment (reference track)
+    duration: float
+
+    @property
+    def size(self) -> int:
+        return self.end - self.offset
+
+
+def _boxes(buf: bytes, offset: int = 0, end: Optional[int] = None):
+    """
+    (type, payload start, box end) of the boxes in buf[offset:end].
+    """
+    end = len(buf) if end is None else end
+    while offset + HEADER <= end:
+        size, kind = struct.unpack_from(">I4s", buf, offset)
+        header = HEADER
+        if size == 1:
+            size = struct.unpack_from(">Q", buf, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            raise Mp4Error(f"bad {kind!r} box size {size}")
+        yield kind, offset + header, offset + size
+        offset += size
+
+
+class Mp4File:
+    """
+    Fragment index of one fragmented MP4 segment. Keeps the file open; use
+    as a context manager.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fd = os.open(self.path, os.O_RDONLY)
+        self.size = 0
+        self.init_end = 0  # ftyp + moov: what a player needs before any fragment
+        self.fragments: List[Fragment] = []
+        self._timescales: Dict[int, int] = {}
+        self._default_durations: Dict[int, int] = {}
+        self.track_id: Optional[int] = None  # reference track: the video one if any
+        self._next = 0  # where indexing resumes
+        self._first_time: Optional[int] = None
+        self.refresh()
+        if not self.init_end:
+            raise Mp4Error(f"{self.path}: no moov box")
+
+    def __enter__(self) -> "Mp4File":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _read(self, offset: int, length: int) -> bytes:
+        return os.pread(self._fd, length, offset)
+
+    def _header(self, offset: int) -> Optional[Tuple[bytes, int, int]]:
+        """
+        (type, header length, box size) at `offset`, None past the end.
+        """
+        buf = self._read(offset, 16)
+        if len(buf) < HEADER:
+            return None
+        size, kind = struct.unpack_from(">I4s", buf)
+        if size == 1:
+            if len(buf) < 16:
+                return None
+            return kind, 16, struct.unpack_from(">Q", buf, 8)[0]
+        if size == 0:
+            return kind, HEADER, self.size - offset
+        if size < HEADER:
+            raise Mp4Error(f"{self.path}: bad {kind!r} box size {size} at {offset}")
+        return kind, HEADER, size
+
+    def refresh(self) -> int:
+        """
+        Index the complete fragments appended since the last call; returns
+        how many were added.
+        """
+        self.size = os.fstat(self._fd).st_size
+        added = 0
+        offset = fragment_at = self._next
+        moof = None
+        while True:
+            found = self._header(offset)
+            if found is None:
+                break
+            kind, header, size = found
+            if offset + size > self.size:
+                break  # still being written
+            if kind == b"moov":
+                self._parse_moov(self._read(offset + header, size - header))
+                self.init_end = offset + size
+                fragment_at = offset + size
+            elif kind == b"moof":
+                moof = self._parse_moof(self._read(offset + header, size - header))
+            elif kind == b"mdat" and moof is not None:
+                if self._add_fragment(fragment_at, offset + size, *moof):
+                    added += 1
+                moof = None
+                fragment_at = offset + size
+            elif kind not in FRAGMENT_BOXES:
+                fragment_at = offset + size  # ftyp, free, mfra...
+            offset += size
+            if moof is None:
+                self._next = fragment_at
+        return added
+
+    def _parse_moov(self, moov: bytes) -> None:
+        video = None
+        for kind, start, end in _boxes(moov):
+            if kind == b"trak":
+                track_id, timescale, handler = None, None, None
+                for sub, s_start, s_end in _boxes(moov, start, end):
+                    if sub == b"tkhd":
+                        version = moov[s_start]
+                        track_id = struct.unpack_from(">I", moov, s_start + (20 if version == 1 else 12))[0]
+                    elif sub == b"mdia":
+                        for box, b_start, _ in _boxes(moov, s_start, s_end):
+                            if box == b"mdhd":
+                                version = moov[b_start]
+                                timescale = struct.unpack_from(">I", moov, b_start + (20 if version == 1 else 12))[0]
+                            elif box == b"hdlr":
+                                handler = moov[b_start + 8:b_start + 12]
+                if track_id is None or not timescale:
+                    continue
+                self._timescales[track_id] = timescale
+                if self.track_id is None:
+                    self.track_id = track_id
+                if handler == b"vide" and video is None:
+                    video = track_id
+            elif kind == b"mvex":
+                for sub, s_start, _ in _boxes(moov, start, end):
+                    if sub == b"trex":
+                        track_id, _, duration = struct.unpack_from(">III", moov, s_start + 4)
+                        self._default_durations[track_id] = duration
+        if video is not None:
+            self.track_id = video
+
+    def _parse_moof(self, moof: bytes) -> Optional[Tuple[int, int]]:
+        """
+        (base decode time, duration) of the reference track in one moof, in
+        its timescale.
+        """
+        for kind, start, end in _boxes(moof):
+            if kind != b"traf":
+                continue
+            track_id, base_time, default_duration, duration = None, None, None, 0
+            for sub, s_start, _ in _boxes(moof, start, end):
+                flags = int.from_bytes(moof[s_start + 1:s_start + 4], "big")
+                if sub == b"tfhd":
+                    track_id = struct.unpack_from(">I", moof, s_start + 4)[0]
+                    at = s_start + 8
+                    at += 8 if flags & 0x01 else 0  # base_data_offset
+                    at += 4 if flags & 0x02 else 0  # sample_description_index
+                    if flags & 0x08:
+                        default_duration = struct.unpack_from(">I", moof, at)[0]
+                elif sub == b"tfdt":
+                    fmt = ">Q" if moof[s_start] == 1 else ">I"
+                    base_time = struct.unpack_from(fmt, moof, s_start + 4)[0]
+                elif sub == b"trun":
+                    count = struct.unpack_from(">I", moof, s_start + 4)[0]
+                    at = s_start + 8
+                    at += 4 if flags & 0x01 else 0  # data_offset
+                    at += 4 if flags & 0x04 else 0  # first_sample_flags
+                    if flags & 0x100:
+                        stride = 4 * bin(flags & 0xF00).count("1")
+                        duration += sum(
+                            struct.unpack_from(">I", moof, at + i * stride)[0] for i in range(count)
+                        )
+                    else:
+                        if default_duration is None:
+                            default_duration = self._default_durations.get(track_id, 0)
+                        duration += count * default_duration
+            if track_id == self.track_id and base_time is not None:
+                return base_time, duration
+        return None
+
+    def _add_fragment(self, offset: int, end: int, base_time: int, duration: int) -> bool:
+        timescale = self._timescales.get(self.track_id)
+        if not timescale:
+            return False
+        if self._first_time is None:
+            self._first_time = base_time
+        self.fragments.append(Fragment(
+            offset=offset,
+            end=end,
+            start=(base_time - self._first_time) / timescale,
+            duration=duration / timescale,
+        ))
+        return True
+
+    @property
+    def data_end(self) -> int:
+        """
+        End of the last complete fragment (or of the init section).
+        """
+        return self.fragments[-1].end if self.fragments else self.init_end
+
+    def fragment_at(self, seconds: float) -> Fragment:
+        """
+        The fragment playing at `seconds` into the segment: the last one
+        starting at or before it, the first one before the start.
+        """
+        if not self.fragments:
+            raise Mp4Error(f"{self.path}: no complete fragment yet")
+        lo, hi = 0, len(self.fragments)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.fragments[mid].start <= seconds:
+                lo = mid + 1
+            else:
+                hi = mid
+        return self.fragments[max(0, lo - 1)]
+
+    def duration(self) -> float:
+        """
+        Seconds from the first fragment to the end of the last one.
+        """
+        if not self.fragments:
+            return 0.0
+        last = self.fragments[-1]
+        return last.start + last.duration
+
+
+def scan_continuity(path: Path) -> ContinuityScan:
+    """
+    mpegts.scan_continuity() for a fragmented MP4 segment: fragments whose
+    decode time does not follow on from the previous one (a jump of more
+    than PCR_MAX_GAP either way) count as discontinuities. MP4 has no
+    continuity counters, so cc_errors stays 0.
+    """
+    scan = ContinuityScan()
+    with Mp4File(path) as mp4:
+        previous = None
+        for fragment in mp4.fragments:
+            if previous is not None and abs(fragment.start - (previous.start + previous.duration)) > PCR_MAX_GAP:
+                scan.pcr_discontinuities += 1
+            scan.duration += fragment.duration
+            previous = fragment
+    return scan
@@ -0,0 +1,312 @@
+# transcoder/mpegts.py
+"""
+Just enough MPEG-TS parsing to trim recordings without decoding them:
+find the video PID, read PTS values and random-access (keyframe) flags, and
+map a time offset inside a segment to a byte offset by bisection. Only the
+packets around each probe are read, so the cost is O(log(file size)).
+
+scan_continuity() is the one full pass: it counts continuity-counter errors
+and PCR discontinuities of a whole segment.
+"""
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+PACKET = 188
+SYNC = 0x47
+PTS_WRAP = 1 << 33
+PTS_HZ = 90000
+NULL_PID = 0x1FFF
+
+# PMT stream types carrying video: MPEG-1/2, MPEG-4 part 2, H.264, HEVC
+VIDEO_STREAM_TYPES = {0x01, 0x02, 0x10, 0x1B, 0x24}
+
+PROBE_BYTES = 256 * 1024  # how far a probe reads looking for a PTS
+KEYFRAME_SCAN_BYTES = 1024 * 1024  # chunk size when scanning back for a keyframe
+HEADER_SCAN_BYTES = 2 * 1024 * 1024  # where PAT/PMT must show up
+SCAN_CHUNK_PACKETS = 8192  # packets per read in scan_continuity()
+PCR_MAX_GAP = 0.5  # seconds between PCRs before it counts as a discontinuity
+
+
+class TsError(Exception):
+    pass
+
+
+def _pid(pkt: bytes) -> int:
+    return ((pkt[1] & 0x1F) << 8) | pkt[2]
+
+
+def _payload_start(pkt: bytes) -> bool:
+    return bool(pkt[1] & 0x40)
+
+
+def _payload(pkt: bytes) -> bytes:
+    control = (pkt[3] >> 4) & 0x3
+    if control == 1:
+        return pkt[4:]
+    if control == 3:
+        return pkt[5 + pkt[4]:]
+    return b""
+
+
+def _random_access(pkt: bytes) -> bool:
+    """
+    random_access_indicator of the adaptation field: set by muxers on the
+    first packet of a keyframe.
+    """
+    return bool((pkt[3] & 0x20) and pkt[4] > 0 and pkt[5] & 0x40)
+
+
+def packet_pcr(pkt: bytes) -> Optional[int]:
+    """
+    PCR base (90 kHz) of a packet, or None if it carries none.
+    """
+    if not (pkt[3] & 0x20 and pkt[4] > 0 and pkt[5] & 0x10):
+        return None
+    p = pkt[6:11]
+    return (p[0] << 25) | (p[1] << 17) | (p[2] << 9) | (p[3] << 1) | (p[4] >> 7)
+
+
+def _pes_pts(pkt: bytes) -> Optional[int]:
+    if not _payload_start(pkt):
+        return None
+    payload = _payload(pkt)
+    if len(payload) < 14 or payload[:3] != b"\x00\x00\x01" or not payload[7] & 0x80:
+        return None
+    p = payload[9:14]
+    return (
+        ((p[0] >> 1) & 0x07) << 30
+        | p[1] << 22
+        | (p[2] >> 1) << 15
+        | p[3] << 7
+        | p[4] >> 1
+    )
+
+
+def _section(pkt: bytes) -> bytes:
+    payload = _payload(pkt)
+    if not payload:
+        return b""
+    return payload[1 + payload[0]:]  # skip pointer_field
+
+
+@dataclass
+class Probe:
+    offset: int  # byte offset of the packet carrying the PTS
+    pts: int
+    keyframe: bool
+
+
+class TsFile:
+    """
+    Random-access view of one TS segment. Keeps the file open; use as a
+    context manager.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fd = os.open(self.path, os.O_RDONLY)
+        self.size = os.fstat(self._fd).st_size
+        self.origin = self._find_sync(0)
+        self.packets = (self.size - self.origin) // PACKET
+        self.video_pid = self._find_video_pid()
+        first = self.probe_forward(self.origin)
+        if first is None:
+            raise TsError(f"{self.path}: no video timestamps found")
+        self.first_pts = first.pts
+
+    def __enter__(self) -> "TsFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _read(self, offset: int, length: int) -> bytes:
+        return os.pread(self._fd, length, offset)
+
+    def _find_sync(self, offset: int) -> int:
+        buf = self._read(offset, PACKET * 8)
+        for i in range(min(PACKET, len(buf))):
+            if all(buf[j] == SYNC for j in range(i, len(buf), PACKET)):
+                return offset + i
+        raise TsError(f"{self.path}: not an MPEG-TS file")
+
+    def _packets(self, offset: int, length: int):
+        buf = self._read(offset, length - length % PACKET)
+        for i in range(0, len(buf) - PACKET + 1, PACKET):
+            pkt = buf[i:i + PACKET]
+            if pkt[0] == SYNC:
+                yield offset + i, pkt
+
+    def _find_video_pid(self) -> int:
+        pmt_pid = None
+        for _, pkt in self._packets(self.origin, HEADER_SCAN_BYTES):
+            pid = _pid(pkt)
+            if pid == 0 and pmt_pid is None and _payload_start(pkt):
+                section = _section(pkt)
+                length = ((section[1] & 0x0F) << 8) | section[2]
+                programs = section[8:3 + length - 4]
+                for i in range(0, len(programs) - 3, 4):
+                    if (programs[i] << 8 | programs[i + 1]) != 0:  # skip the NIT entry
+                        pmt_pid = ((programs[i + 2] & 0x1F) << 8) | programs[i + 3]
+                        break
+            elif pmt_pid is not None and pid == pmt_pid and _payload_start(pkt):
+                section = _section(pkt)
+                length = ((section[1] & 0x0F) << 8) | section[2]
+                info_length = ((section[10] & 0x0F) << 8) | section[11]
+                i = 12 + info_length
+                end = 3 + length - 4
+                while i + 5 <= end:
+                    stream_type = section[i]
+                    es_pid = ((section[i + 1] & 0x1F) << 8) | section[i + 2]
+                    if stream_type in VIDEO_STREAM_TYPES:
+                        return es_pid
+                    i += 5 + (((section[i + 3] & 0x0F) << 8) | section[i + 4])
+                raise TsError(f"{self.path}: no video stream in the PMT")
+        raise TsError(f"{self.path}: no PAT/PMT in the first {HEADER_SCAN_BYTES} bytes")
+
+    def probe_forward(self, offset: int) -> Optional[Probe]:
+        """
+        First video PTS at or after `offset` (a packet boundary).
+        """
+        while offset < self.size:
+            for at, pkt in self._packets(offset, PROBE_BYTES):
+                if _pid(pkt) == self.video_pid:
+                    pts = _pes_pts(pkt)
+                    if pts is not None:
+                        return Probe(at, pts, _random_access(pkt))
+            offset += PROBE_BYTES
+        return None
+
+    def seconds(self, pts: int) -> float:
+        """
+        Seconds since the first video frame of the segment.
+        """
+        return ((pts - self.first_pts) % PTS_WRAP) / PTS_HZ
+
+    def offset_at(self, seconds: float) -> int:
+        """
+        Byte offset of the first video PES starting at or after `seconds`
+        into the segment (the file size if the segment is shorter).
+        """
+        if seconds <= 0:
+            return self.origin
+        lo, hi = 0, self.packets  # packet indexes; answer in [lo, hi]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = self.probe_forward(self.origin + mid * PACKET)
+            if probe is None or self.seconds(probe.pts) >= seconds:
+                hi = mid
+            else:
+                lo = (probe.offset - self.origin) // PACKET + 1
+        probe = self.probe_forward(self.origin + lo * PACKET)
+        return probe.offset if probe is not None else self.size
+
+    def keyframe_before(self, offset: int) -> int:
+        """
+        Offset of the last keyframe packet at or before `offset`, scanning
+        backwards one chunk at a time; the segment start if there is none.
+        """
+        end = min(offset + PACKET, self.size)
+        while end > self.origin:
+            start = max(self.origin, end - KEYFRAME_SCAN_BYTES)
+            start -= (start - self.origin) % PACKET
+            found = None
+            for at, pkt in self._packets(start, end - start):
+                if _pid(pkt) == self.video_pid and _random_access(pkt) and _payload_start(pkt):
+                    found = at
+            if found is not None:
+                return found
+            end = start
+        return self.origin
+
+    def duration(self) -> float:
+        """
+        Seconds from the first to the last video PTS.
+        """
+        back = max(self.origin, self.size - PROBE_BYTES)
+        back -= (back - self.origin) % PACKET
+        last = None
+        for _, pkt in self._packets(back, self.size - back):
+            if _pid(pkt) == self.video_pid:
+                pts = _pes_pts(pkt)
+                if pts is not None:
+                    last = pts
+        return self.seconds(last) if last is not None else 0.0
+
+
+@dataclass
+class ContinuityScan:
+    packets: int = 0
+    cc_errors: int = 0
+    pcr_discontinuities: int = 0
+    # Seconds of PCR time covered (first PCR PID), not counting the jumps at
+    # discontinuities.
+    duration: float = 0.0
+
+
+def scan_continuity(path: Path) -> ContinuityScan:
+    """
+    Read a whole segment and count continuity-counter errors (lost or
+    reordered packets, per PID) and PCR discontinuities (a jump backwards or
+    more than PCR_MAX_GAP forwards, signalled or not). The per-packet loop
+    only sees the header bytes, sliced out of each chunk at C speed.
+    """
+    result = ContinuityScan()
+    last_cc = {}
+    last_pcr = {}
+    pcr_pid = None
+    max_gap = PCR_MAX_GAP * PTS_HZ
+    with open(path, "rb") as f:
+        head = f.read(PACKET * 8)
+        origin = next(
+            (i for i in range(min(PACKET, len(head)))
+             if all(head[j] == SYNC for j in range(i, len(head), PACKET))),
+            None,
+        )
+        if origin is None:
+            raise TsError(f"{path}: not an MPEG-TS file")
+        f.seek(origin)
+        while True:
+            chunk = f.read(PACKET * SCAN_CHUNK_PACKETS)
+            count = len(chunk) // PACKET
+            if not count:
+                break
+            result.packets += count
+            columns = (chunk[0::PACKET], chunk[1::PACKET], chunk[2::PACKET], chunk[3::PACKET],
+                       chunk[4::PACKET], chunk[5::PACKET])
+            for i, (sync, b1, b2, b3, af_len, flags) in enumerate(zip(*columns)):
+                if sync != SYNC:
+                    continue
+                pid = ((b1 & 0x1F) << 8) | b2
+                if pid == NULL_PID:
+                    continue
+                has_af = b3 & 0x20 and af_len > 0
+                signalled = has_af and flags & 0x80
+                if b3 & 0x10:  # carries payload: the counter advances
+                    cc = b3 & 0x0F
+                    prev = last_cc.get(pid)
+                    if prev is not None and cc != prev and cc != (prev + 1) & 0x0F and not signalled:
+                        result.cc_errors += 1
+                    last_cc[pid] = cc
+                if has_af and flags & 0x10:
+                    at = i * PACKET + 6
+                    p = chunk[at:at + 5]
+                    pcr = (p[0] << 25) | (p[1] << 17) | (p[2] << 9) | (p[3] << 1) | (p[4] >> 7)
+                    prev = last_pcr.get(pid)
+                    if prev is not None:
+                        delta = (pcr - prev) % PTS_WRAP
+                        if signalled or delta > max_gap:  # a backwards jump wraps to a huge delta
+                            result.pcr_discontinuities += 1
+                        elif pid == pcr_pid:
+                            result.duration += delta / PTS_HZ
+                    elif pcr_pid is None:
+                        pcr_pid = pid
+                    last_pcr[pid] = pcr
+    return result
@@ -0,0 +1,190 @@
+# transcoder/nic_placement.py
+import ipaddress
+import socket
+import struct
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Hashable, Optional, Tuple
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+SIOCGIFADDR = 0x8915  # Linux ioctl: get interface IPv4 address
+
+RX = "rx"  # multicast inputs
+TX = "tx"  # UDP outputs
+
+
+def interface_ipv4(interface: str) -> Optional[str]:
+    """
+    Resolve a NIC name (e.g. "eth1") to its IPv4 address.
+    An IPv4 address is returned unchanged, so multicast_interface may hold either.
+    Returns None when the interface has no IPv4 address or cannot be queried
+    (e.g. on Windows, where only literal addresses are supported).
+    """
+    interface = (interface or "").strip()
+    if not interface:
+        return None
+
+    try:
+        return str(ipaddress.IPv4Address(interface))
+    except ValueError:
+        pass
+
+    try:
+        import fcntl
+    except ImportError:
+        return None
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        packed = struct.pack("256s", interface[:15].encode())
+        try:
+            res = fcntl.ioctl(sock.fileno(), SIOCGIFADDR, packed)
+        except OSError:
+            return None
+    return socket.inet_ntoa(res[20:24])
+
+
+def is_multicast_url(url: str) -> bool:
+    """
+    True if a udp:// URL points at a multicast group (udp://@239.1.1.1:1234 or udp://239.1.1.1:1234).
+    """
+    parts = urlsplit(url)
+    if parts.scheme != "udp":
+        return False
+    host = (parts.hostname or "").lstrip("@")
+    try:
+        return ipaddress.ip_address(host).is_multicast
+    except ValueError:
+        return False
+
+
+def bitrate_to_kbps(value: str) -> Optional[int]:
+    """
+    Parse an ffmpeg-style bitrate ("4000k", "8M", "2500000") into kbit/s.
+    """
+    value = (value or "").strip().lower()
+    if not value:
+        return None
+    if value[-1] in "km":
+        scale = 1000 if value[-1] == "m" else 1
+        value = value[:-1]
+    else:
+        scale = 0.001
+    try:
+        return int(float(value) * scale)
+    except ValueError:
+        return None
+
+
+@dataclass
+class NicState:
+    name: str
+    capacity_kbps: int
+    # kbit/s measured from /sys/class/net/<nic>/statistics, per direction
+    measured_kbps: Dict[str, float] = field(default_factory=lambda: {RX: 0.0, TX: 0.0})
+    # kbit/s promised to jobs placed here, per direction
+    assigned_kbps: Dict[str, float] = field(default_factory=lambda: {RX: 0.0, TX: 0.0})
+    _last_counters: Optional[Tuple[float, int, int]] = None
+
+    def load_kbps(self, direction: str) -> float:
+        # A freshly placed job shows up in the counters only after a few samples,
+        # so trust whichever of "measured" and "promised" is larger.
+        return max(self.measured_kbps[direction], self.assigned_kbps[direction])
+
+    def utilisation(self, direction: str, extra_kbps: float = 0.0) -> float:
+        return (self.load_kbps(direction) + extra_kbps) / max(self.capacity_kbps, 1)
+
+
+class NicPlacer:
+    """
+    Spreads multicast inputs (rx) and multicast UDP outputs (tx) across the NICs in
+    settings.TRANSCODER_NICS, using measured interface throughput plus the bitrate
+    of jobs already placed.
+
+    Assignments are sticky: a job keeps its NIC until release() is called when it
+    stops, so running channels are only rebalanced when they restart.
+    """
+
+    SYSFS_NET = Path("/sys/class/net")
+
+    def __init__(self, nics: Optional[Dict[str, dict]] = None):
+        nics = settings.TRANSCODER_NICS if nics is None else nics
+        self.nics: Dict[str, NicState] = {
+            name: NicState(
+                name=name,
+                capacity_kbps=int(conf.get("capacity_mbps", 1000)) * 1000,
+            )
+            for name, conf in nics.items()
+        }
+        # (job_key, direction) -> (nic_name, kbps)
+        self.assignments: Dict[Tuple[Hashable, str], Tuple[str, float]] = {}
+        # channel_id -> measured kbit/s, fed by the enforcer from -progress output
+        self.channel_kbps: Dict[int, float] = {}
+
+    def _read_counters(self, nic: str) -> Optional[Tuple[int, int]]:
+        stats = self.SYSFS_NET / nic / "statistics"
+        try:
+            rx = int((stats / "rx_bytes").read_text())
+            tx = int((stats / "tx_bytes").read_text())
+        except (OSError, ValueError):
+            return None
+        return rx, tx
+
+    def sample(self) -> None:
+        """
+        Refresh measured per-NIC throughput. Call once per enforcer tick.
+        """
+        now = time.monotonic()
+        for nic in self.nics.values():
+            counters = self._read_counters(nic.name)
+            if counters is None:
+                continue
+            rx, tx = counters
+            if nic._last_counters is not None:
+                then, last_rx, last_tx = nic._last_counters
+                elapsed = now - then
+                if elapsed > 0:
+                    nic.measured_kbps[RX] = (rx - last_rx) * 8 / 1000 / elapsed
+                    nic.measured_kbps[TX] = (tx - last_tx) * 8 / 1000 / elapsed
+            nic._last_counters = (now, rx, tx)
+
+    def observe_channel_bitrate(self, channel_id: int, kbps: float) -> None:
+        self.channel_kbps[channel_id] = kbps
+
+    def estimate_kbps(self, channel) -> float:
+        measured = self.channel_kbps.get(channel.id)
+        if measured:
+            return measured
+        configured = bitrate_to_kbps(channel.video_bitrate)
+        if configured:
+            return configured
+        return settings.TRANSCODER_DEFAULT_CHANNEL_KBPS
+
+    def assign(self, job_key: Hashable, direction: str, channel) -> Optional[str]:
+        """
+        Return the NIC for this job and direction, placing it on the least
+        utilised NIC the first time it is asked for.
+        """
+        existing = self.assignments.get((job_key, direction))
+        if existing:
+            return existing[0]
+        if not self.nics:
+            return None
+
+        kbps = self.estimate_kbps(channel)
+        nic = min(self.nics.values(), key=lambda n: (n.utilisation(direction, kbps), n.name))
+        nic.assigned_kbps[direction] += kbps
+        self.assignments[(job_key, direction)] = (nic.name, kbps)
+        return nic.name
+
+    def release(self, job_key: Hashable) -> None:
+        for direction in (RX, TX):
+            assigned = self.assignments.pop((job_key, direction), None)
+            if assigned is None:
+                continue
+            nic_name, kbps = assigned
+            nic = self.nics.get(nic_name)
+            if nic is not None:
+                nic.assigned_kbps[direction] = max(0.0, nic.assigned_kbps[direction] - kbps)
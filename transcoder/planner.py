@@ -0,0 +1,396 @@
+# transcoder/planner.py
+import math
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .bulk_io import overlapping_pairs
+from .models import Channel, RecurringSchedule, Schedule
+from .nic_placement import bitrate_to_kbps, is_multicast_url
+from .procstats import channel_cost_profile
+
+DEFAULT_ROUTE = "(default route)"
+
+
+@dataclass
+class JobWindow:
+    """
+    One stretch of time a job would run, in minutes from the horizon start,
+    with the resources it is assumed to use.
+    """
+    start: int
+    end: int
+    key: Tuple[str, int]
+    channel_id: int
+    channel: str
+    purpose: str
+    schedule: str
+    cpu_percent: float
+    input_url: str = ""  # multicast input joined by the job, if any
+    rx_nic: str = ""
+    tx_nic: str = ""
+    kbps: float = 0.0
+
+
+@dataclass
+class Overload:
+    resource: str
+    start: int
+    end: int
+    peak: float
+    capacity: float
+
+
+@dataclass
+class Plan:
+    origin: datetime  # local time of minute 0
+    minutes: int
+    windows: List[JobWindow]
+    jobs: List[int]
+    cpu: List[float]
+    nic_rx: Dict[str, List[float]]
+    nic_tx: Dict[str, List[float]]
+    inputs: Dict[str, dict]
+    capacity: Dict[str, Optional[float]]
+    overloads: List[Overload] = field(default_factory=list)
+    duplicates: List[Tuple[JobWindow, JobWindow]] = field(default_factory=list)
+
+    def at(self, minute: int) -> datetime:
+        return self.origin + timedelta(minutes=minute)
+
+    def series(self) -> Dict[str, list]:
+        out = {"jobs": self.jobs, "cpu": self.cpu}
+        out.update({f"rx:{nic}": s for nic, s in self.nic_rx.items()})
+        out.update({f"tx:{nic}": s for nic, s in self.nic_tx.items()})
+        return out
+
+    def peaks(self) -> Dict[str, Tuple[float, int]]:
+        """
+        {resource: (peak value, first minute it is reached)}
+        """
+        out = {}
+        for name, values in self.series().items():
+            if values:
+                peak = max(values)
+                out[name] = (peak, values.index(peak))
+        return out
+
+    def hourly(self) -> List[dict]:
+        """
+        Per-hour maxima of every series, for tables.
+        """
+        series = self.series()
+        rows = []
+        for start in range(0, self.minutes, 60):
+            row = {"start": self.at(start), "minute": start}
+            for name, values in series.items():
+                row[name] = max(values[start:start + 60], default=0)
+            rows.append(row)
+        return rows
+
+
+# ------------------------
+# Job cost estimates
+# ------------------------
+
+def _output_urls(chan, purpose: str) -> List[str]:
+    if purpose == "live_forward" and chan.output_type == "udp_ts":
+        return [chan.output_target]
+    if purpose == "playback":
+        # One playout job sends every enabled delay of the channel.
+        return [p.output_udp_url for p in chan.timeshift_profiles.all() if p.enabled]
+    return []
+
+
+class CostModel:
+    """
+    What a job of a channel is assumed to cost: measured average CPU from
+    ChannelResourceSample history when there is any, otherwise
+    TRANSCODER_PLANNER_JOB_CPU_PERCENT by video mode; bandwidth from the
+    channel's video bitrate (or TRANSCODER_DEFAULT_CHANNEL_KBPS), or the
+    muxrate of a constant-bitrate UDP output.
+    """
+
+    def __init__(self, measured: Optional[Dict[int, dict]] = None):
+        self.measured = channel_cost_profile() if measured is None else measured
+        self.default_cpu = settings.TRANSCODER_PLANNER_JOB_CPU_PERCENT
+        self._cache: Dict[Tuple[int, str], dict] = {}
+
+    def cost(self, chan, purpose: str) -> dict:
+        cached = self._cache.get((chan.id, purpose))
+        if cached is not None:
+            return cached
+
+        measured = self.measured.get(chan.id) or {}
+        if measured.get("cpu_percent_avg") is not None:
+            cpu = measured["cpu_percent_avg"]
+        else:
+            mode = "copy" if purpose == "playback" else chan.video_mode
+            cpu = self.default_cpu.get(mode, 100)
+        kbps = bitrate_to_kbps(chan.video_bitrate) or settings.TRANSCODER_DEFAULT_CHANNEL_KBPS
+        if purpose == "live_forward" and chan.output_type == "udp_ts":
+            kbps = bitrate_to_kbps(chan.udp_muxrate) or kbps  # CBR: exactly this, padding included
+        nic = chan.multicast_interface or DEFAULT_ROUTE
+
+        cost = {"cpu_percent": cpu, "kbps": kbps, "input_url": "", "rx_nic": "", "tx_nic": ""}
+        if purpose in ("live_forward", "record") and chan.input_type == "udp_multicast":
+            cost.update(input_url=chan.input_url, rx_nic=nic)
+        output_urls = [url for url in _output_urls(chan, purpose) if url.startswith("udp://")]
+        if output_urls:
+            cost["tx_nic"] = nic if any(is_multicast_url(url) for url in output_urls) else DEFAULT_ROUTE
+            cost["kbps"] = kbps * len(output_urls)
+        self._cache[(chan.id, purpose)] = cost
+        return cost
+
+
+# ------------------------
+# Expansion
+# ------------------------
+
+def _minutes(origin: datetime, moment: datetime, ceil: bool = False) -> int:
+    seconds = (moment - origin).total_seconds() / 60
+    return math.ceil(seconds) if ceil else math.floor(seconds)
+
+
+def _preroll(preroll_seconds: Optional[int], chan) -> timedelta:
+    seconds = chan.preroll_seconds if preroll_seconds is None else preroll_seconds
+    return timedelta(seconds=min(seconds or 0, settings.TRANSCODER_MAX_PREROLL_SECONDS))
+
+
+def expand_windows(start: datetime, minutes: int, channel_prefix: str = "",
+                   costs: Optional[CostModel] = None) -> Tuple[datetime, List[JobWindow]]:
+    """
+    Every job the enforcer would run between `start` and `start + minutes`,
+    pre-roll included, clipped to the horizon. Works on local wall-clock
+    time like RecurringSchedule.is_active_now (DST jumps are not modelled).
+    Consecutive windows of one recurring schedule are merged, since the
+    enforcer keeps the same job running across them.
+    """
+    costs = costs or CostModel()
+    origin = timezone.localtime(start).replace(tzinfo=None, second=0, microsecond=0)
+    horizon_end = origin + timedelta(minutes=minutes)
+    max_preroll = timedelta(seconds=settings.TRANSCODER_MAX_PREROLL_SECONDS)
+    windows: List[JobWindow] = []
+
+    def add(key, chan, purpose: str, name: str, begin: datetime, end: datetime):
+        lo = max(0, _minutes(origin, begin))
+        hi = min(minutes, _minutes(origin, end, ceil=True))
+        if hi <= lo:
+            return
+        last = windows[-1] if windows else None
+        if last is not None and last.key == key and lo <= last.end:
+            last.end = max(last.end, hi)
+            return
+        windows.append(JobWindow(
+            start=lo, end=hi, key=key, channel_id=chan.id, channel=chan.name,
+            purpose=purpose, schedule=name, **costs.cost(chan, purpose),
+        ))
+
+    channels = Channel.objects.prefetch_related("timeshift_profiles")
+    oneoff = Schedule.objects.filter(
+        enabled=True,
+        start_at__lt=timezone.make_aware(horizon_end) + max_preroll,
+        end_at__gt=timezone.make_aware(origin),
+    )
+    recurring = RecurringSchedule.objects.filter(enabled=True)
+    if channel_prefix:
+        channels = channels.filter(name__startswith=channel_prefix)
+        oneoff = oneoff.filter(channel__name__startswith=channel_prefix)
+        recurring = recurring.filter(channel__name__startswith=channel_prefix)
+    # Plain tuples: building model instances dominates the run time otherwise.
+    channels = {chan.id: chan for chan in channels}
+
+    for sid, name, purpose, channel_id, start_at, end_at, preroll in oneoff.order_by("pk").values_list(
+        "id", "name", "purpose", "channel_id", "start_at", "end_at", "preroll_seconds"
+    ):
+        chan = channels[channel_id]
+        begin = timezone.localtime(start_at).replace(tzinfo=None) - _preroll(preroll, chan)
+        end = timezone.localtime(end_at).replace(tzinfo=None)
+        add(("oneoff", sid), chan, purpose, name, begin, end)
+
+    # Occurrences start on days from the day before the horizon (overnight
+    # windows) to its last day.
+    days = [origin.date() + timedelta(days=d) for d in range(-1, math.ceil(minutes / 1440) + 1)]
+    rows = recurring.order_by("pk").values_list(
+        "id", "name", "purpose", "channel_id", "start_time", "end_time", "date_from", "date_to",
+        "preroll_seconds", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    )
+    for sid, name, purpose, channel_id, start_time, end_time, date_from, date_to, preroll, *flags in rows:
+        chan = channels[channel_id]
+        lead = _preroll(preroll, chan)
+        for day in days:
+            if not flags[day.weekday()]:
+                continue
+            if (date_from and day < date_from) or (date_to and day > date_to):
+                continue
+            if start_time == end_time:
+                begin = datetime.combine(day, datetime.min.time())
+                end = begin + timedelta(days=1)
+            else:
+                begin = datetime.combine(day, start_time)
+                end = datetime.combine(day, end_time)
+                if end_time < start_time:
+                    end += timedelta(days=1)
+            add(("recurring", sid), chan, purpose, name, begin - lead, end)
+
+    return origin, windows
+
+
+# ------------------------
+# Simulation
+# ------------------------
+
+def _accumulate(diff: list) -> list:
+    return list(accumulate(diff))[:-1]
+
+
+def _union(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[List[int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(m) for m in merged]
+
+
+def _peak_concurrency(intervals: List[Tuple[int, int]]) -> int:
+    events = sorted([(s, 1) for s, _ in intervals] + [(e, -1) for _, e in intervals])
+    peak = current = 0
+    for _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+def capacities() -> Dict[str, Optional[float]]:
+    nics = settings.TRANSCODER_NICS
+    out = {
+        "jobs": settings.TRANSCODER_MAX_JOBS,
+        "cpu": settings.TRANSCODER_CPU_CAPACITY_PERCENT or 100 * (os.cpu_count() or 1),
+    }
+    for nic, conf in nics.items():
+        capacity = int(conf.get("capacity_mbps", 1000)) * 1000
+        out[f"rx:{nic}"] = out[f"tx:{nic}"] = capacity
+    return out
+
+
+def _overloads(name: str, values: list, capacity: Optional[float]) -> List[Overload]:
+    if not capacity:
+        return []
+    out = []
+    start = None
+    for minute, value in enumerate(values + [0]):
+        if value > capacity and start is None:
+            start = minute
+        elif value <= capacity and start is not None:
+            out.append(Overload(name, start, minute, max(values[start:minute]), capacity))
+            start = None
+    return out
+
+
+def simulate(origin: datetime, minutes: int, windows: List[JobWindow]) -> Plan:
+    """
+    Sweep-line over the job windows: +cost where a window opens, -cost
+    where it closes, then one prefix sum per series gives the load at every
+    minute. Multicast inputs are counted once per NIC however many jobs
+    read them (the kernel joins the group once), so rx load comes from the
+    union of each input's windows.
+    """
+    jobs = [0] * (minutes + 1)
+    cpu = [0.0] * (minutes + 1)
+    nic_tx: Dict[str, list] = defaultdict(lambda: [0.0] * (minutes + 1))
+    by_input: Dict[Tuple[str, str], List[Tuple[int, int]]] = defaultdict(list)
+    input_kbps: Dict[str, float] = {}
+
+    for w in windows:
+        jobs[w.start] += 1
+        jobs[w.end] -= 1
+        cpu[w.start] += w.cpu_percent
+        cpu[w.end] -= w.cpu_percent
+        if w.tx_nic:
+            tx = nic_tx[w.tx_nic]
+            tx[w.start] += w.kbps
+            tx[w.end] -= w.kbps
+        if w.input_url:
+            by_input[(w.rx_nic, w.input_url)].append((w.start, w.end))
+            input_kbps[w.input_url] = max(input_kbps.get(w.input_url, 0), w.kbps)
+
+    nic_rx: Dict[str, list] = defaultdict(lambda: [0.0] * (minutes + 1))
+    inputs = {}
+    for (nic, url), intervals in by_input.items():
+        rx = nic_rx[nic]
+        kbps = input_kbps[url]
+        union = _union(intervals)
+        for start, end in union:
+            rx[start] += kbps
+            rx[end] -= kbps
+        entry = inputs.setdefault(url, {"nics": [], "kbps": kbps, "jobs": 0, "peak_readers": 0, "minutes": 0})
+        entry["nics"].append(nic)
+        entry["jobs"] += len(intervals)
+        entry["peak_readers"] = max(entry["peak_readers"], _peak_concurrency(intervals))
+        entry["minutes"] += sum(end - start for start, end in union)
+
+    plan = Plan(
+        origin=origin,
+        minutes=minutes,
+        windows=windows,
+        jobs=_accumulate(jobs),
+        cpu=_accumulate(cpu),
+        nic_rx={nic: _accumulate(d) for nic, d in sorted(nic_rx.items())},
+        nic_tx={nic: _accumulate(d) for nic, d in sorted(nic_tx.items())},
+        inputs=inputs,
+        capacity=capacities(),
+    )
+    for name, values in plan.series().items():
+        plan.overloads += _overloads(name, values, plan.capacity.get(name))
+
+    groups = defaultdict(list)
+    for w in windows:
+        groups[(w.channel_id, w.purpose)].append((w.start, w.end, w))
+    for intervals in groups.values():
+        if len(intervals) > 1:
+            plan.duplicates += [
+                (a, b) for a, b in overlapping_pairs(intervals) if a.key != b.key
+            ]
+    plan.duplicates.sort(key=lambda pair: max(pair[0].start, pair[1].start))
+    return plan
+
+
+def plan_capacity(start: Optional[datetime] = None, days: Optional[float] = None,
+                  channel_prefix: str = "", costs: Optional[CostModel] = None) -> Plan:
+    """
+    Expand and simulate schedules from `start` (default: now) over `days`.
+    """
+    days = settings.TRANSCODER_PLANNER_HORIZON_DAYS if days is None else days
+    minutes = max(1, int(days * 1440))
+    origin, windows = expand_windows(start or timezone.now(), minutes, channel_prefix, costs)
+    return simulate(origin, minutes, windows)
+
+
+def schedule_warnings(plan: Plan, key: Tuple[str, int]) -> List[str]:
+    """
+    Overloads and duplicate jobs that involve the job `key`, as messages.
+    """
+    own = [w for w in plan.windows if w.key == key]
+    messages = []
+    for o in plan.overloads:
+        if any(w.start < o.end and o.start < w.end for w in own):
+            messages.append(
+                f"{o.resource} over capacity {plan.at(o.start):%a %Y-%m-%d %H:%M} - {plan.at(o.end):%a %Y-%m-%d %H:%M} "
+                f"(peak {o.peak:.0f}, capacity {o.capacity:.0f})"
+            )
+    for a, b in plan.duplicates:
+        if key in (a.key, b.key):
+            other = b if a.key == key else a
+            messages.append(
+                f"runs alongside {other.schedule!r} ({other.purpose} on {other.channel}) "
+                f"from {plan.at(max(a.start, b.start)):%a %Y-%m-%d %H:%M}: two jobs would be started"
+            )
+    return messages
@@ -0,0 +1,641 @@
+# transcoder/playout.py
+"""
+Time-shift playout engine: one process per channel serves every enabled
+TimeShiftProfile (+1h, +3h, ...) of it.
+
+All delays read recorded segments through one ChunkWindow: a bounded LRU of
+chunks shared by the outputs, with read-ahead and page-cache hints, so
+delays that are close together read each chunk from disk once, and a chunk
+is only dropped from the page cache once every delay has passed it. Each
+delay has its own DelayOutput that paces packets by the recording's PCR, so
+packet n of a segment leaves at (segment start + PCR offset + delay) on the
+wall clock. Segments follow each other seamlessly; holes in the recording
+(found in the continuity map, or by segment names where it has none) are
+left silent or filled with a slate, per the profile's gap_mode.
+
+Fragmented MP4 segments (RecordingFormat.FMP4) go through a stream-copy
+ffmpeg remux to MPEG-TS on the way out: it is fed the init section and
+whole fragments, read through the same ChunkWindow, and its output is paced
+like a TS recording.
+"""
+import logging
+import os
+import socket
+import subprocess
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .clips import recording_segments
+from .continuity import Span, timeline
+from .ffmpeg_runner import FFmpegJobConfig
+from .models import Channel, GapMode, TimeShiftProfile
+from .mp4 import Mp4Error, Mp4File
+from .mpegts import PACKET, PCR_MAX_GAP, PTS_HZ, PTS_WRAP, SYNC, TsError, TsFile, packet_pcr
+from .staging import current_path
+
+logger = logging.getLogger(__name__)
+
+CHUNK_BYTES = PACKET * 2048  # 376 KiB: whole packets and whole 4 KiB pages
+LOOKAHEAD = 1.0  # seconds of output kept scheduled ahead of the clock
+LATE_RESYNC = 0.5  # later than this (stall, start-up), the delay is shifted instead of bursting
+WAIT_RETRY = 1.0  # seconds between looks for the next segment
+PROFILE_REFRESH = 10.0  # seconds between re-reads of the channel's profiles
+PCR_INTERVAL = 0.04  # assumed PCR spacing when bridging a discontinuity
+REMUX_POLL = 0.02  # seconds between looks at a remux that has no output yet
+
+
+def _epoch(local_naive: datetime) -> float:
+    return timezone.make_aware(local_naive).timestamp()
+
+
+# ------------------------
+# Shared reads
+# ------------------------
+
+class ChunkWindow:
+    """
+    Recently read chunks of recording files, shared by all delays of a
+    channel. Chunks are CHUNK_BYTES at fixed offsets, so every reader asks
+    for the same keys. A short chunk (the end of a file still being
+    written) is read again on the next request.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.readers = 1  # outputs that will read every chunk
+        self._chunks: "OrderedDict[Tuple[str, int], Tuple[bytes, set]]" = OrderedDict()
+        self._size = 0
+        self._fds: Dict[str, int] = {}
+        self.hits = 0
+        self.reads = 0
+        self.bytes_read = 0
+
+    def _fd(self, path: str) -> int:
+        fd = self._fds.get(path)
+        if fd is None:
+            # A staged segment may have been moved to its final folder.
+            fd = self._fds[path] = os.open(current_path(path), os.O_RDONLY)
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        return fd
+
+    def get(self, path: str, index: int, reader: int) -> bytes:
+        key = (path, index)
+        entry = self._chunks.get(key)
+        if entry is not None and len(entry[0]) == CHUNK_BYTES:
+            self._chunks.move_to_end(key)
+            entry[1].add(reader)
+            self.hits += 1
+            return entry[0]
+
+        fd = self._fd(path)
+        have, seen = (entry[0], entry[1] | {reader}) if entry is not None else (b"", {reader})
+        # Only the part a short chunk was missing: the live edge is polled.
+        tail = os.pread(fd, CHUNK_BYTES - len(have), index * CHUNK_BYTES + len(have))
+        data = have + tail
+        self.reads += 1
+        self.bytes_read += len(tail)
+        if hasattr(os, "posix_fadvise") and len(data) == CHUNK_BYTES:
+            os.posix_fadvise(fd, (index + 1) * CHUNK_BYTES, CHUNK_BYTES, os.POSIX_FADV_WILLNEED)
+        self._size -= len(have)
+        self._chunks[key] = (data, seen)
+        self._chunks.move_to_end(key)
+        self._size += len(data)
+        while self._size > self.max_bytes and len(self._chunks) > 1:
+            (old_path, old_index), (old, seen) = self._chunks.popitem(last=False)
+            self._size -= len(old)
+            if len(seen) >= self.readers and old_path in self._fds and hasattr(os, "posix_fadvise"):
+                # Every delay has read it: no reason to keep it in the page cache.
+                os.posix_fadvise(self._fds[old_path], old_index * CHUNK_BYTES, len(old), os.POSIX_FADV_DONTNEED)
+        return data
+
+    def close_unused(self, in_use: set) -> None:
+        for path in [p for p in self._fds if p not in in_use]:
+            os.close(self._fds.pop(path))
+
+    def close(self) -> None:
+        self.close_unused(set())
+
+
+class _Remux:
+    """
+    ffmpeg repackaging one fragmented MP4 segment as MPEG-TS (stream copy).
+    pump() feeds it the init section, then whole fragments from the one
+    playback starts in, and returns the packets it produced; both pipes are
+    non-blocking, so the engine loop never waits on it.
+    """
+
+    def __init__(self, path: str, seconds: float = 0.0):
+        self.path = path
+        self.mp4 = Mp4File(current_path(path))
+        self.start = 0.0  # seconds into the segment of the first fragment fed
+        self.resume = self.mp4.init_end  # where the fragments fed begin
+        if seconds > 0:
+            try:
+                fragment = self.mp4.fragment_at(seconds)
+            except Mp4Error:
+                self.mp4.close()
+                raise
+            self.start, self.resume = fragment.start, fragment.offset
+        self.offset = 0
+        self.buffer = b""  # read, not yet taken by ffmpeg
+        self.partial = b""  # output short of a whole packet
+        self.starved = False  # fed everything recorded so far
+        self.done = False
+        self.proc = subprocess.Popen(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "mp4", "-i", "pipe:0",
+             "-map", "0", "-c", "copy", "-f", "mpegts", "-muxdelay", "0", "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        os.set_blocking(self.proc.stdin.fileno(), False)
+        os.set_blocking(self.proc.stdout.fileno(), False)
+
+    def close(self) -> None:
+        self.mp4.close()
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        self.proc.stdin.close()
+        self.proc.stdout.close()
+
+    def _write(self, window: ChunkWindow, reader: int, recorded_past: Callable[[], bool]) -> None:
+        stdin = self.proc.stdin
+        if stdin.closed:
+            return
+        if not self.buffer:
+            if self.offset == self.mp4.init_end:
+                self.offset = max(self.offset, self.resume)
+            end = self.mp4.init_end if self.offset < self.mp4.init_end else self.mp4.data_end
+            if self.offset >= end:
+                self.mp4.refresh()
+                end = self.mp4.data_end
+            self.starved = self.offset >= end
+            if self.starved:
+                if recorded_past():
+                    stdin.close()  # the segment is closed and fully fed
+                return
+            index, skip = divmod(self.offset, CHUNK_BYTES)
+            self.buffer = window.get(self.path, index, reader)[skip:skip + end - self.offset]
+            self.offset += len(self.buffer)
+        try:
+            written = os.write(stdin.fileno(), self.buffer)
+        except BlockingIOError:
+            return
+        self.buffer = self.buffer[written:]
+
+    def pump(self, window: ChunkWindow, reader: int, recorded_past: Callable[[], bool]) -> bytes:
+        """
+        Feed ffmpeg what it will take and return the whole packets it has
+        output since the last call. `recorded_past` tells whether the
+        recording has moved on to a later segment, i.e. this one is
+        complete. Sets `done` once ffmpeg has output everything.
+        """
+        self._write(window, reader, recorded_past)
+        try:
+            data = os.read(self.proc.stdout.fileno(), CHUNK_BYTES)
+        except BlockingIOError:
+            return b""
+        if not data:
+            self.done = True
+            return b""
+        data = self.partial + data
+        usable = len(data) - len(data) % PACKET
+        self.partial = data[usable:]
+        return data[:usable]
+
+
+# ------------------------
+# One delayed output
+# ------------------------
+
+def _udp_target(url: str) -> Tuple[Tuple[str, int], dict]:
+    """
+    (host, port) and ffmpeg-style options (ttl, pkt_size, localaddr) of a
+    udp:// URL.
+    """
+    parts = urlsplit(url)
+    if parts.scheme != "udp" or not parts.hostname or not parts.port:
+        raise ValueError(f"Not a udp://host:port URL: {url!r}")
+    options = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+    return (parts.hostname, parts.port), options
+
+
+class DelayOutput:
+    """
+    Plays the channel's recording `profile.delay_minutes` behind the wall
+    clock to the profile's UDP URL. fill() reads ahead into a queue of
+    (due time, packet); send() sends what is due, 7 packets per datagram.
+    """
+
+    def __init__(self, engine: "PlayoutEngine", profile: TimeShiftProfile, url: str):
+        self.engine = engine
+        self.profile = profile
+        self.delay = timedelta(minutes=profile.delay_minutes)
+        self.addr, options = _udp_target(url)
+        pkt_size = int(options.get("pkt_size", PACKET * 7))
+        self.per_datagram = max(1, pkt_size // PACKET)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if options.get("localaddr"):
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(options["localaddr"]))
+        # ffmpeg's default multicast TTL is 16, keep outputs interchangeable.
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, int(options.get("ttl", 16)))
+
+        self.queue: Deque[Tuple[float, bytes]] = deque()
+        self.waiting_until = 0.0
+
+        # Current source: a recorded segment, or the slate while a hole lasts.
+        self.seg_start: Optional[datetime] = None
+        self.path: Optional[str] = None
+        self.offset = 0
+        self.remux: Optional[_Remux] = None  # for fragmented MP4 segments
+        self.origin = 0.0  # wall time the source's first PCR is due
+        self.first_pcr: Optional[int] = None
+        self.slate_until: Optional[float] = None
+        self.after_slate: Optional[Tuple[datetime, str]] = None
+
+        # Pacing
+        self.pcr_pid: Optional[int] = None
+        self.last_pcr: Optional[int] = None
+        self.last_due: Optional[float] = None
+        self.pending: List[bytes] = []
+
+        self.packets_sent = 0
+        self.resyncs = 0
+        self.gaps = 0
+
+    def __repr__(self) -> str:
+        return f"+{self.profile.delay_minutes}min -> {self.addr[0]}:{self.addr[1]}"
+
+    def close(self) -> None:
+        self._close_remux()
+        self.sock.close()
+
+    # --- sources ---
+
+    def _close_remux(self) -> None:
+        if self.remux is not None:
+            self.remux.close()
+            self.remux = None
+
+    def _open(self, path: str, origin: float, offset: int = 0, seconds: float = 0.0) -> None:
+        """
+        Play `path` from byte `offset` (TS), or from the fragment at
+        `seconds` (fragmented MP4), its first PCR due at `origin`.
+        """
+        self._close_remux()
+        self.path, self.offset, self.origin = path, offset, origin
+        self.first_pcr = None
+        self.last_pcr = None
+        self.pcr_pid = None
+        if path.endswith(".mp4"):
+            # The PCR comes out of the remux: _feed() picks it up.
+            self.remux = _Remux(path, seconds)
+            self.origin += self.remux.start
+            return
+        head = self.engine.window.get(path, 0, id(self))
+        for i in range(0, len(head) - PACKET + 1, PACKET):
+            pcr = packet_pcr(head[i:i + PACKET]) if head[i] == SYNC else None
+            if pcr is not None:
+                self.first_pcr = pcr
+                self.pcr_pid = ((head[i + 1] & 0x1F) << 8) | head[i + 2]
+                break
+        if self.first_pcr is None:
+            raise TsError(f"{path}: no PCR in the first {len(head)} bytes")
+
+    def start(self, now: float) -> None:
+        """
+        Begin at the keyframe at or before (now - delay).
+        """
+        job = FFmpegJobConfig(channel=self.engine.channel, purpose="playback")
+        target = job._playback_target(self.profile)
+        seg_start, path = job._find_segment_at(target)
+        offset = 0
+        seconds = (target - seg_start).total_seconds()
+        if seconds > 0 and path.suffix == ".ts":
+            with TsFile(path) as ts:
+                offset = ts.keyframe_before(ts.offset_at(seconds))
+        self.seg_start = seg_start
+        self._open(str(path), _epoch(seg_start) + self.delay.total_seconds(), offset, seconds)
+        if self.remux is not None:
+            logger.info("%r: starting in %s at %.1fs", self, path.name, self.remux.start)
+        else:
+            logger.info("%r: starting in %s at byte %d", self, path.name, offset)
+
+    def _next_segment(self, now: float) -> bool:
+        """
+        Move on after the current source ended. Returns False while there is
+        nothing to play yet.
+        """
+        if self.slate_until is not None:
+            if self.last_due is not None and self.last_due < self.slate_until:
+                self._open(self.engine.slate_path(), self.last_due)  # loop the slate
+                return True
+            self.slate_until = None
+            seg_start, path = self.after_slate
+            self.after_slate = None
+            self._switch(seg_start, path, _epoch(seg_start) + self.delay.total_seconds())
+            return True
+
+        found = self.engine.segment_after(self.seg_start)
+        if found is None:
+            return False  # still recording this one, or the recording stopped
+        seg_start, path = found
+        nominal = _epoch(seg_start) + self.delay.total_seconds()
+        holes = self.engine.holes_between(self.seg_start, seg_start)
+        if holes is None:
+            # Not in the continuity map (yet): judge by the segment names.
+            gap = self.last_due is not None and nominal - self.last_due > settings.TRANSCODER_COVERAGE_GAP_SECONDS
+        else:
+            gap = bool(holes) and self.last_due is not None and nominal > self.last_due
+        if not gap:
+            # Back to back (or overlapping after a recorder restart): continue seamlessly.
+            self._switch(seg_start, str(path), self.last_due if self.last_due is not None else nominal)
+            return True
+
+        self.gaps += 1
+        logger.warning("%r: recording gap of %.0fs before %s", self, nominal - self.last_due, path.name)
+        if self.profile.gap_mode == GapMode.SLATE:
+            try:
+                slate = self.engine.slate_path()
+            except (OSError, subprocess.SubprocessError) as exc:
+                logger.error("%r: no slate (%s), leaving the gap silent", self, exc)
+            else:
+                self.slate_until = nominal
+                self.after_slate = (seg_start, str(path))
+                self._open(slate, self.last_due)
+                return True
+        self._switch(seg_start, str(path), nominal)
+        return True
+
+    def _switch(self, seg_start: datetime, path: str, origin: float) -> None:
+        self.seg_start = seg_start
+        self._open(path, origin)
+
+    def _recorded_past(self) -> bool:
+        return self.engine.segment_after(self.seg_start) is not None
+
+    # --- pacing ---
+
+    def _due(self, pcr: int, now: float) -> float:
+        if self.last_pcr is not None:
+            delta = (pcr - self.last_pcr) % PTS_WRAP
+            if delta > PCR_MAX_GAP * PTS_HZ:
+                # Discontinuity inside the source: carry on from the last packet.
+                raw = self.origin + ((pcr - self.first_pcr) % PTS_WRAP) / PTS_HZ
+                self.origin += self.last_due + PCR_INTERVAL - raw
+        due = self.origin + ((pcr - self.first_pcr) % PTS_WRAP) / PTS_HZ
+        if due < now - LATE_RESYNC:
+            # Start-up inside a segment, or we stalled: shift rather than burst.
+            self.origin += now - due
+            due = now
+            self.resyncs += 1
+        return due
+
+    def _schedule(self, due: float) -> None:
+        """
+        Spread the packets since the previous PCR evenly up to `due`.
+        """
+        start = self.last_due if self.last_due is not None else due
+        n = len(self.pending)
+        for k, pkt in enumerate(self.pending, start=1):
+            self.queue.append((start + (due - start) * k / n, pkt))
+        self.pending = []
+        self.last_due = due
+
+    def _feed(self, data: bytes, now: float) -> bool:
+        """
+        Queue the packets of `data`; False once the slate has filled the hole.
+        """
+        for i in range(0, len(data) - PACKET + 1, PACKET):
+            pkt = data[i:i + PACKET]
+            if pkt[0] != SYNC:
+                continue
+            self.pending.append(pkt)
+            pid = (pkt[1] & 0x1F) << 8 | pkt[2]
+            if self.pcr_pid is not None and pid != self.pcr_pid:
+                continue
+            pcr = packet_pcr(pkt)
+            if pcr is None:
+                continue
+            if self.pcr_pid is None:
+                self.pcr_pid, self.first_pcr = pid, pcr  # remuxed source
+            due = self._due(pcr, now)
+            if self.slate_until is not None and due >= self.slate_until:
+                self.pending = []
+                self.last_due = self.slate_until
+                return False
+            self._schedule(due)
+            self.last_pcr = pcr
+        return True
+
+    def fill(self, now: float) -> None:
+        horizon = now + LOOKAHEAD
+        while (not self.queue or self.queue[-1][0] < horizon) and self.waiting_until <= now:
+            if self.path is None:
+                try:
+                    self.start(now)
+                except (OSError, TsError, Mp4Error) as exc:
+                    logger.warning("%r: nothing to play yet: %s", self, exc)
+                    self.waiting_until = now + WAIT_RETRY * 5
+                continue
+
+            if self.remux is not None:
+                try:
+                    data = self.remux.pump(self.engine.window, id(self), self._recorded_past)
+                except (OSError, Mp4Error) as exc:
+                    logger.warning("%r: cannot remux %s: %s", self, self.path, exc)
+                    data, self.remux.done = b"", True
+                if not data and not self.remux.done:
+                    self.waiting_until = now + (WAIT_RETRY if self.remux.starved else REMUX_POLL)
+                    continue
+            else:
+                index, skip = divmod(self.offset, CHUNK_BYTES)
+                try:
+                    data = self.engine.window.get(self.path, index, id(self))[skip:]
+                except OSError as exc:
+                    logger.warning("%r: cannot read %s: %s", self, self.path, exc)
+                    data = b""
+                data = data[:len(data) - len(data) % PACKET]
+                self.offset += len(data)
+            if data:
+                if self._feed(data, now):
+                    continue
+            elif self.pending and self.last_due is not None:
+                self._schedule(self.last_due)  # flush the tail of the source
+
+            try:
+                moved = self._next_segment(now)
+            except (OSError, TsError, Mp4Error) as exc:
+                logger.warning("%r: %s", self, exc)
+                moved = False
+            if not moved:
+                self.waiting_until = now + WAIT_RETRY
+
+    def send(self, now: float) -> Optional[float]:
+        """
+        Send every datagram that is due; returns when the next one is.
+        """
+        queue = self.queue
+        while queue and queue[0][0] <= now:
+            packets = [queue.popleft()[1] for _ in range(min(self.per_datagram, len(queue)))]
+            try:
+                self.sock.sendto(b"".join(packets), self.addr)
+            except OSError as exc:
+                logger.warning("%r: send failed: %s", self, exc)
+            self.packets_sent += len(packets)
+        return queue[0][0] if queue else None
+
+
+# ------------------------
+# Engine
+# ------------------------
+
+class PlayoutEngine:
+    """
+    Runs the DelayOutputs of one channel from a single loop: keep each
+    output's queue filled LOOKAHEAD seconds ahead, send what is due, sleep
+    until the next datagram. Profiles are re-read every PROFILE_REFRESH
+    seconds, so delays can be added, changed or disabled while it runs.
+    """
+
+    def __init__(self, channel: Channel, output_interface: Optional[str] = None,
+                 window_bytes: Optional[int] = None):
+        self.channel = channel
+        self.output_interface = output_interface
+        self.window = ChunkWindow(window_bytes or settings.TRANSCODER_PLAYOUT_WINDOW_MB * 1024 * 1024)
+        self.outputs: Dict[tuple, DelayOutput] = {}
+        self._slate: Optional[str] = None
+        self._stop = False
+        self._next_refresh = 0.0
+        self._segments: Dict[datetime, Optional[Tuple[datetime, Path]]] = {}
+        self._holes: Dict[Tuple[datetime, datetime], List[Span]] = {}
+
+    def stop(self) -> None:
+        self._stop = True
+
+    def refresh(self) -> None:
+        close_old_connections()
+        profiles = list(TimeShiftProfile.objects.filter(channel=self.channel, enabled=True))
+        job = FFmpegJobConfig(channel=self.channel, purpose="playback", output_interface=self.output_interface)
+        wanted = {}
+        for profile in profiles:
+            url = job._udp_output_url(profile.output_udp_url)
+            wanted[(profile.pk, profile.delay_minutes, url, profile.gap_mode)] = (profile, url)
+        for key in [k for k in self.outputs if k not in wanted]:
+            logger.info("Stopping %r", self.outputs[key])
+            self.outputs.pop(key).close()
+        for key, (profile, url) in wanted.items():
+            if key not in self.outputs:
+                try:
+                    self.outputs[key] = DelayOutput(self, profile, url)
+                except (OSError, ValueError) as exc:
+                    logger.error("Time-shift profile %s: %s", profile.pk, exc)
+                    continue
+                logger.info("Serving %r", self.outputs[key])
+        self.window.readers = max(1, len(self.outputs))
+        self.window.close_unused({out.path for out in self.outputs.values()})
+
+    def segment_after(self, seg_start: datetime) -> Optional[Tuple[datetime, Path]]:
+        """
+        First recorded segment starting after `seg_start`. Shared by the
+        outputs, which all walk the same sequence; a miss is not cached.
+        """
+        if seg_start in self._segments:
+            return self._segments[seg_start]
+        segments = recording_segments(self.channel, seg_start + timedelta(seconds=1), seg_start + timedelta(days=1))
+        following = [(start, path) for start, path in segments if start > seg_start]
+        if not following:
+            return None
+        if len(self._segments) > 1000:
+            self._segments.clear()
+        self._segments[seg_start] = following[0]
+        return following[0]
+
+    def holes_between(self, seg_start: datetime, next_start: datetime) -> Optional[List[Span]]:
+        """
+        Holes in the continuity map between the segment starting at
+        `seg_start` and the one starting at `next_start`, or None if the map
+        does not cover both (not indexed yet, or no continuity consumer).
+        """
+        key = (seg_start, next_start)
+        if key in self._holes:
+            return self._holes[key]
+        tolerance = timedelta(seconds=settings.TRANSCODER_COVERAGE_GAP_SECONDS)
+        spans = timeline(
+            self.channel, timezone.make_aware(seg_start), timezone.make_aware(next_start) + tolerance
+        )
+        if not (spans[0].covered and spans[-1].covered):
+            return None
+        if len(self._holes) > 1000:
+            self._holes.clear()
+        self._holes[key] = [span for span in spans if not span.covered]
+        return self._holes[key]
+
+    def slate_path(self) -> str:
+        """
+        TRANSCODER_SLATE_FILE, or a short black/silent loop rendered once.
+        """
+        if settings.TRANSCODER_SLATE_FILE:
+            return str(settings.TRANSCODER_SLATE_FILE)
+        if self._slate is None:
+            path = Path(settings.TRANSCODER_STATE_DIR) / "slate.ts"
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(f".{path.name}.{os.getpid()}.part")
+                subprocess.run(
+                    ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+                     "-f", "lavfi", "-i", "color=c=black:s=1280x720:r=25",
+                     "-f", "lavfi", "-i", "anullsrc=r=48000:cl=stereo",
+                     "-t", "2", "-c:v", "libx264", "-g", "25", "-c:a", "aac", "-f", "mpegts", str(tmp)],
+                    stdin=subprocess.DEVNULL, capture_output=True, check=True,
+                )
+                os.replace(tmp, path)
+            self._slate = str(path)
+        return self._slate
+
+    def stats(self) -> dict:
+        total = self.window.hits + self.window.reads
+        return {
+            "outputs": len(self.outputs),
+            "packets_sent": sum(o.packets_sent for o in self.outputs.values()),
+            "bytes_read": self.window.bytes_read,
+            "window_hit_ratio": self.window.hits / total if total else 0.0,
+            "resyncs": sum(o.resyncs for o in self.outputs.values()),
+            "gaps": sum(o.gaps for o in self.outputs.values()),
+        }
+
+    def run(self, on_tick=None, tick_seconds: float = 1.0) -> None:
+        next_tick = time.time() + tick_seconds
+        try:
+            while not self._stop:
+                now = time.time()
+                if now >= self._next_refresh:
+                    self.refresh()
+                    self._next_refresh = now + PROFILE_REFRESH
+                if on_tick is not None and now >= next_tick:
+                    on_tick(self.stats())
+                    next_tick = now + tick_seconds
+
+                wake = now + 0.1
+                for out in self.outputs.values():
+                    out.fill(now)
+                    due = out.send(time.time())
+                    if due is not None:
+                        wake = min(wake, due)
+                    elif out.waiting_until > now:
+                        wake = min(wake, out.waiting_until)
+                delay = wake - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+        finally:
+            for out in self.outputs.values():
+                out.close()
+            self.window.close()
@@ -0,0 +1,369 @@
+# transcoder/previews.py
+"""
+Preview images for the admin overview: a thumbnail of what each live channel
+shows, and a sprite sheet (a grid of tiles, one every
+TRANSCODER_PREVIEW_SPRITE_INTERVAL seconds) per recorded segment.
+
+Previews must stay cheap whatever the number of channels:
+
+- ffmpeg decodes keyframes only (-skip_frame nokey): a thumbnail costs one
+  I-frame and a sprite one decode per GOP, never a full decode;
+- a pass (transcoder_previews) does a fixed amount of work, the
+  TRANSCODER_PREVIEW_LIVE_PER_PASS stalest thumbnails and the
+  TRANSCODER_PREVIEW_SPRITES_PER_PASS newest segments without a sprite, on
+  TRANSCODER_PREVIEW_WORKERS ffmpeg processes at idle priority. More
+  channels make thumbnails refresh less often, not cost more;
+- images live in an LRU disk cache under TRANSCODER_PREVIEW_DIR. Serving
+  one marks it used (its atime), and the least recently used go once the
+  cache outgrows TRANSCODER_PREVIEW_CACHE_MB.
+
+Live channels are those the enforcer runs a live or record job for, as
+listed in its status snapshot. Segments come from the continuity map
+(RecordingSegment), so sprites need "transcoder.continuity.continuity_consumer"
+in TRANSCODER_SEGMENT_CONSUMERS.
+"""
+import json
+import logging
+import math
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .ffmpeg_runner import FFmpegJobConfig
+from .live_status import status_path
+from .models import Channel, RecordingSegment
+from .staging import current_path
+
+logger = logging.getLogger(__name__)
+
+THUMB_WIDTH = 320
+TILE_WIDTH = 160
+SPRITE_COLUMNS = 10
+SPRITE_SCAN = 50  # segments looked at per sprite a pass may build
+LIVE_PURPOSES = ("live_forward", "record")
+
+
+def preview_root() -> Path:
+    return Path(settings.TRANSCODER_PREVIEW_DIR)
+
+
+def live_path(channel_id: int) -> Path:
+    return preview_root() / "live" / f"{channel_id}.jpg"
+
+
+def sprite_path(channel_id: int, segment: str) -> Path:
+    return preview_root() / "sprites" / str(channel_id) / f"{Path(segment).stem}.jpg"
+
+
+# ------------------------
+# ffmpeg
+# ------------------------
+
+def _image_output(output: Path) -> List[str]:
+    # Explicit muxer and codec: the temporary name has no .jpg extension.
+    return ["-q:v", "5", "-pix_fmt", "yuvj420p", "-f", "image2", "-c:v", "mjpeg", "-update", "1", str(output)]
+
+
+def build_thumbnail_cmd(source: str, output: Path) -> List[str]:
+    return [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-nostdin",
+        "-skip_frame", "nokey", "-i", source,
+        "-map", "0:v:0", "-frames:v", "1", "-vf", f"scale={THUMB_WIDTH}:-2",
+    ] + _image_output(output)
+
+
+def sprite_grid(duration: float, interval: float) -> tuple:
+    """
+    (tiles, columns, rows) of the sprite of a `duration`-second segment.
+    """
+    tiles = max(1, math.ceil(duration / interval))
+    columns = min(tiles, SPRITE_COLUMNS)
+    return tiles, columns, math.ceil(tiles / columns)
+
+
+def build_sprite_cmd(source: str, output: Path, duration: float, interval: float) -> List[str]:
+    _, columns, rows = sprite_grid(duration, interval)
+    # Of the keyframes, the first one at least `interval` after the previous tile
+    # (a little less, so a keyframe cadence that divides it is not skipped).
+    select = f"select='isnan(prev_selected_t)+gte(t-prev_selected_t\\,{max(interval - 0.1, 0.1)})'"
+    return [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-nostdin",
+        "-skip_frame", "nokey", "-i", source,
+        "-map", "0:v:0", "-vf", f"{select},scale={TILE_WIDTH}:-2,tile={columns}x{rows}",
+        "-fps_mode", "vfr", "-frames:v", "1",
+    ] + _image_output(output)
+
+
+def _lower_priority() -> None:
+    """
+    preexec_fn for preview ffmpegs: nice, and the idle scheduling class
+    where available.
+    """
+    try:
+        os.nice(settings.TRANSCODER_PREVIEW_NICE)
+        if hasattr(os, "SCHED_IDLE"):
+            os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+    except OSError:
+        pass
+
+
+@dataclass
+class PreviewTask:
+    kind: str  # "live" or "sprite"
+    channel_id: int
+    source: str  # input URL, or segment path
+    output: Path
+    duration: float = 0.0  # sprite: seconds in the segment
+    meta: Optional[dict] = None  # sprite: written next to the image
+
+    def command(self, tmp: Path) -> List[str]:
+        if self.kind == "live":
+            return build_thumbnail_cmd(self.source, tmp)
+        return build_sprite_cmd(self.source, tmp, self.duration, self.meta["interval"])
+
+
+def run_task(task: PreviewTask) -> bool:
+    """
+    Render one preview; it replaces the previous image atomically.
+    """
+    tmp = task.output.with_name(f".{task.output.name}.part")
+    try:
+        tmp.parent.mkdir(parents=True, exist_ok=True)
+        proc = subprocess.run(
+            task.command(tmp),
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            timeout=settings.TRANSCODER_PREVIEW_TIMEOUT,
+            preexec_fn=_lower_priority,
+        )
+        if proc.returncode != 0 or not tmp.exists():
+            stderr = proc.stderr.strip().splitlines()
+            logger.warning("Preview of %s failed: %s", task.source, stderr[-1] if stderr else proc.returncode)
+            return False
+        if task.meta is not None:
+            task.output.with_suffix(".json").write_text(json.dumps(task.meta))
+        os.replace(tmp, task.output)
+        return True
+    except subprocess.TimeoutExpired:
+        logger.warning("Preview of %s timed out", task.source)
+        return False
+    except OSError as exc:
+        logger.warning("Preview of %s failed: %s", task.source, exc)
+        return False
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+# ------------------------
+# Cache
+# ------------------------
+
+def mark_used(path: Path) -> None:
+    """
+    Record a view for the LRU (atime; mtime stays when the image was made).
+    """
+    try:
+        os.utime(path, (time.time(), path.stat().st_mtime))
+    except OSError:
+        pass
+
+
+def evict_previews(max_bytes: Optional[int] = None) -> int:
+    """
+    Remove the least recently used images (and their metadata) until the
+    cache fits `max_bytes` (default TRANSCODER_PREVIEW_CACHE_MB). Returns
+    how many were removed.
+    """
+    if max_bytes is None:
+        max_bytes = settings.TRANSCODER_PREVIEW_CACHE_MB * 1024 * 1024
+    entries = []
+    total = 0
+    for folder, _, files in os.walk(preview_root()):
+        for name in files:
+            if not name.endswith(".jpg"):
+                continue
+            path = Path(folder) / name
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_atime, st.st_size, path))
+            total += st.st_size
+    if total <= max_bytes:
+        return 0
+    entries.sort(key=lambda e: e[0])
+    removed = 0
+    for _, size, path in entries:
+        path.unlink(missing_ok=True)
+        path.with_suffix(".json").unlink(missing_ok=True)
+        removed += 1
+        total -= size
+        if total <= max_bytes:
+            break
+    return removed
+
+
+# ------------------------
+# Passes
+# ------------------------
+
+def live_channel_ids() -> List[int]:
+    """
+    Channels the enforcer runs a live or record job for.
+    """
+    try:
+        data = json.loads(status_path().read_text())
+    except (OSError, ValueError):
+        return []
+    return sorted({
+        job["channel_id"] for job in data.get("jobs", {}).values()
+        if job.get("purpose") in LIVE_PURPOSES and "channel_id" in job
+    })
+
+
+@dataclass
+class PassResult:
+    thumbnails: int = 0
+    sprites: int = 0
+    failed: int = 0
+    evicted: int = 0
+    seconds: float = 0.0
+
+
+class PreviewService:
+    """
+    Plans and runs preview passes. Keeps, across passes, when each channel's
+    thumbnail was last attempted (a dead input is not retried first every
+    pass) and the sprites that failed.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or settings.TRANSCODER_PREVIEW_WORKERS
+        self._attempted: Dict[int, float] = {}
+        self._failed: set = set()
+
+    def live_tasks(self, now: float) -> List[PreviewTask]:
+        """
+        The stalest live thumbnails older than TRANSCODER_PREVIEW_LIVE_INTERVAL.
+        """
+        due = []
+        for channel_id in live_channel_ids():
+            try:
+                made = live_path(channel_id).stat().st_mtime
+            except OSError:
+                made = 0.0
+            last = max(made, self._attempted.get(channel_id, 0.0))
+            if now - last >= settings.TRANSCODER_PREVIEW_LIVE_INTERVAL:
+                due.append((last, channel_id))
+        due.sort()
+        picked = [channel_id for _, channel_id in due[:settings.TRANSCODER_PREVIEW_LIVE_PER_PASS]]
+        channels = Channel.objects.in_bulk(picked)
+        tasks = []
+        for channel_id in picked:
+            chan = channels.get(channel_id)
+            if chan is None:
+                continue
+            self._attempted[channel_id] = now
+            try:
+                source = FFmpegJobConfig(channel=chan, purpose="live_forward")._resolve_input_url_for_live()
+            except ValueError as exc:
+                logger.warning("No preview of %s: %s", chan.name, exc)
+                continue
+            tasks.append(PreviewTask("live", channel_id, source, live_path(channel_id)))
+        return tasks
+
+    def sprite_tasks(self) -> List[PreviewTask]:
+        """
+        The newest recorded segments of the lookback window without a sprite.
+        """
+        limit = settings.TRANSCODER_PREVIEW_SPRITES_PER_PASS
+        interval = settings.TRANSCODER_PREVIEW_SPRITE_INTERVAL
+        cutoff = timezone.now() - timedelta(hours=settings.TRANSCODER_PREVIEW_SPRITE_LOOKBACK_HOURS)
+        rows = (
+            RecordingSegment.objects.filter(end_at__gte=cutoff)
+            .order_by("-end_at")
+            .values_list("channel_id", "path", "start_at", "end_at")[:limit * SPRITE_SCAN]
+        )
+        tasks = []
+        for channel_id, path, start_at, end_at in rows:
+            output = sprite_path(channel_id, path)
+            if output in self._failed or output.exists():
+                continue
+            duration = (end_at - start_at).total_seconds()
+            tiles, columns, _ = sprite_grid(duration, interval)
+            tasks.append(PreviewTask(
+                "sprite", channel_id, str(current_path(path)), output, duration,
+                meta={
+                    "segment": Path(path).name,
+                    "start_at": start_at.isoformat(),
+                    "interval": interval,
+                    "tiles": tiles,
+                    "columns": columns,
+                },
+            ))
+            if len(tasks) >= limit:
+                break
+        return tasks
+
+    def run_pass(self) -> PassResult:
+        started = time.monotonic()
+        result = PassResult()
+        tasks = self.live_tasks(time.time()) + self.sprite_tasks()
+        if tasks:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="preview") as pool:
+                for task, ok in zip(tasks, pool.map(run_task, tasks)):
+                    if not ok:
+                        result.failed += 1
+                        if task.kind == "sprite":
+                            if len(self._failed) > 10000:
+                                self._failed.clear()
+                            self._failed.add(task.output)
+                    elif task.kind == "live":
+                        result.thumbnails += 1
+                    else:
+                        result.sprites += 1
+        result.evicted = evict_previews()
+        result.seconds = time.monotonic() - started
+        return result
+
+
+# ------------------------
+# Overview
+# ------------------------
+
+def channel_previews(channels: Iterable[Channel], sprites: int = 3) -> Dict[int, dict]:
+    """
+    What the overview shows per channel: its live thumbnail (name relative
+    to the preview root, age in seconds) and its newest `sprites` sprites.
+    """
+    root = preview_root()
+    now = time.time()
+    out = {}
+    for chan in channels:
+        entry = {"live": None, "sprites": []}
+        try:
+            entry["live"] = {"name": f"live/{chan.id}.jpg", "age": now - live_path(chan.id).stat().st_mtime}
+        except OSError:
+            pass
+        folder = root / "sprites" / str(chan.id)
+        try:
+            names = sorted(name for name in os.listdir(folder) if name.endswith(".jpg"))[-sprites:]
+        except OSError:
+            names = []
+        for name in reversed(names):
+            try:
+                meta = json.loads((folder / name).with_suffix(".json").read_text())
+            except (OSError, ValueError):
+                meta = {}
+            entry["sprites"].append({"name": f"sprites/{chan.id}/{name}", **meta})
+        out[chan.id] = entry
+    return out
@@ -0,0 +1,347 @@
+# transcoder/procstats.py
+import json
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Deque, Dict, Hashable, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .profiling import state_dir
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+AVAILABLE = os.path.isdir("/proc/self")
+
+
+@dataclass
+class JobUsage:
+    """
+    Rates over the last sampling interval (cpu_percent: 100 = one core).
+    """
+    cpu_percent: float = 0.0
+    rss_bytes: int = 0
+    read_bps: float = 0.0  # storage reads (/proc/<pid>/io read_bytes)
+    write_bps: float = 0.0  # storage writes (write_bytes)
+    rchar_bps: float = 0.0  # all read()-family syscalls, pipes and files included
+    wchar_bps: float = 0.0
+
+
+class _ProcFiles:
+    """
+    Open descriptors on one process's stat, statm and io files. They are kept
+    open for the life of the job and re-read with pread(), which saves three
+    open/close pairs per job per sample. Once the process is reaped the reads
+    fail with ESRCH, so a recycled pid can never be mistaken for the job.
+    """
+
+    __slots__ = ("pid", "stat", "statm", "io", "last")
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        base = f"/proc/{pid}/"
+        self.stat = os.open(base + "stat", os.O_RDONLY)
+        self.statm = os.open(base + "statm", os.O_RDONLY)
+        try:
+            self.io = os.open(base + "io", os.O_RDONLY)
+        except OSError:
+            self.io = None  # io needs ptrace access; other users' processes hide it
+        self.last = None  # (monotonic, cpu_ticks, read_bytes, write_bytes, rchar, wchar)
+
+    def read(self):
+        now = time.monotonic()
+        stat = os.pread(self.stat, 1024, 0)
+        # comm may contain spaces and parentheses: split after the last ")".
+        fields = stat[stat.rindex(b")") + 2:].split()
+        cpu_ticks = int(fields[11]) + int(fields[12])  # utime + stime
+        rss = int(os.pread(self.statm, 256, 0).split()[1]) * PAGE_SIZE
+
+        io = {}
+        if self.io is not None:
+            for line in os.pread(self.io, 512, 0).splitlines():
+                name, _, value = line.partition(b":")
+                io[name] = int(value)
+        return (
+            now,
+            cpu_ticks,
+            rss,
+            io.get(b"read_bytes", 0),
+            io.get(b"write_bytes", 0),
+            io.get(b"rchar", 0),
+            io.get(b"wchar", 0),
+        )
+
+    def close(self) -> None:
+        for fd in (self.stat, self.statm, self.io):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+
+
+class _Rolling:
+    """
+    Fixed-length window of JobUsage samples with average and peak.
+    """
+
+    __slots__ = ("samples",)
+
+    def __init__(self, maxlen: int):
+        self.samples: Deque[JobUsage] = deque(maxlen=maxlen)
+
+    def add(self, usage: JobUsage) -> None:
+        self.samples.append(usage)
+
+    def summary(self) -> dict:
+        n = len(self.samples)
+        if not n:
+            return {}
+        return {
+            "cpu_percent": self.samples[-1].cpu_percent,
+            "cpu_percent_avg": sum(s.cpu_percent for s in self.samples) / n,
+            "cpu_percent_max": max(s.cpu_percent for s in self.samples),
+            "rss_bytes": self.samples[-1].rss_bytes,
+            "rss_bytes_max": max(s.rss_bytes for s in self.samples),
+            "read_bps_avg": sum(s.read_bps for s in self.samples) / n,
+            "write_bps_avg": sum(s.write_bps for s in self.samples) / n,
+            "rchar_bps_avg": sum(s.rchar_bps for s in self.samples) / n,
+            "wchar_bps_avg": sum(s.wchar_bps for s in self.samples) / n,
+            "samples": n,
+        }
+
+
+class _Bucket:
+    """
+    Accumulates one channel's usage for one history bucket.
+    """
+
+    __slots__ = ("start", "n", "cpu_sum", "cpu_max", "rss_max", "read_sum", "write_sum")
+
+    def __init__(self, start: datetime):
+        self.start = start
+        self.n = 0
+        self.cpu_sum = 0.0
+        self.cpu_max = 0.0
+        self.rss_max = 0
+        self.read_sum = 0.0
+        self.write_sum = 0.0
+
+    def add(self, usage: JobUsage) -> None:
+        self.n += 1
+        self.cpu_sum += usage.cpu_percent
+        self.cpu_max = max(self.cpu_max, usage.cpu_percent)
+        self.rss_max = max(self.rss_max, usage.rss_bytes)
+        self.read_sum += usage.read_bps
+        self.write_sum += usage.write_bps
+
+
+class ProcSampler:
+    """
+    CPU, memory and I/O accounting for supervised ffmpeg processes.
+
+    sample() reads every tracked job in one pass (three pread() calls each)
+    and updates:
+      - per-job rolling windows (last `window` seconds),
+      - per-channel totals (a channel may run several jobs, e.g. record +
+        playback),
+      - per-channel history buckets of `bucket_seconds`, written to
+        ChannelResourceSample by flush_history().
+    """
+
+    def __init__(
+        self,
+        window: Optional[float] = None,
+        interval: Optional[float] = None,
+        bucket_seconds: Optional[int] = None,
+    ):
+        window = window or settings.TRANSCODER_PROC_WINDOW_SECONDS
+        interval = interval or settings.TRANSCODER_PROC_SAMPLE_INTERVAL
+        self.bucket_seconds = bucket_seconds or settings.TRANSCODER_PROC_HISTORY_BUCKET_SECONDS
+        self.maxlen = max(1, int(window / interval))
+        self._files: Dict[Hashable, _ProcFiles] = {}
+        self._channel_of: Dict[Hashable, int] = {}
+        self._rolling: Dict[Hashable, _Rolling] = {}
+        self.current: Dict[Hashable, JobUsage] = {}
+        self._buckets: Dict[int, _Bucket] = {}
+        self._closed: List[tuple] = []  # (channel_id, _Bucket) ready to persist
+
+    def track(self, key: Hashable, pid: int, channel_id: int) -> bool:
+        """
+        Start accounting for a job. Returns False if /proc is unavailable or
+        the process is already gone.
+        """
+        if not AVAILABLE:
+            return False
+        self.untrack(key)
+        try:
+            self._files[key] = _ProcFiles(pid)
+        except OSError:
+            return False
+        self._channel_of[key] = channel_id
+        self._rolling[key] = _Rolling(self.maxlen)
+        return True
+
+    def untrack(self, key: Hashable) -> None:
+        files = self._files.pop(key, None)
+        if files is not None:
+            files.close()
+        self._channel_of.pop(key, None)
+        self._rolling.pop(key, None)
+        self.current.pop(key, None)
+
+    def sample(self, now: Optional[datetime] = None) -> Dict[Hashable, JobUsage]:
+        """
+        One batched pass over all tracked jobs. Jobs whose process has
+        exited are skipped (the enforcer untracks them when it reaps).
+        """
+        now = now or timezone.now()
+        channel_usage: Dict[int, JobUsage] = {}
+        for key, files in self._files.items():
+            try:
+                reading = files.read()
+            except (OSError, ValueError, IndexError):
+                self.current.pop(key, None)
+                continue
+            prev, files.last = files.last, reading
+            if prev is None:
+                continue  # rates need two readings
+
+            elapsed = reading[0] - prev[0]
+            if elapsed <= 0:
+                continue
+            usage = JobUsage(
+                cpu_percent=(reading[1] - prev[1]) / CLK_TCK / elapsed * 100,
+                rss_bytes=reading[2],
+                read_bps=(reading[3] - prev[3]) / elapsed,
+                write_bps=(reading[4] - prev[4]) / elapsed,
+                rchar_bps=(reading[5] - prev[5]) / elapsed,
+                wchar_bps=(reading[6] - prev[6]) / elapsed,
+            )
+            self.current[key] = usage
+            self._rolling[key].add(usage)
+
+            total = channel_usage.setdefault(self._channel_of[key], JobUsage())
+            total.cpu_percent += usage.cpu_percent
+            total.rss_bytes += usage.rss_bytes
+            total.read_bps += usage.read_bps
+            total.write_bps += usage.write_bps
+            total.rchar_bps += usage.rchar_bps
+            total.wchar_bps += usage.wchar_bps
+
+        self._accumulate(now, channel_usage)
+        return self.current
+
+    def _accumulate(self, now: datetime, channel_usage: Dict[int, JobUsage]) -> None:
+        epoch = int(now.timestamp())
+        start = datetime.fromtimestamp(epoch - epoch % self.bucket_seconds, tz=dt_timezone.utc)
+        for channel_id in list(self._buckets):
+            bucket = self._buckets[channel_id]
+            if bucket.start != start:
+                self._closed.append((channel_id, self._buckets.pop(channel_id)))
+        for channel_id, usage in channel_usage.items():
+            bucket = self._buckets.get(channel_id)
+            if bucket is None:
+                bucket = self._buckets[channel_id] = _Bucket(start)
+            bucket.add(usage)
+
+    def flush_history(self) -> int:
+        """
+        Persist closed history buckets with one bulk insert and prune rows
+        older than TRANSCODER_PROC_HISTORY_DAYS. Returns the rows written.
+        """
+        from .models import Channel, ChannelResourceSample
+
+        closed, self._closed = self._closed, []
+        if not closed:
+            return 0
+        # Channels may have been deleted while their jobs were running.
+        existing = set(
+            Channel.objects.filter(id__in={c for c, _ in closed}).values_list("id", flat=True)
+        )
+        ChannelResourceSample.objects.bulk_create(
+            [
+                ChannelResourceSample(
+                    channel_id=channel_id,
+                    bucket_start=b.start,
+                    bucket_seconds=self.bucket_seconds,
+                    samples=b.n,
+                    cpu_percent_avg=b.cpu_sum / b.n,
+                    cpu_percent_max=b.cpu_max,
+                    rss_bytes_max=b.rss_max,
+                    read_bps_avg=b.read_sum / b.n,
+                    write_bps_avg=b.write_sum / b.n,
+                )
+                for channel_id, b in closed
+                if b.n and channel_id in existing
+            ],
+            ignore_conflicts=True,  # a restarted enforcer may revisit the same bucket
+        )
+        cutoff = timezone.now() - timedelta(days=settings.TRANSCODER_PROC_HISTORY_DAYS)
+        ChannelResourceSample.objects.filter(bucket_start__lt=cutoff).delete()
+        return len(closed)
+
+    def job_summary(self) -> Dict[Hashable, dict]:
+        return {key: r.summary() for key, r in self._rolling.items() if r.samples}
+
+    def channel_summary(self) -> Dict[int, dict]:
+        """
+        Per-channel sums of the jobs' current usage and rolling averages.
+        """
+        out: Dict[int, dict] = {}
+        for key, summary in self.job_summary().items():
+            total = out.setdefault(self._channel_of[key], {"jobs": 0})
+            total["jobs"] += 1
+            for name, value in summary.items():
+                if name == "samples":
+                    continue
+                total[name] = total.get(name, 0) + value
+        return out
+
+    def close(self) -> None:
+        for key in list(self._files):
+            self.untrack(key)
+
+
+def procstats_path():
+    return state_dir() / "job_resources.json"
+
+
+def read_procstats() -> Optional[dict]:
+    """
+    Latest per-job/per-channel usage written by a running enforcer, or None.
+    """
+    try:
+        data = json.loads(procstats_path().read_text())
+    except (OSError, ValueError):
+        return None
+    data["channels"] = {int(k): v for k, v in data.get("channels", {}).items()}
+    return data
+
+
+def channel_cost_profile(channel_ids=None, days: int = 7) -> Dict[int, dict]:
+    """
+    Average and peak cost of running each channel, from persisted history.
+    Intended for capacity planning: {channel_id: {cpu_percent_avg, ...}}.
+    """
+    from django.db.models import Avg, Max
+
+    from .models import ChannelResourceSample
+
+    qs = ChannelResourceSample.objects.filter(
+        bucket_start__gte=timezone.now() - timedelta(days=days)
+    )
+    if channel_ids is not None:
+        qs = qs.filter(channel_id__in=channel_ids)
+    rows = qs.values("channel_id").annotate(
+        cpu_percent_avg=Avg("cpu_percent_avg"),
+        cpu_percent_max=Max("cpu_percent_max"),
+        rss_bytes_max=Max("rss_bytes_max"),
+        read_bps_avg=Avg("read_bps_avg"),
+        write_bps_avg=Avg("write_bps_avg"),
+    )
+    return {row.pop("channel_id"): row for row in rows}
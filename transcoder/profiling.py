@@ -0,0 +1,333 @@
+# transcoder/profiling.py
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+# Histogram bucket upper bounds in seconds (roughly x2.5 steps), last is +Inf.
+BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"),
+)
+
+METRICS_FILENAME = "enforcer_metrics.json"
+
+
+def state_dir() -> Path:
+    return Path(settings.TRANSCODER_STATE_DIR)
+
+
+def metrics_path() -> Path:
+    return state_dir() / METRICS_FILENAME
+
+
+def write_json_atomic(path: Path, data) -> None:
+    """
+    Write JSON next to `path` and rename it into place, so readers never see
+    a half-written file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data, indent=2, default=str))
+    os.replace(tmp, path)
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram (cumulative counts are computed on export).
+    """
+
+    __slots__ = ("counts", "count", "total", "max", "last")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Upper bound of the bucket holding the q-quantile (None when empty).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return self.max if bound == float("inf") else min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "max": self.max,
+            "last": self.last,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {
+                ("+Inf" if b == float("inf") else repr(b)): n
+                for b, n in zip(BUCKETS, self.counts)
+            },
+        }
+
+
+class _StackSampler(threading.Thread):
+    """
+    Watches the thread running a tick. Once the tick has run for longer than
+    the threshold it samples that thread's stack every `interval` seconds, so
+    fast ticks cost nothing and slow ones show where they were stuck.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        super().__init__(name="tick-stack-sampler", daemon=True)
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._target: Optional[int] = None
+        self._deadline = 0.0
+        self.samples: Counter = Counter()
+
+    def arm(self, thread_id: int, threshold: float) -> None:
+        with self._cond:
+            self.samples = Counter()
+            self._target = thread_id
+            self._deadline = time.monotonic() + threshold
+            self._cond.notify()
+
+    def disarm(self) -> Counter:
+        with self._cond:
+            self._target = None
+            return self.samples
+
+    def run(self) -> None:
+        while True:
+            with self._cond:
+                while self._target is None:
+                    self._cond.wait()
+                target, deadline = self._target, self._deadline
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(min(delay, self.interval * 10))
+                continue
+            frame = sys._current_frames().get(target)
+            if frame is not None:
+                stack = ";".join(
+                    f"{Path(fs.filename).name}:{fs.name}:{fs.lineno}"
+                    for fs in traceback.extract_stack(frame)
+                )
+                with self._cond:
+                    if self._target == target:
+                        self.samples[stack] += 1
+            time.sleep(self.interval)
+
+
+class TickProfiler:
+    """
+    Phase timers for enforcer ticks.
+
+    Usage:
+        with profiler.tick():
+            with profiler.phase("query_oneoff"):
+                ...
+
+    Per-tick phase totals and the whole tick feed Histograms. Ticks slower than
+    `slow_threshold` seconds leave a trace in the state directory: collapsed
+    stack samples (flamegraph input) and, with `cprofile=True`, the cProfile
+    stats of that tick.
+    """
+
+    def __init__(
+        self,
+        slow_threshold: Optional[float] = None,
+        cprofile: bool = False,
+        dump_path: Optional[Path] = None,
+        keep_traces: int = 20,
+    ):
+        self.slow_threshold = slow_threshold
+        self.cprofile = cprofile
+        self.dump_path = dump_path
+        self.keep_traces = keep_traces
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Counter = Counter()
+        self.gauges: Dict[str, float] = {}
+        self.ticks = 0
+        self.slow_ticks = 0
+        self.started_at = timezone.now()
+        self.last_tick: Dict[str, float] = {}
+        self._current: Optional[Dict[str, float]] = None
+        self._sampler: Optional[_StackSampler] = None
+        if slow_threshold:
+            self._sampler = _StackSampler()
+            self._sampler.start()
+
+    def observe(self, name: str, seconds: float) -> None:
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Histogram()
+        hist.observe(seconds)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time a block. Inside a tick, repeated blocks of the same phase (e.g.
+        one lookup per started job) are summed and observed once per tick.
+        """
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            if self._current is not None:
+                self._current[name] = self._current.get(name, 0.0) + elapsed
+            else:
+                self.observe(f"phase.{name}", elapsed)
+
+    @contextmanager
+    def tick(self):
+        self._current = {}
+        profile = cProfile.Profile() if self.cprofile and self.slow_threshold else None
+        if self._sampler is not None:
+            self._sampler.arm(threading.get_ident(), self.slow_threshold)
+        if profile is not None:
+            profile.enable()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            if profile is not None:
+                profile.disable()
+            samples = self._sampler.disarm() if self._sampler is not None else None
+            self.ticks += 1
+            self.observe("tick", elapsed)
+            for name, seconds in self._current.items():
+                self.observe(f"phase.{name}", seconds)
+            self.last_tick = dict(self._current, total=elapsed)
+            self._current = None
+            if self.slow_threshold and elapsed > self.slow_threshold:
+                self.slow_ticks += 1
+                self._write_trace(elapsed, samples, profile)
+            if self.dump_path is not None:
+                self.dump()
+
+    def snapshot(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "started_at": self.started_at.isoformat(),
+            "updated_at": timezone.now().isoformat(),
+            "ticks": self.ticks,
+            "slow_ticks": self.slow_ticks,
+            "slow_threshold": self.slow_threshold,
+            "last_tick": self.last_tick,
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "histograms": {name: h.as_dict() for name, h in sorted(self.histograms.items())},
+        }
+
+    def dump(self) -> None:
+        try:
+            write_json_atomic(self.dump_path, self.snapshot())
+        except OSError:
+            pass  # metrics must never take the enforcer down
+
+    def _write_trace(self, elapsed: float, samples: Optional[Counter], profile) -> None:
+        trace_dir = state_dir() / "slow_ticks"
+        stamp = timezone.now().strftime("%Y%m%d-%H%M%S-%f")
+        try:
+            trace_dir.mkdir(parents=True, exist_ok=True)
+            summary = [
+                f"tick took {elapsed:.3f}s (threshold {self.slow_threshold:.3f}s)",
+                "phases: " + ", ".join(f"{k}={v:.4f}s" for k, v in self.last_tick.items()),
+            ]
+            if samples:
+                # Collapsed stacks: feed to flamegraph.pl / speedscope as-is.
+                lines = [f"{stack} {n}" for stack, n in samples.most_common()]
+                (trace_dir / f"{stamp}.stacks").write_text("\n".join(lines) + "\n")
+            if profile is not None:
+                profile.dump_stats(trace_dir / f"{stamp}.prof")
+                out = io.StringIO()
+                pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(30)
+                summary.append(out.getvalue())
+            (trace_dir / f"{stamp}.txt").write_text("\n".join(summary) + "\n")
+            self._prune_traces(trace_dir)
+        except OSError:
+            pass
+
+    def _prune_traces(self, trace_dir: Path) -> None:
+        stamps = sorted({p.name.split(".", 1)[0] for p in trace_dir.iterdir()})
+        for stale in stamps[:-self.keep_traces] if self.keep_traces else []:
+            for p in trace_dir.glob(f"{stale}.*"):
+                p.unlink(missing_ok=True)
+
+
+def read_metrics() -> Optional[dict]:
+    """
+    Latest metrics written by a running enforcer, or None.
+    """
+    try:
+        return json.loads(metrics_path().read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def to_prometheus(metrics: dict, prefix: str = "transcoder_enforcer") -> str:
+    """
+    Render a metrics snapshot in the Prometheus text exposition format.
+    """
+    lines = [
+        f"# TYPE {prefix}_ticks_total counter",
+        f"{prefix}_ticks_total {metrics.get('ticks', 0)}",
+        f"# TYPE {prefix}_slow_ticks_total counter",
+        f"{prefix}_slow_ticks_total {metrics.get('slow_ticks', 0)}",
+    ]
+    for name, value in sorted(metrics.get("counters", {}).items()):
+        metric = f"{prefix}_{name.replace('.', '_')}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+
+    for name, value in sorted(metrics.get("gauges", {}).items()):
+        metric = f"{prefix}_{name.replace('.', '_')}"
+        lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+
+    metric = f"{prefix}_duration_seconds"
+    lines.append(f"# TYPE {metric} histogram")
+    for name, hist in sorted(metrics.get("histograms", {}).items()):
+        cumulative = 0
+        for bound, n in hist["buckets"].items():
+            cumulative += n
+            lines.append(f'{metric}_bucket{{section="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{section="{name}"}} {hist["sum"]}')
+        lines.append(f'{metric}_count{{section="{name}"}} {hist["count"]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,211 @@
+# transcoder/reconcile.py
+"""
+Reconcile core of the enforcer, free of the ORM. The enforcer loads a
+compact snapshot of the enabled channels and schedules (plain values, no
+model instances); desired_jobs() turns it into the jobs that should run at
+a given time and plan_actions() diffs those against the running jobs. Both
+are pure functions of their arguments built on dict and set lookups, so a
+pass over 100k schedules needs neither a database nor a clock.
+
+Recurring windows are evaluated by recurring_active(), which
+RecurringSchedule.is_active_now() uses too.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+JobKey = Tuple[str, int]  # ("oneoff" or "recurring", schedule_id)
+
+
+class ChannelSnap:
+    """
+    What reconciling needs to know about a channel.
+    """
+
+    __slots__ = ("id", "name", "preroll_seconds", "recording_aligned", "cpu_transcode", "updated_at")
+
+    def __init__(self, id: int, name: str, preroll_seconds: int = 0, recording_aligned: bool = False,
+                 cpu_transcode: bool = False, updated_at: Optional[datetime] = None):
+        self.id = id
+        self.name = name
+        self.preroll_seconds = preroll_seconds
+        self.recording_aligned = recording_aligned
+        self.cpu_transcode = cpu_transcode  # encodes video on the CPU (see encoder_tuning)
+        self.updated_at = updated_at  # tells the enforcer when its Channel instance is stale
+
+
+class OneOffSnap:
+    __slots__ = ("id", "channel", "name", "purpose", "start_at", "end_at", "preroll_seconds")
+
+    def __init__(self, id: int, channel: ChannelSnap, name: str, purpose: str,
+                 start_at: datetime, end_at: datetime, preroll_seconds: Optional[int] = None):
+        self.id = id
+        self.channel = channel
+        self.name = name
+        self.purpose = purpose
+        self.start_at = start_at  # local time
+        self.end_at = end_at
+        self.preroll_seconds = preroll_seconds
+
+
+class RecurringSnap:
+    __slots__ = ("id", "channel", "name", "purpose", "weekdays", "start_time", "end_time",
+                 "date_from", "date_to", "preroll_seconds")
+
+    def __init__(self, id: int, channel: ChannelSnap, name: str, purpose: str, weekdays: Sequence[bool],
+                 start_time: time, end_time: time, date_from: Optional[date] = None,
+                 date_to: Optional[date] = None, preroll_seconds: Optional[int] = None):
+        self.id = id
+        self.channel = channel
+        self.name = name
+        self.purpose = purpose
+        self.weekdays = tuple(weekdays)  # Monday first, like datetime.weekday()
+        self.start_time = start_time
+        self.end_time = end_time
+        self.date_from = date_from
+        self.date_to = date_to
+        self.preroll_seconds = preroll_seconds
+
+
+class Snapshot:
+    """
+    Enabled schedules to reconcile, with their channels. One-off schedules
+    may be limited to those that can be open around the time reconciled.
+    """
+
+    __slots__ = ("channels", "oneoff", "recurring")
+
+    def __init__(self, oneoff: Iterable[OneOffSnap] = (), recurring: Iterable[RecurringSnap] = ()):
+        self.oneoff = list(oneoff)
+        self.recurring = list(recurring)
+        self.channels: Dict[int, ChannelSnap] = {}
+        for sched in self.oneoff + self.recurring:
+            self.channels[sched.channel.id] = sched.channel
+
+
+class DesiredJob:
+    __slots__ = ("channel", "purpose", "schedule", "boundary")
+
+    def __init__(self, channel: ChannelSnap, purpose: str, schedule: str, boundary: datetime):
+        self.channel = channel
+        self.purpose = purpose
+        self.schedule = schedule  # schedule name, for logs and status
+        self.boundary = boundary  # when the job is due (may be ahead, via pre-roll)
+
+
+class Actions:
+    """
+    What the enforcer has to do to reach the desired jobs. Keys are sorted,
+    so equal inputs give equal actions.
+    """
+
+    __slots__ = ("start", "stop", "restart", "reap")
+
+    def __init__(self, start: List[JobKey], stop: List[JobKey], restart: List[JobKey], reap: List[JobKey]):
+        self.start = start  # desired and not running, restarts included
+        self.stop = stop  # running and no longer desired
+        self.restart = restart  # to stop first, then start again
+        self.reap = reap  # desired, but the process has exited
+
+    def __repr__(self) -> str:
+        return f"Actions(start={self.start}, stop={self.stop}, restart={self.restart}, reap={self.reap})"
+
+
+# ------------------------
+# Recurring windows
+# ------------------------
+
+def recurring_active(start_time: time, end_time: time, weekdays: Sequence[bool],
+                     date_from: Optional[date], date_to: Optional[date], now: datetime) -> bool:
+    """
+    Whether a weekly window is open at `now` (local time). start == end is
+    the full day, start > end an overnight window, and the weekday and date
+    range apply to the day the checked instant falls on.
+    """
+    local_date = now.date()
+    if date_from and local_date < date_from:
+        return False
+    if date_to and local_date > date_to:
+        return False
+    if not weekdays[now.weekday()]:
+        return False
+    if start_time == end_time:
+        return True
+    local_time = now.time()
+    if start_time < end_time:
+        return start_time <= local_time < end_time
+    return local_time >= start_time or local_time < end_time
+
+
+def recurring_window_start(start_time: time, end_time: time, now: datetime) -> datetime:
+    """
+    Start of the window occurrence that contains `now`, i.e. the boundary the
+    job was due at. Full-day windows report today's midnight.
+    """
+    if start_time == end_time:
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    start = now.replace(
+        hour=start_time.hour, minute=start_time.minute, second=start_time.second, microsecond=0
+    )
+    if start_time > end_time and now.time() < end_time:
+        # Morning part of an overnight window: it opened yesterday evening.
+        return start - timedelta(days=1)
+    return start
+
+
+# ------------------------
+# Reconcile
+# ------------------------
+
+def _preroll(sched, max_preroll: int) -> timedelta:
+    seconds = sched.preroll_seconds if sched.preroll_seconds is not None else sched.channel.preroll_seconds
+    return timedelta(seconds=min(seconds, max_preroll))
+
+
+def desired_jobs(snapshot: Snapshot, now: datetime, max_preroll: int) -> Dict[JobKey, DesiredJob]:
+    """
+    Jobs that should be running at `now`: open schedules, and those opening
+    within their pre-roll (capped at `max_preroll` seconds).
+    """
+    desired: Dict[JobKey, DesiredJob] = {}
+    for sched in snapshot.oneoff:
+        if sched.start_at - _preroll(sched, max_preroll) <= now < sched.end_at:
+            desired[("oneoff", sched.id)] = DesiredJob(sched.channel, sched.purpose, sched.name, sched.start_at)
+
+    for rs in snapshot.recurring:
+        args = (rs.start_time, rs.end_time, rs.weekdays, rs.date_from, rs.date_to)
+        if recurring_active(*args, now):
+            at = now
+        else:
+            # Not open yet: start early if it opens within the pre-roll.
+            lead = _preroll(rs, max_preroll)
+            if not lead or not recurring_active(*args, now + lead):
+                continue
+            at = now + lead
+        boundary = recurring_window_start(rs.start_time, rs.end_time, at)
+        desired[("recurring", rs.id)] = DesiredJob(rs.channel, rs.purpose, rs.name, boundary)
+    return desired
+
+
+def cpu_transcodes(desired: Mapping[JobKey, DesiredJob], keys: Optional[Iterable[JobKey]] = None) -> int:
+    """
+    Desired jobs (among `keys`) that encode video on the CPU; playback jobs
+    only repeat recorded segments.
+    """
+    jobs = desired.values() if keys is None else (desired[k] for k in keys if k in desired)
+    return sum(1 for job in jobs if job.purpose != "playback" and job.channel.cpu_transcode)
+
+
+def plan_actions(desired: Mapping[JobKey, DesiredJob], running: Mapping[JobKey, bool],
+                 restart: Iterable[JobKey] = ()) -> Actions:
+    """
+    Diff the desired jobs against `running` (job key -> process alive).
+    `restart` are running jobs the caller wants restarted (stalled, too
+    slow); only those still desired and alive are. Exited jobs are reaped
+    and come back on the next pass.
+    """
+    restart_keys = sorted({k for k in restart if k in desired and running.get(k)})
+    restarting = set(restart_keys)
+    start = sorted([k for k in desired if k not in running] + restart_keys)
+    stop = sorted(k for k in running if k not in desired)
+    reap = sorted(k for k, alive in running.items() if not alive and k in desired and k not in restarting)
+    return Actions(start=start, stop=stop, restart=restart_keys, reap=reap)
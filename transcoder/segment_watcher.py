@@ -0,0 +1,448 @@
+# transcoder/segment_watcher.py
+"""
+Segment-close watcher: notices when a recording segment is finished and
+publishes SegmentClosed events to registered consumers (indexer, retention,
+archive transcoder, ...), so nothing has to poll recording folders itself.
+
+Sources:
+- InotifySource: Linux inotify (IN_CLOSE_WRITE / IN_MOVED_TO) over every
+  recording root, watched recursively.
+- PollingSource: fallback for filesystems without inotify (NFS/SMB, Windows);
+  a segment is closed once a newer one exists next to it or it stops changing.
+
+Events are batched and handed to consumers by a single dispatcher thread.
+The queue in between is bounded: when consumers fall behind, the source blocks
+(inotify events then wait in the kernel queue; on overflow we rescan).
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import queue
+import select
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import Channel
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIXES = (".ts", ".mp4")  # RecordingFormat TS and FMP4
+
+
+@dataclass(frozen=True)
+class SegmentClosed:
+    channel_id: int
+    channel_name: str
+    path: Path
+    size: int
+    closed_at: float  # time.time()
+
+
+Consumer = Callable[[List[SegmentClosed]], None]
+
+_consumers: List[Consumer] = []
+
+
+def register_consumer(consumer: Consumer) -> Consumer:
+    """
+    Register a callable receiving batches of SegmentClosed events.
+    Usable as a decorator. Consumers listed in settings.TRANSCODER_SEGMENT_CONSUMERS
+    (dotted paths) are registered automatically by the watcher.
+    """
+    if consumer not in _consumers:
+        _consumers.append(consumer)
+    return consumer
+
+
+def configured_consumers() -> List[Consumer]:
+    for dotted in settings.TRANSCODER_SEGMENT_CONSUMERS:
+        register_consumer(import_string(dotted))
+    return list(_consumers)
+
+
+def log_consumer(events: List[SegmentClosed]) -> None:
+    """
+    Minimal consumer: log closed segments.
+    """
+    for ev in events:
+        logger.info("Segment closed: %s (%s, %d bytes)", ev.path, ev.channel_name, ev.size)
+
+
+# ------------------------
+# Recording roots
+# ------------------------
+
+def recording_root(chan: Channel) -> Path:
+    """
+    Static part of a channel's recording_path_template: everything before the
+    first {date}/{time} placeholder. All of the channel's segments live below it.
+    """
+    template = chan.recording_path_template
+    for placeholder in ("{date}", "{time}"):
+        template = template.split(placeholder)[0]
+    root = Path(template.format(channel=chan.name))
+    if not root.is_absolute():
+        root = Path(settings.MEDIA_ROOT) / root
+    return root
+
+
+class RootMap:
+    """
+    Recording roots and the channels writing under them. `root_of` maps a
+    channel to its root (the staging mover passes the staged one).
+    """
+
+    def __init__(self, channels: Iterable[Channel], root_of: Callable[[Channel], Path] = recording_root):
+        self.channels_by_root: Dict[Path, List[Channel]] = {}
+        for chan in channels:
+            self.channels_by_root.setdefault(root_of(chan), []).append(chan)
+
+    @classmethod
+    def from_db(cls) -> "RootMap":
+        return cls(Channel.objects.filter(record_enabled=True))
+
+    @property
+    def roots(self) -> List[Path]:
+        return sorted(self.channels_by_root)
+
+    def match(self, path: Path) -> Optional[Channel]:
+        """
+        Channel owning a segment file, or None if it is not a segment.
+        """
+        if path.suffix not in SEGMENT_SUFFIXES:
+            return None
+        for root, channels in self.channels_by_root.items():
+            if root not in path.parents:
+                continue
+            for chan in channels:
+                if path.name.startswith(f"{chan.name}_"):
+                    return chan
+        return None
+
+
+# ------------------------
+# Sources
+# ------------------------
+
+class _Source:
+    def __init__(self, roots: RootMap, emit: Callable[[SegmentClosed], None]):
+        self.roots = roots
+        self.emit = emit
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def update_roots(self, roots: RootMap) -> None:
+        self.roots = roots
+
+    def _emit_path(self, path: Path) -> None:
+        chan = self.roots.match(path)
+        if chan is None:
+            return
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return  # moved away already (e.g. staged mover)
+        self.emit(SegmentClosed(chan.id, chan.name, path, size, time.time()))
+
+
+class InotifySource(_Source):
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, roots: RootMap, emit: Callable[[SegmentClosed], None]):
+        super().__init__(roots, emit)
+        libc_name = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.fd = fd
+        self.wd_paths: Dict[int, Path] = {}
+        self.on_overflow: Optional[Callable[[], None]] = None
+
+    @classmethod
+    def available(cls) -> bool:
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            return False
+        try:
+            return hasattr(ctypes.CDLL(libc_name), "inotify_init1")
+        except OSError:
+            return False
+
+    def _watch(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), self.WATCH_MASK
+        )
+        if wd < 0:
+            logger.warning("Cannot watch %s (errno %d)", directory, ctypes.get_errno())
+            return
+        self.wd_paths[wd] = directory
+
+    def _watch_tree(self, root: Path) -> None:
+        self._watch(root)
+        for dirpath, dirnames, _ in os.walk(root):
+            for name in dirnames:
+                self._watch(Path(dirpath) / name)
+
+    def update_roots(self, roots: RootMap) -> None:
+        super().update_roots(roots)
+        watched = set(self.wd_paths.values())
+        for root in roots.roots:
+            if root not in watched:
+                root.mkdir(parents=True, exist_ok=True)
+                self._watch_tree(root)
+
+    def _handle(self, buf: bytes) -> None:
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(buf):
+            wd, mask, _cookie, length = self.EVENT_HEADER.unpack_from(buf, offset)
+            offset += self.EVENT_HEADER.size
+            name = buf[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed; rescanning recording roots")
+                if self.on_overflow is not None:
+                    self.on_overflow()
+                continue
+            if mask & self.IN_IGNORED:
+                self.wd_paths.pop(wd, None)
+                continue
+
+            directory = self.wd_paths.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    # New day folder: watch it (and anything created in it meanwhile).
+                    self._watch_tree(path)
+                continue
+            if mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+                self._emit_path(path)
+
+    def run(self) -> None:
+        self.update_roots(self.roots)
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([self.fd], [], [], 1.0)
+                if not ready:
+                    continue
+                try:
+                    buf = os.read(self.fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                self._handle(buf)
+        finally:
+            os.close(self.fd)
+
+
+class PollingSource(_Source):
+    """
+    Scan roots every `interval` seconds. A segment is reported once when
+    either a later segment of the same channel exists in its folder, or its
+    size and mtime have not changed for `stable_seconds` (the last segment of a
+    stopped job).
+    """
+
+    def __init__(
+        self,
+        roots: RootMap,
+        emit: Callable[[SegmentClosed], None],
+        interval: Optional[float] = None,
+        stable_seconds: Optional[float] = None,
+    ):
+        super().__init__(roots, emit)
+        self.interval = interval or settings.TRANSCODER_SEGMENT_POLL_INTERVAL
+        self.stable_seconds = stable_seconds or settings.TRANSCODER_SEGMENT_STABLE_SECONDS
+        # path -> (size, mtime_ns, first_seen_unchanged)
+        self._pending: Dict[Path, Tuple[int, int, float]] = {}
+        self._reported: Set[Path] = set()
+        self._primed = False
+
+    def _scan(self) -> List[Path]:
+        found = []
+        for root in self.roots.roots:
+            for dirpath, _, filenames in os.walk(root):
+                for name in filenames:
+                    if name.endswith(SEGMENT_SUFFIXES):
+                        found.append(Path(dirpath) / name)
+        return found
+
+    def scan_once(self) -> None:
+        now = time.monotonic()
+        paths = self._scan()
+        existing = set(paths)
+
+        # Newest segment per (folder, channel) is still being written.
+        newest: Dict[Tuple[Path, int], Path] = {}
+        for path in sorted(paths):
+            chan = self.roots.match(path)
+            if chan is not None:
+                newest[(path.parent, chan.id)] = path
+        current = set(newest.values())
+
+        for path in paths:
+            if path in self._reported:
+                continue
+            if not self._primed:
+                # Segments closed before we started are history, not events.
+                if path not in current:
+                    self._reported.add(path)
+                    continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if path not in current:
+                closed = True
+            else:
+                size, mtime_ns, since = self._pending.get(path, (-1, -1, now))
+                if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                    since = now
+                self._pending[path] = (st.st_size, st.st_mtime_ns, since)
+                closed = now - since >= self.stable_seconds
+            if closed:
+                self._pending.pop(path, None)
+                self._reported.add(path)
+                self._emit_path(path)
+
+        self._primed = True
+        # Forget files that were moved or deleted.
+        self._reported &= existing
+        for gone in set(self._pending) - existing:
+            del self._pending[gone]
+
+    def run(self) -> None:
+        while not self._stop.is_set():
+            self.scan_once()
+            self._stop.wait(self.interval)
+
+
+# ------------------------
+# Watcher service
+# ------------------------
+
+class SegmentWatcher:
+    """
+    Ties a source to the consumers: bounded queue + one dispatcher thread that
+    delivers batches of up to `batch_size` events, or whatever arrived within
+    `batch_latency` seconds.
+    """
+
+    def __init__(
+        self,
+        consumers: Optional[List[Consumer]] = None,
+        use_inotify: Optional[bool] = None,
+        batch_size: Optional[int] = None,
+        batch_latency: Optional[float] = None,
+        queue_size: Optional[int] = None,
+        roots_refresh: float = 60.0,
+    ):
+        self.consumers = configured_consumers() if consumers is None else consumers
+        self.batch_size = batch_size or settings.TRANSCODER_SEGMENT_BATCH_SIZE
+        self.batch_latency = batch_latency or settings.TRANSCODER_SEGMENT_BATCH_LATENCY
+        self.queue: "queue.Queue[SegmentClosed]" = queue.Queue(
+            maxsize=queue_size or settings.TRANSCODER_SEGMENT_QUEUE_SIZE
+        )
+        self.roots_refresh = roots_refresh
+        self._stop = threading.Event()
+
+        if use_inotify is None:
+            use_inotify = InotifySource.available()
+        roots = RootMap.from_db()
+        if use_inotify:
+            self.source = InotifySource(roots, self._put)
+            # Missed events after a kernel queue overflow are recovered by a scan.
+            self._rescanner = PollingSource(roots, self._put, stable_seconds=float("inf"))
+            self.source.on_overflow = self._rescan
+        else:
+            self.source = PollingSource(roots, self._put)
+            self._rescanner = None
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if isinstance(self.source, InotifySource) else "polling"
+
+    def _put(self, event: SegmentClosed) -> None:
+        # Blocks when consumers are behind: this is the backpressure.
+        while not self._stop.is_set():
+            try:
+                self.queue.put(event, timeout=1.0)
+                return
+            except queue.Full:
+                logger.warning("Segment event queue full; waiting for consumers")
+
+    def _rescan(self) -> None:
+        if self._rescanner is not None:
+            # Reports closed segments not seen by the previous scan; consumers
+            # must tolerate the odd duplicate this can cause.
+            self._rescanner.update_roots(self.source.roots)
+            self._rescanner.scan_once()
+
+    def _dispatch_loop(self) -> None:
+        while not (self._stop.is_set() and self.queue.empty()):
+            try:
+                first = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.batch_latency
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            for consumer in self.consumers:
+                try:
+                    consumer(batch)
+                except Exception:
+                    logger.exception("Segment consumer %r failed", consumer)
+
+    def run(self) -> None:
+        """
+        Run until stop() is called (or KeyboardInterrupt).
+        """
+        if self._rescanner is not None:
+            self._rescanner.scan_once()  # remember what already exists
+        dispatcher = threading.Thread(target=self._dispatch_loop, name="segment-dispatch", daemon=True)
+        source = threading.Thread(target=self.source.run, name="segment-source", daemon=True)
+        dispatcher.start()
+        source.start()
+        try:
+            while not self._stop.wait(self.roots_refresh):
+                # Pick up new channels / changed templates.
+                self.source.update_roots(RootMap.from_db())
+        finally:
+            self.source.stop()
+            source.join(timeout=5)
+            self._stop.set()
+            dispatcher.join(timeout=30)
+
+    def stop(self) -> None:
+        self._stop.set()
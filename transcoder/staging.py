@@ -0,0 +1,260 @@
+# transcoder/staging.py
+"""
+Staged recording. Record jobs of channels with recording_staged write their
+segments under TRANSCODER_RECORDING_STAGING_DIR (tmpfs or a local SSD), in
+a mirror of the final folder: /srv/rec/CH/20261019/ is staged as
+<staging>/srv/rec/CH/20261019/. Dozens of muxers then append to fast
+storage, and the mover (transcoder_mover) migrates each closed segment to
+its final folder with one large sequential copy:
+
+- copy_file_range() (in-kernel, and server-side on NFS/CIFS where
+  supported), sendfile() or read/write, in TRANSCODER_MOVER_CHUNK_MB
+  chunks, throttled to TRANSCODER_MOVER_BANDWIDTH_MB;
+- into a hidden .part name, fsynced together with the rest of its batch,
+  renamed into place (the segment watcher sees the rename as the close of
+  the final file) and only then removed from staging.
+
+Lookups (playback, clips, the watchdog) check both locations; current_path()
+follows a segment that moved while a reader held on to its staged path.
+"""
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .models import Channel
+from .segment_watcher import SEGMENT_SUFFIXES, RootMap, recording_root
+
+logger = logging.getLogger(__name__)
+
+
+def staging_root() -> Optional[Path]:
+    root = settings.TRANSCODER_RECORDING_STAGING_DIR
+    return Path(root) if root else None
+
+
+def staged_path(final: Path) -> Path:
+    """
+    Where `final` (a recording folder or segment) is written while staged.
+    """
+    root = staging_root()
+    if root is None:
+        raise ValueError("TRANSCODER_RECORDING_STAGING_DIR is not set")
+    final = Path(final)
+    return root / final.relative_to(final.anchor)
+
+
+def final_path(staged: Path) -> Path:
+    """
+    Inverse of staged_path().
+    """
+    rel = Path(staged).relative_to(staging_root())
+    return Path(os.sep) / rel
+
+
+def is_staged(path: Path) -> bool:
+    root = staging_root()
+    return root is not None and root in Path(path).parents
+
+
+def current_path(path: Path) -> Path:
+    """
+    `path`, or its final location if it was staged and has been moved since.
+    """
+    path = Path(path)
+    if not is_staged(path) or path.exists():
+        return path
+    return final_path(path)
+
+
+# ------------------------
+# Mover
+# ------------------------
+
+class _Throttle:
+    """
+    Keeps the average copy rate at or below `rate` bytes/s (0 = unlimited).
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.started = time.monotonic()
+        self.done = 0
+
+    def account(self, n: int) -> None:
+        self.done += n
+        if self.rate > 0:
+            ahead = self.done / self.rate - (time.monotonic() - self.started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+def _copy(src_fd: int, dst_fd: int, size: int, chunk: int, throttle: _Throttle) -> None:
+    """
+    Copy `size` bytes in `chunk`-sized sequential steps, in the kernel where
+    possible.
+    """
+    offset = 0
+    use_range = hasattr(os, "copy_file_range")
+    use_sendfile = hasattr(os, "sendfile")
+    while offset < size:
+        want = min(chunk, size - offset)
+        n = 0
+        if use_range:
+            try:
+                n = os.copy_file_range(src_fd, dst_fd, want)
+            except OSError:
+                use_range = False  # EXDEV on old kernels, or unsupported fs
+                continue
+        elif use_sendfile:
+            try:
+                n = os.sendfile(dst_fd, src_fd, offset, want)
+                os.lseek(src_fd, offset + n, os.SEEK_SET)
+            except OSError:
+                use_sendfile = False
+                continue
+        else:
+            data = os.read(src_fd, want)
+            n = len(data)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(dst_fd, view):]
+        if n == 0:
+            break  # truncated under us; size check below reports it
+        offset += n
+        throttle.account(n)
+    if offset != size:
+        raise OSError(f"copied {offset} of {size} bytes")
+
+
+@dataclass
+class MoveResult:
+    moved: int = 0
+    bytes: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+
+def closed_staged_segments(stable_seconds: Optional[float] = None) -> List[Tuple[Channel, Path]]:
+    """
+    Staged segments whose muxer is done with them: every segment but the
+    newest of each channel and folder, and the newest one once it has not
+    been written to for TRANSCODER_SEGMENT_STABLE_SECONDS (the job stopped).
+    """
+    root = staging_root()
+    if root is None or not root.is_dir():
+        return []
+    stable = settings.TRANSCODER_SEGMENT_STABLE_SECONDS if stable_seconds is None else stable_seconds
+    channels = Channel.objects.filter(record_enabled=True)
+    roots = RootMap(channels, root_of=lambda chan: staged_path(recording_root(chan)))
+
+    by_folder: Dict[Tuple[str, int], List[Tuple[str, Channel]]] = {}
+    for folder, _, files in os.walk(root):
+        for name in files:
+            if not name.endswith(SEGMENT_SUFFIXES):
+                continue
+            path = Path(folder) / name
+            chan = roots.match(path)
+            if chan is not None:
+                by_folder.setdefault((folder, chan.id), []).append((name, chan))
+
+    now = time.time()
+    closed = []
+    for (folder, _), entries in by_folder.items():
+        entries.sort(key=lambda e: e[0])
+        for i, (name, chan) in enumerate(entries):
+            path = Path(folder) / name
+            if i == len(entries) - 1:
+                try:
+                    if now - path.stat().st_mtime < stable:
+                        continue  # still being written
+                except FileNotFoundError:
+                    continue
+            closed.append((chan, path))
+    return closed
+
+
+def move_segments(paths: List[Path], bandwidth: Optional[float] = None) -> MoveResult:
+    """
+    Move staged segments to their final folders. Each batch of
+    TRANSCODER_MOVER_FSYNC_BATCH files is copied, fsynced, renamed into
+    place (then the folders fsynced) before the staged copies are removed,
+    so a crash at any point leaves every segment complete in at least one
+    location.
+    """
+    chunk = settings.TRANSCODER_MOVER_CHUNK_MB * 1024 * 1024
+    rate = settings.TRANSCODER_MOVER_BANDWIDTH_MB if bandwidth is None else bandwidth
+    throttle = _Throttle(rate * 1024 * 1024)
+    batch_size = max(1, settings.TRANSCODER_MOVER_FSYNC_BATCH)
+    result = MoveResult()
+    started = time.monotonic()
+    for i in range(0, len(paths), batch_size):
+        _move_batch(paths[i:i + batch_size], chunk, throttle, result)
+    result.seconds = time.monotonic() - started
+    return result
+
+
+def _move_batch(paths: List[Path], chunk: int, throttle: _Throttle, result: MoveResult) -> None:
+    copied: List[Tuple[Path, Path, Path, int, int]] = []  # src, tmp, dst, fd, size
+    renamed: List[Tuple[Path, int]] = []
+    try:
+        for src in paths:
+            dst = final_path(src)
+            tmp = dst.with_name(f".{dst.name}.part")
+            try:
+                st = src.stat()
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                if st.st_dev == dst.parent.stat().st_dev:
+                    os.replace(src, dst)  # same filesystem: nothing to copy
+                    result.moved += 1
+                    result.bytes += st.st_size
+                    continue
+                fd_in = os.open(src, os.O_RDONLY)
+                try:
+                    if hasattr(os, "posix_fadvise"):
+                        os.posix_fadvise(fd_in, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                    fd_out = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                    try:
+                        _copy(fd_in, fd_out, st.st_size, chunk, throttle)
+                        os.utime(fd_out, ns=(st.st_atime_ns, st.st_mtime_ns))
+                    except OSError:
+                        os.close(fd_out)
+                        raise
+                finally:
+                    os.close(fd_in)
+                copied.append((src, tmp, dst, fd_out, st.st_size))
+            except OSError as exc:
+                logger.warning("Moving %s failed: %s", src, exc)
+                tmp.unlink(missing_ok=True)
+                result.failed += 1
+
+        # One flush for the whole batch, then the names.
+        for src, tmp, dst, fd, size in copied:
+            try:
+                os.fsync(fd)
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)  # not re-read soon
+                os.replace(tmp, dst)
+                renamed.append((src, size))
+            except OSError as exc:
+                logger.warning("Moving %s failed: %s", src, exc)
+                tmp.unlink(missing_ok=True)
+                result.failed += 1
+    finally:
+        for _, _, _, fd, _ in copied:
+            os.close(fd)
+
+    for folder in {final_path(src).parent for src, _ in renamed}:
+        dir_fd = os.open(folder, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    for src, size in renamed:
+        src.unlink(missing_ok=True)
+        result.moved += 1
+        result.bytes += size
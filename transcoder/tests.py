@@ -1,3 +1,146 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .models import RecurringSchedule
+from .reconcile import (
+    ChannelSnap,
+    DesiredJob,
+    OneOffSnap,
+    RecurringSnap,
+    Snapshot,
+    desired_jobs,
+    plan_actions,
+    recurring_active,
+)
+
+EVERY_DAY = (True,) * 7
+WEEKDAYS = (True,) * 5 + (False,) * 2
+# 2026-10-19 is a Monday.
+MONDAY = datetime(2026, 10, 19)
+
+
+class RecurringActiveTests(SimpleTestCase):
+    def active(self, start, end, at, weekdays=EVERY_DAY, date_from=None, date_to=None):
+        return recurring_active(start, end, weekdays, date_from, date_to, at)
+
+    def test_same_day_window(self):
+        self.assertFalse(self.active(time(9), time(17), MONDAY.replace(hour=8, minute=59)))
+        self.assertTrue(self.active(time(9), time(17), MONDAY.replace(hour=9)))
+        self.assertFalse(self.active(time(9), time(17), MONDAY.replace(hour=17)))
+
+    def test_overnight_window(self):
+        self.assertTrue(self.active(time(20), time(6), MONDAY.replace(hour=23)))
+        self.assertTrue(self.active(time(20), time(6), MONDAY.replace(hour=5, minute=59)))
+        self.assertFalse(self.active(time(20), time(6), MONDAY.replace(hour=6)))
+        self.assertFalse(self.active(time(20), time(6), MONDAY.replace(hour=12)))
+
+    def test_overnight_window_checks_the_day_it_falls_on(self):
+        # Friday 23:00 is open on a weekdays-only schedule, Saturday 01:00 is not.
+        friday = MONDAY + timedelta(days=4)
+        self.assertTrue(self.active(time(20), time(6), friday.replace(hour=23), WEEKDAYS))
+        self.assertFalse(self.active(time(20), time(6), friday + timedelta(days=1, hours=1), WEEKDAYS))
+
+    def test_full_day_window(self):
+        self.assertTrue(self.active(time(0), time(0), MONDAY))
+        self.assertTrue(self.active(time(7), time(7), MONDAY.replace(hour=3)))
+        self.assertFalse(self.active(time(7), time(7), MONDAY + timedelta(days=5), WEEKDAYS))
+
+    def test_date_range(self):
+        day = MONDAY.date()
+        self.assertFalse(self.active(time(0), time(0), MONDAY, date_from=day + timedelta(days=1)))
+        self.assertFalse(self.active(time(0), time(0), MONDAY, date_to=day - timedelta(days=1)))
+        self.assertTrue(self.active(time(0), time(0), MONDAY, date_from=day, date_to=day))
+
+
+class IsActiveNowTests(SimpleTestCase):
+    def test_agrees_with_recurring_active(self):
+        windows = [(time(9), time(17)), (time(20), time(6)), (time(0), time(0)), (time(7), time(7))]
+        for start, end in windows:
+            rs = RecurringSchedule(
+                name="r", start_time=start, end_time=end, enabled=True,
+                monday=True, tuesday=True, wednesday=True, thursday=True, friday=True,
+                saturday=False, sunday=False,
+                date_from=date(2026, 10, 19), date_to=date(2026, 10, 31),
+            )
+            for hour in range(0, 24 * 14, 5):
+                at = MONDAY - timedelta(days=1) + timedelta(hours=hour)
+                with self.subTest(start=start, end=end, at=at):
+                    self.assertEqual(
+                        rs.is_active_now(at),
+                        recurring_active(start, end, WEEKDAYS, rs.date_from, rs.date_to, at),
+                    )
+
+    def test_disabled(self):
+        rs = RecurringSchedule(start_time=time(0), end_time=time(0), enabled=False, monday=True)
+        self.assertFalse(rs.is_active_now(MONDAY))
+
+
+class DesiredJobsTests(SimpleTestCase):
+    def setUp(self):
+        self.chan = ChannelSnap(1, "c", preroll_seconds=30)
+
+    def test_oneoff_preroll(self):
+        start = MONDAY.replace(hour=20)
+        sched = OneOffSnap(1, self.chan, "s", "record", start, start + timedelta(hours=1))
+        snapshot = Snapshot(oneoff=[sched])
+        self.assertEqual(desired_jobs(snapshot, start - timedelta(seconds=31), 600), {})
+        desired = desired_jobs(snapshot, start - timedelta(seconds=30), 600)
+        self.assertEqual(list(desired), [("oneoff", 1)])
+        self.assertEqual(desired[("oneoff", 1)].boundary, start)
+        self.assertEqual(desired_jobs(snapshot, start + timedelta(hours=1), 600), {})
+
+    def test_preroll_is_capped(self):
+        start = MONDAY.replace(hour=20)
+        sched = OneOffSnap(1, self.chan, "s", "record", start, start + timedelta(hours=1), preroll_seconds=300)
+        snapshot = Snapshot(oneoff=[sched])
+        self.assertIn(("oneoff", 1), desired_jobs(snapshot, start - timedelta(seconds=300), 600))
+        self.assertEqual(desired_jobs(snapshot, start - timedelta(seconds=300), 60), {})
+        self.assertIn(("oneoff", 1), desired_jobs(snapshot, start - timedelta(seconds=60), 60))
+
+    def test_recurring_preroll_and_boundary(self):
+        rs = RecurringSnap(2, self.chan, "r", "record", EVERY_DAY, time(20), time(6), preroll_seconds=120)
+        snapshot = Snapshot(recurring=[rs])
+        evening = MONDAY.replace(hour=20)
+        self.assertEqual(desired_jobs(snapshot, evening - timedelta(seconds=121), 600), {})
+        early = desired_jobs(snapshot, evening - timedelta(seconds=120), 600)
+        self.assertEqual(early[("recurring", 2)].boundary, evening)
+        self.assertEqual(desired_jobs(snapshot, evening - timedelta(seconds=120), 60), {})
+        # Morning part of the overnight window: due since yesterday evening.
+        morning = desired_jobs(snapshot, MONDAY.replace(hour=3), 600)
+        self.assertEqual(morning[("recurring", 2)].boundary, evening - timedelta(days=1))
+
+
+class PlanActionsTests(SimpleTestCase):
+    def setUp(self):
+        chan = ChannelSnap(1, "c")
+        self.desired = {
+            ("oneoff", k): DesiredJob(chan, "record", f"s{k}", MONDAY) for k in (1, 2, 3, 4)
+        }
+
+    def test_start_and_stop(self):
+        actions = plan_actions(self.desired, {("oneoff", 1): True, ("oneoff", 9): True})
+        self.assertEqual(actions.start, [("oneoff", 2), ("oneoff", 3), ("oneoff", 4)])
+        self.assertEqual(actions.stop, [("oneoff", 9)])
+        self.assertEqual(actions.restart, [])
+        self.assertEqual(actions.reap, [])
+
+    def test_reap_exited(self):
+        running = {("oneoff", k): True for k in (1, 2, 3, 4)}
+        running[("oneoff", 2)] = False
+        running[("oneoff", 9)] = False  # exited and no longer desired: stopped, not reaped
+        actions = plan_actions(self.desired, running)
+        self.assertEqual(actions.reap, [("oneoff", 2)])
+        self.assertEqual(actions.stop, [("oneoff", 9)])
+        self.assertEqual(actions.start, [])
+
+    def test_restart(self):
+        running = {("oneoff", k): True for k in (1, 2, 3, 4)}
+        running[("oneoff", 3)] = False
+        running[("oneoff", 9)] = True
+        # Only desired, alive jobs are restarted.
+        actions = plan_actions(self.desired, running, restart=[("oneoff", 1), ("oneoff", 3), ("oneoff", 9)])
+        self.assertEqual(actions.restart, [("oneoff", 1)])
+        self.assertEqual(actions.start, [("oneoff", 1)])
+        self.assertEqual(actions.reap, [("oneoff", 3)])
+        self.assertEqual(actions.stop, [("oneoff", 9)])
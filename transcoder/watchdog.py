@@ -0,0 +1,187 @@
+# transcoder/watchdog.py
+"""
+Output watchdog for the enforcer. A job can be alive and useless: ffmpeg
+blocked on a dead input keeps its pid while its HLS playlist stops moving,
+its recording segment stops growing or its -progress out_time stands still.
+Each running job except playout gets one liveness probe for its output,
+and a job whose probe has not advanced for the stall deadline is reported
+so the enforcer can restart it.
+
+Probes are cheap enough for every tick: one stat() per HLS or recording job
+(the playlist is only read when its mtime changed, the recording folder is
+only listed when the current segment stopped growing) and a dict lookup for
+jobs watched through their -progress output.
+"""
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Hashable, List, Optional
+
+from django.conf import settings
+
+from .clips import parse_segment_name
+from .ffmpeg_runner import FFmpegJobConfig
+
+HLS = "hls"  # playlist media sequence / last segment
+RECORD = "record"  # bytes in the newest recording segment
+PROGRESS = "progress"  # -progress out_time / total_size
+
+
+@dataclass
+class _Watch:
+    probe: str
+    job: FFmpegJobConfig
+    last_change: float  # monotonic
+    signature: object = None
+    path: Optional[Path] = None  # HLS playlist, or current recording segment
+    mtime_ns: int = 0
+    dirs: List[Path] = field(default_factory=list)  # recording folders seen
+
+
+@dataclass
+class Stall:
+    key: Hashable
+    probe: str
+    idle: float  # seconds without progress
+
+
+def _probe_for(job: FFmpegJobConfig, has_progress: bool) -> Optional[str]:
+    chan = job.channel
+    if job.purpose == "record":
+        return RECORD
+    if job.purpose == "live_forward" and chan.output_type == "hls":
+        return HLS
+    if job.purpose == "playback":
+        # The playout engine's total_size also stands still while a delay
+        # waits for its recording to exist; it slates over gaps itself.
+        return None
+    # UDP/RTMP/file outputs: only the job itself can tell.
+    return PROGRESS if has_progress else None
+
+
+class OutputWatchdog:
+    """
+    Liveness probes for running jobs. track() a job when it starts, untrack()
+    it when it stops, and call check() every tick. `job_logs` (a JobLogHub)
+    supplies -progress output; without it, jobs that have no output file to
+    watch are not supervised.
+    """
+
+    def __init__(self, deadline: float, job_logs=None):
+        self.deadline = deadline
+        self.job_logs = job_logs
+        self.watches = {}
+        # Stalls per job key, kept across the restarts they caused.
+        self.stalls: Counter = Counter()
+
+    def track(self, key: Hashable, job: FFmpegJobConfig, now: Optional[float] = None) -> Optional[str]:
+        probe = _probe_for(job, self.job_logs is not None)
+        if probe is None:
+            return None
+        watch = _Watch(probe=probe, job=job, last_change=now if now is not None else time.monotonic())
+        if probe == HLS:
+            out_dir = Path(job.channel.output_target)
+            if not out_dir.is_absolute():
+                out_dir = Path(settings.MEDIA_ROOT) / out_dir
+            watch.path = out_dir / "index.m3u8"
+        elif probe == RECORD:
+            watch.dirs = [job.record_dir or job._write_dir(datetime.now())]
+        self.watches[key] = watch
+        return probe
+
+    def untrack(self, key: Hashable) -> None:
+        self.watches.pop(key, None)
+
+    def forget(self, key: Hashable) -> None:
+        """
+        Drop the stall count too, once the job's schedule has ended.
+        """
+        self.untrack(key)
+        self.stalls.pop(key, None)
+
+    def idle(self, key: Hashable, now: Optional[float] = None) -> Optional[float]:
+        watch = self.watches.get(key)
+        if watch is None:
+            return None
+        return (now if now is not None else time.monotonic()) - watch.last_change
+
+    def check(self, now: Optional[float] = None) -> List[Stall]:
+        """
+        Probe every tracked job; returns those idle longer than the deadline
+        and counts a stall for each. A reported job keeps being reported
+        until it is untracked.
+        """
+        now = now if now is not None else time.monotonic()
+        stalled = []
+        for key, watch in self.watches.items():
+            try:
+                signature = getattr(self, f"_{watch.probe}_signature")(key, watch)
+            except OSError:
+                signature = watch.signature  # not there yet: no progress
+            if signature != watch.signature:
+                watch.signature = signature
+                watch.last_change = now
+            elif now - watch.last_change > self.deadline:
+                self.stalls[key] += 1
+                stalled.append(Stall(key, watch.probe, now - watch.last_change))
+        return stalled
+
+    # --- probes ---
+
+    def _hls_signature(self, key, watch: _Watch):
+        st = os.stat(watch.path)
+        if st.st_mtime_ns == watch.mtime_ns:
+            return watch.signature
+        watch.mtime_ns = st.st_mtime_ns
+        sequence, last = None, None
+        with open(watch.path, encoding="utf-8", errors="replace") as fh:
+            for line in fh:
+                line = line.strip()
+                if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+                    sequence = line.split(":", 1)[1]
+                elif line and not line.startswith("#"):
+                    last = line
+        # A rewrite that adds no segment is not progress.
+        return sequence, last
+
+    def _record_signature(self, key, watch: _Watch):
+        if watch.path is not None:
+            try:
+                size = os.stat(watch.path).st_size
+            except OSError:
+                size = None
+            if size is not None and (watch.path, size) != watch.signature:
+                return watch.path, size
+
+        # Not growing: look for a newer segment (the cut, or a new day's folder).
+        chan = watch.job.channel
+        template = chan.recording_path_template
+        if "{date}" in template and "{time}" not in template:
+            # Aligned jobs move on to each day's folder; the first one is kept.
+            today = watch.job._write_dir(datetime.now())
+            if today not in watch.dirs:
+                watch.dirs = watch.dirs[:1] + watch.dirs[1:][-1:] + [today]
+        newest, newest_start = None, None
+        for d in watch.dirs:
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        seg_start = parse_segment_name(chan, entry.name)
+                        if seg_start is not None and (newest_start is None or seg_start > newest_start):
+                            newest, newest_start = entry, seg_start
+            except OSError:
+                continue
+        if newest is None:
+            return watch.signature
+        watch.path = Path(newest.path)
+        return watch.path, newest.stat().st_size
+
+    def _progress_signature(self, key, watch: _Watch):
+        log = self.job_logs.jobs.get(key)
+        if log is None:
+            return watch.signature
+        progress = log.progress
+        return progress.get("out_time_us") or progress.get("out_time"), progress.get("total_size")
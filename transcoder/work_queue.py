@@ -0,0 +1,83 @@
+# transcoder/work_queue.py
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class WorkerPool:
+    """
+    Runs jobs from a database-backed queue, at most `workers` at a time.
+
+    `claim()` returns the next job (already marked as running) or None;
+    `process(job)` does the work and records the outcome, returning True on
+    success. A slot is taken before a job is claimed, so the queue stays in
+    the database (visible, and shared with other workers) until one is free.
+    """
+
+    def __init__(self, claim: Callable[[], Optional[T]], process: Callable[[T], bool],
+                 workers: int, name: str = "worker", on_crash: Optional[Callable[[T], None]] = None):
+        self.claim = claim
+        self.process = process
+        self.on_crash = on_crash
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(workers)
+        self._active = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.done = 0
+        self.failed = 0
+
+    def _run(self, job) -> None:
+        ok = False
+        try:
+            ok = self.process(job)
+        except Exception:
+            logger.exception("%r crashed", job)
+            if self.on_crash is not None:
+                self.on_crash(job)
+        finally:
+            close_old_connections()
+            with self._lock:
+                self._active -= 1
+                if ok:
+                    self.done += 1
+                else:
+                    self.failed += 1
+            self._slots.release()
+
+    def run(self, once: bool = False, poll_interval: float = 2.0,
+            idle: Optional[Callable[[], None]] = None) -> None:
+        """
+        Process the queue until stop(); with `once`, return when it is empty
+        and nothing is running. `idle` is called whenever the queue is empty.
+        """
+        try:
+            while not self._stop.is_set():
+                self._slots.acquire()
+                job = self.claim()
+                if job is None:
+                    self._slots.release()
+                    with self._lock:
+                        busy = self._active > 0
+                    if once and not busy:
+                        return
+                    if idle is not None:
+                        idle()
+                    self._stop.wait(poll_interval)
+                    continue
+                with self._lock:
+                    self._active += 1
+                self._executor.submit(self._run, job)
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def stop(self) -> None:
+        self._stop.set()